@@ -0,0 +1,135 @@
+"""
+    Per-frame cost of HandDetector.findHands() with drawing
+    (what feedback() used to do) and headless, at 480p and 720p, and
+    what the stage timers add to a frame with timing on and off.
+
+    Run: python headless.py --video ../test.avi
+    Record a video with video_record.py, without one random
+    frames are used and the drawing cost is not measured.
+"""
+import argparse
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "feedback"))
+
+from hands import HandDetector  # noqa: E402
+from main import FEEDBACK_TIMING_SAMPLE  # noqa: E402
+from metrics import StageTimer  # noqa: E402
+
+
+RESOLUTIONS = {"480p": (640, 480), "720p": (1280, 720)}
+
+# Share of the frames timed, every one, the default and none
+TIMING = {"on": 1, "sampled": FEEDBACK_TIMING_SAMPLE, "off": 0}
+
+
+def loadFrames(video, count):
+    frames = []
+    if video:
+        cap = cv2.VideoCapture(video)
+        while len(frames) < count:
+            success, img = cap.read()
+            if not success:
+                break
+            frames.append(img)
+        cap.release()
+    if not frames:
+        frames = [np.random.randint(0, 255, (480, 640, 3), np.uint8)
+                  for _ in range(count)]
+    return frames
+
+
+def timeFrames(frames, fn):
+    start = time.perf_counter()
+    for img in frames:
+        fn(img)
+    return (time.perf_counter() - start) / len(frames) * 1000
+
+
+def convertAllocating(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def run(video=None, count=200):
+    """
+    :return: Milliseconds per frame of every path at every resolution
+    """
+    timings = {}
+    frames = loadFrames(video, count)
+    for name, size in RESOLUTIONS.items():
+        scaled = [cv2.resize(img, size) for img in frames]
+
+        # Separate detectors so the tracking state of one run
+        # does not help the other
+        drawing = HandDetector(detectionCon=0.8, maxHands=3)
+        headless = HandDetector(detectionCon=0.8, maxHands=3)
+        timings[f"{name} drawing"] = timeFrames(
+            scaled, lambda img: drawing.findHands(img.copy(), True))
+        timings[f"{name} headless"] = timeFrames(
+            scaled, lambda img: headless.findHands(img.copy(), False))
+
+        timings[f"{name} allocating"] = timeFrames(scaled, convertAllocating)
+        timings[f"{name} reused"] = timeFrames(scaled, headless.toRGB)
+    return timings
+
+
+def timedFrame(timer):
+    """
+    The laps of a frame in runFeedback(), FrameGrabber and HandDetector,
+    around no work.
+    """
+    timer.frame()
+    waited = timer.start()
+    timer.lap("wait", waited)
+    if timer.due(timer.frames):
+        timer.observe("decode", 0)
+    started = timer.start()
+    started = timer.lap("convert", started)
+    timer.lap("inference", started)
+    analysed = timer.start()
+    timer.lap("exercise", analysed)
+
+
+def timing(count=100000):
+    """
+    :return: Microseconds the timers add to a frame, for every setting
+    """
+    timings = {}
+    for name, sample in TIMING.items():
+        timer = StageTimer(sample)
+        start = time.perf_counter()
+        for _ in range(count):
+            timedFrame(timer)
+        timings[name] = (time.perf_counter() - start) / count * 1e6
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--video", help="Video file with a hand on it")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    timings = run(args.video, args.frames)
+    for name in RESOLUTIONS:
+        drawing_ms = timings[f"{name} drawing"]
+        headless_ms = timings[f"{name} headless"]
+        print(f"{name}: drawing {drawing_ms:.2f} ms/frame, "
+              f"headless {headless_ms:.2f} ms/frame, "
+              f"saved {drawing_ms - headless_ms:.2f} ms/frame")
+        print(f"{name}: colour conversion allocating {timings[f'{name} allocating']:.3f} ms/frame, "
+              f"reused buffer {timings[f'{name} reused']:.3f} ms/frame")
+
+    overhead = timing()
+    print(f"timers: on {overhead['on']:.2f} us/frame, "
+          f"one frame in {round(1 / FEEDBACK_TIMING_SAMPLE)} {overhead['sampled']:.2f} us/frame, "
+          f"off {overhead['off']:.2f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+    Allocations and time per frame of turning mediapipe's output into
+    landmarks: the dicts of lists findHands() used to build against
+    HandLandmarks. No video needed, the mediapipe output is simulated.
+
+    Run: python landmarks.py
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "feedback"))
+
+from hands import HandLandmarks  # noqa: E402
+
+
+def fakeResults(hands):
+    landmarks = [SimpleNamespace(landmark=[
+        SimpleNamespace(x=random.random(), y=random.random()) for _ in range(21)])
+        for _ in range(hands)]
+    handedness = [SimpleNamespace(classification=[SimpleNamespace(label="Right")])
+                  for _ in range(hands)]
+    return SimpleNamespace(multi_hand_landmarks=landmarks, multi_handedness=handedness)
+
+
+def dictHands(results, offset, size, flipType=True):
+    """
+    What findHands() did before HandLandmarks.
+    """
+    x0, y0 = offset
+    w, h = size
+    allHands = []
+    for handType, handLms in zip(results.multi_handedness, results.multi_hand_landmarks):
+        myHand = {}
+        mylmList = []
+        xList = []
+        yList = []
+        for id, lm in enumerate(handLms.landmark):
+            px, py = x0 + int(lm.x * w), y0 + int(lm.y * h)
+            mylmList.append([px, py])
+            xList.append(px)
+            yList.append(py)
+        xmin, xmax = min(xList), max(xList)
+        ymin, ymax = min(yList), max(yList)
+        boxW, boxH = xmax - xmin, ymax - ymin
+        bbox = xmin, ymin, boxW, boxH
+        cx, cy = bbox[0] + (bbox[2] // 2), bbox[1] + (bbox[3] // 2)
+        myHand["lmList"] = mylmList
+        myHand["bbox"] = bbox
+        myHand["center"] = (cx, cy)
+        if flipType:
+            myHand["type"] = "Left" if handType.classification[0].label == "Right" else "Right"
+        else:
+            myHand["type"] = handType.classification[0].label
+        allHands.append(myHand)
+    return allHands
+
+
+def measure(build, results, frames):
+    """
+    :return: Blocks still allocated for the frame's result, peak bytes
+             allocated while building it and microseconds per frame
+    """
+    # What feedback() does with the result of every frame, the arrays
+    # only turn the landmarks it reads into lists
+    def frame():
+        hands = build(results, (0, 0), (1280, 720))
+        if isinstance(hands, HandLandmarks):
+            points = hands.points[0]
+            return hands, points[0].tolist(), points[12].tolist()
+        lmList = hands[0]["lmList"]
+        return hands, lmList[0], lmList[12]
+
+    frame()
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    kept = frame()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    blocks = sum(stat.count_diff for stat in tracemalloc.take_snapshot().filter_traces(
+        ignore).compare_to(snapshot, "filename") if stat.count_diff > 0)
+    tracemalloc.stop()
+    del kept
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        frame()
+    elapsed = (time.perf_counter() - start) / frames * 1e6
+    return blocks, peak, elapsed
+
+
+def run(frames=20000):
+    """
+    :return: blocks, peak bytes and microseconds per frame
+             of both representations
+    """
+    timings = {}
+    for hands in (1, 3):
+        results = fakeResults(hands)
+        for name, build in (("dict", dictHands), ("array", HandLandmarks.fromResults)):
+            timings[f"{name} {hands}"] = measure(build, results, frames)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, (blocks, peak, elapsed) in run(args.frames).items():
+        kind, hands = name.split()
+        print(f"{hands} hand(s), {kind}: {elapsed:.1f} us/frame, "
+              f"{blocks} blocks kept, {peak} bytes peak per frame")
+
+
+if __name__ == "__main__":
+    main()
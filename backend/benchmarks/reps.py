@@ -0,0 +1,70 @@
+"""
+    Cost per landmark sample of the exercises' rep detection.
+    The samples are a simulated wrist moving side to side and
+    up and down, no video needed.
+
+    Run: python reps.py
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "feedback"))
+
+from main import Exercise  # noqa: E402
+
+
+def sideToSideSamples(count, fps=15):
+    samples = []
+    for i in range(count):
+        now = i / fps
+        swing = int(140 * math.sin(now * 2))
+        samples.append(([320, 400], [320 + swing, 200], 75, now))
+    return samples
+
+
+def upAndDownSamples(count, fps=15):
+    samples = []
+    for i in range(count):
+        now = i / fps
+        swing = int(220 * math.sin(now * 2))
+        fingers = [[320 + swing, 100 + 20 * k] for k in range(5)]
+        samples.append(([320, 400], fingers, "Right", now))
+    return samples
+
+
+def run(count=100000):
+    """
+    :return: Microseconds per sample of each exercise
+    """
+    timings = {}
+    exercise = Exercise()
+    samples = sideToSideSamples(count)
+    start = time.perf_counter()
+    for index0, index12, dista, now in samples:
+        exercise.wristSideToSide(index0, index12, dista, now)
+    timings["wristSideToSide"] = (time.perf_counter() - start) / len(samples) * 1e6
+
+    exercise = Exercise()
+    samples = upAndDownSamples(count)
+    start = time.perf_counter()
+    for index0, fingers, handType, now in samples:
+        exercise.wristUpAndDown(index0, *fingers, handType, now)
+    timings["wristUpAndDown"] = (time.perf_counter() - start) / len(samples) * 1e6
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=100000)
+    args = parser.parse_args()
+
+    for name, elapsed in run(args.samples).items():
+        print(f"{name}: {elapsed:.2f} us/sample")
+
+
+if __name__ == "__main__":
+    main()
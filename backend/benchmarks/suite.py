@@ -0,0 +1,101 @@
+"""
+    Runs all benchmarks and compares them with baselines.json. A metric
+    more than --threshold slower than its baseline is a regression and
+    makes the run exit with 1. All metrics are times, lower is better.
+
+    Run: python suite.py --video ../test.avi
+    After an intended change: python suite.py --video ../test.avi --update
+    The baselines only mean something on the machine they were made on.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), ".."))
+
+import headless  # noqa: E402
+import landmarks  # noqa: E402
+import reps  # noqa: E402
+from replay import replay  # noqa: E402
+
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+
+def collect(videos, exer=0, quick=False):
+    """
+    :return: Metric name to value, milliseconds or microseconds
+    """
+    metrics = {}
+    for name, us in reps.run(10000 if quick else 100000).items():
+        metrics[f"reps {name} us/sample"] = us
+    for name, (_, _, us) in landmarks.run(2000 if quick else 20000).items():
+        metrics[f"landmarks {name} us/frame"] = us
+    for name, ms in headless.run(videos[0] if videos else None, 50 if quick else 200).items():
+        metrics[f"headless {name} ms/frame"] = ms
+    for name, us in headless.timing(10000 if quick else 100000).items():
+        metrics[f"headless timing {name} us/frame"] = us
+    for video in videos:
+        report = replay(video, exer)
+        # The exercise and the sink take microseconds, reps covers them
+        for stage in ("decode", "detect"):
+            timings = report["stages"][stage]
+            metrics[f"replay {os.path.basename(video)} {stage} p50 ms"] = timings["p50"]
+            metrics[f"replay {os.path.basename(video)} {stage} p99 ms"] = timings["p99"]
+        metrics[f"replay {os.path.basename(video)} frame ms"] = round(1000 / report["fps"], 3)
+    return {name: round(value, 4) for name, value in metrics.items()}
+
+
+def compare(metrics, baselines, threshold):
+    """
+    :return: Names of the metrics that regressed
+    """
+    regressions = []
+    for name, value in metrics.items():
+        baseline = baselines.get(name)
+        if not baseline:
+            print(f"{name}: {value} (no baseline)")
+            continue
+        change = (value - baseline) / baseline
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name}: {value} vs {baseline} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--video", action="append", default=[],
+                        help="Recorded video to replay, can be repeated")
+    parser.add_argument("--exercise", type=int, default=0)
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Slowdown against the baseline flagged as a regression")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations")
+    parser.add_argument("--update", action="store_true", help="Store the results as the baselines")
+    args = parser.parse_args()
+
+    metrics = collect(args.video, args.exercise, args.quick)
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+
+    if args.update:
+        baselines.update(metrics)
+        with open(BASELINES, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Stored {len(metrics)} baselines in {BASELINES}")
+        return
+
+    regressions = compare(metrics, baselines, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+    Frames analysed per second by a whole feedback session against the
+    latency of the storage, using MemoryStorage with added latency
+    instead of Firestore. The session runs on a recorded video and ends
+    with it.
+
+    Run: python writes.py --video ../test.avi --latency 0 10 50 200
+    Without a video a few seconds of random frames are used.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "feedback"))
+
+from hands import HandDetector  # noqa: E402
+from main import FEEDBACK_DETECTOR, runFeedback  # noqa: E402
+from storage import MemoryStorage, setStorage  # noqa: E402
+
+
+def randomVideo(seconds=5, fps=30):
+    path = os.path.join(tempfile.mkdtemp(), "random.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (640, 480))
+    for _ in range(seconds * fps):
+        writer.write(np.random.randint(0, 255, (480, 640, 3), np.uint8))
+    writer.release()
+    return path
+
+
+def run(video=None, latencies=(0, 0.01, 0.05, 0.2)):
+    """
+    :return: Per latency in ms, startup seconds, frames analysed
+             per second and the writes of the session
+    :raise RuntimeError: No frame got to the exercise, the result
+                         would say nothing
+    """
+    video = video or randomVideo()
+    detector = HandDetector(**FEEDBACK_DETECTOR)
+    timings = {}
+    for latency in latencies:
+        setStorage(MemoryStorage(latency))
+        detector.reset()
+        started = time.time()
+        response = runFeedback({"source": video, "uid": "benchmark"}, detector)
+        elapsed = time.time() - started
+        # Frames that got to the exercise, like loadtest.py counts them
+        analysed = response["frames"]
+        if not analysed:
+            raise RuntimeError(f"No frame of {video} was analysed at {latency * 1000:g} ms")
+        startup = response.get("startup", {}).get("seconds")
+        # The start delay of a video is on its own timeline, skipped
+        # as fast as the frames decode
+        window = elapsed - (startup or 0)
+        timings[round(latency * 1000)] = {
+            "startup": startup,
+            "fps": round(analysed / window, 2) if window > 0 else 0,
+            "writes": response["writes"]
+        }
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--video", help="Video file with a hand on it")
+    parser.add_argument("--latency", type=float, nargs="+", default=[0, 10, 50, 200],
+                        help="Latency of every storage call in ms")
+    args = parser.parse_args()
+
+    timings = run(args.video, [latency / 1000 for latency in args.latency])
+    for latency, timing in timings.items():
+        print(f"{latency} ms per call: startup {timing['startup']} s, "
+              f"{timing['fps']} frames/s analysed, writes {timing['writes']}")
+
+
+if __name__ == "__main__":
+    main()
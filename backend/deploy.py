@@ -0,0 +1,52 @@
+"""
+    Builds the source folder of a function for gcloud functions deploy.
+    A Cloud Function only gets its own folder, so the modules it shares
+    with feedback are copied next to its main.py:
+
+        python deploy.py measure
+        gcloud functions deploy measure --source build/measure --entry-point measure --runtime python39 --trigger-http
+
+    feedback needs nothing copied and is deployed from its own folder.
+"""
+import argparse
+import os
+import shutil
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Modules of the feedback folder every function imports
+SHARED = {
+    "measure": ["hands", "capture", "stream", "pool", "metrics", "storage", "writer", "profiles"]
+}
+
+
+def build(function, target=None):
+    """
+    :param function: Folder of the function, e.g measure
+    :param target: Folder the sources are copied to, build/<function> by default
+    :return: The folder to deploy
+    """
+    target = target or os.path.join(HERE, "build", function)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    shutil.copytree(os.path.join(HERE, function), target,
+                    ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+    for module in SHARED[function]:
+        if os.path.exists(os.path.join(HERE, function, module + ".py")):
+            raise RuntimeError(f"{function}/{module}.py would be overwritten by the shared one")
+        shutil.copy2(os.path.join(HERE, "feedback", module + ".py"), target)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("function", choices=sorted(SHARED))
+    parser.add_argument("--target", help="Folder to build in, build/<function> by default")
+    args = parser.parse_args()
+
+    target = build(args.function, args.target)
+    print(f"Deploy {args.function} from {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+    Reads the video stream on its own thread so the analysis
+    always works on the newest frame, no matter how slow it is.
+"""
+import collections
+import threading
+import time
+import cv2
+
+
+class FrameGrabber:
+    """
+    Wraps a cv2.VideoCapture. A background thread keeps reading frames into
+    a small ring buffer, when the buffer is full the oldest frame is dropped.
+    read() hands out the newest frame and has the same return values
+    as cv2.VideoCapture.read(), timestamp is when that frame was taken.
+    """
+
+    def __init__(self, cap, size=2, dropFrames=True, timer=None, width=None, position=False):
+        """
+        :param cap: Opened cv2.VideoCapture
+        :param size: Number of frames kept in the ring buffer
+        :param dropFrames: Drop stale frames, turn off for recorded videos
+                           where every frame has to be analysed
+        :param timer: StageTimer the decoding time is recorded in
+        :param width: Shrink wider frames to this width right after decoding,
+                      scale says by how much
+        :param position: Time the frames by their position in the video,
+                         counted from when the grabber started, instead of
+                         when they were read. For recorded videos, which
+                         are read as fast as they are analysed.
+        """
+        self.cap = cap
+        self.timer = timer
+        self.width = width
+        self.scale = 1
+        self.size = size
+        self.dropFrames = dropFrames
+        self.position = position
+        self.origin = time.time()
+        self.buffer = collections.deque()
+        self.captured = 0
+        self.analysed = 0
+        self.dropped = 0
+        self.latency_sum = 0
+        self.latency_max = 0
+        self.timestamp = None
+        self.ended = False
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            self._grab()
+        finally:
+            with self.condition:
+                self.ended = True
+                self.condition.notify_all()
+            # Released here so a read stuck on a dead stream never
+            # races with release()
+            self.cap.release()
+
+    def _grab(self):
+        while not self.stopped:
+            timed = self.timer is not None and self.timer.due(self.captured)
+            if timed:
+                started = time.perf_counter()
+            success, img = self.cap.read()
+            taken = None
+            if success and self.position:
+                taken = self.origin + self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if success and self.width and img.shape[1] > self.width:
+                img = self._shrink(img)
+            if timed:
+                self.timer.observe("decode", time.perf_counter() - started)
+            with self.condition:
+                if not success:
+                    self.ended = True
+                    self.condition.notify_all()
+                    return
+                self.captured += 1
+                if self.dropFrames:
+                    if len(self.buffer) >= self.size:
+                        self.buffer.popleft()
+                        self.dropped += 1
+                else:
+                    while len(self.buffer) >= self.size and not self.stopped:
+                        self.condition.wait()
+                self.buffer.append((img, time.time(), taken))
+                self.condition.notify_all()
+
+    def _shrink(self, img):
+        h, w = img.shape[:2]
+        self.scale = w / self.width
+        return cv2.resize(img, (self.width, round(h / self.scale)), interpolation=cv2.INTER_AREA)
+
+    def read(self, timeout=None):
+        """
+        Wait for a frame and return the newest one.
+        :param timeout: Seconds to wait for a frame, None waits forever
+        :return: success, img
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.buffer or self.ended, timeout):
+                return False, None
+            if not self.buffer:
+                return False, None
+
+            if self.dropFrames:
+                img, captured_at, taken = self.buffer.pop()
+                self.dropped += len(self.buffer)
+                self.buffer.clear()
+            else:
+                img, captured_at, taken = self.buffer.popleft()
+            self.condition.notify_all()
+
+        latency = time.time() - captured_at
+        self.timestamp = captured_at if taken is None else taken
+        self.analysed += 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        return True, img
+
+    def reopen(self, cap):
+        """
+        Go on reading from cap after the stream ended, e.g a new
+        connection to the same stream. The counters go on.
+        """
+        self.thread.join()
+        self.cap = cap
+        with self.condition:
+            self.buffer.clear()
+            self.ended = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def release(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        self.thread.join(timeout=2)
+
+    def stats(self):
+        """
+        Frames captured, analysed and dropped plus the latency between
+        capturing a frame and handing it to the analysis.
+        """
+        mean = self.latency_sum / self.analysed if self.analysed else 0
+        return {
+            "captured": self.captured,
+            "analysed": self.analysed,
+            "dropped": self.dropped,
+            "latency": {"mean": round(mean, 4), "max": round(self.latency_max, 4)}
+        }
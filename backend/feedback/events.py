@@ -0,0 +1,104 @@
+"""
+    Live comments pushed to the phone as server-sent events, as soon as
+    the exercise produces them, instead of the phone waiting for the
+    Firestore listener. Firestore still gets them, less often, for the
+    phones that do not listen here.
+
+    GET .../events?uid={uid} on a feedback function streams the comments
+    of the sessions of uid running on the same instance:
+
+        data: {"error": false, "message": "Good", "sent": 1700000000.123}
+"""
+import json
+import queue
+import threading
+import time
+
+
+class EventHub:
+    """
+    Subscribers of every user of this instance. A subscriber that does
+    not keep up loses its oldest events, never blocks the frame loop.
+    """
+
+    def __init__(self, size=32):
+        """
+        :param size: Events kept for a subscriber that does not read
+        """
+        self.size = size
+        self.subscribers = {}
+        self.counters = {"published": 0, "delivered": 0, "dropped": 0}
+        self.lock = threading.Lock()
+
+    def subscribe(self, uid):
+        events = queue.Queue(self.size)
+        with self.lock:
+            self.subscribers.setdefault(uid, []).append(events)
+        return events
+
+    def unsubscribe(self, uid, events):
+        with self.lock:
+            subscribers = self.subscribers.get(uid, [])
+            if events in subscribers:
+                subscribers.remove(events)
+            if not subscribers:
+                self.subscribers.pop(uid, None)
+
+    def listening(self, uid):
+        with self.lock:
+            return bool(self.subscribers.get(uid))
+
+    def publish(self, uid, event):
+        """
+        Hand event to every subscriber of uid, stamped with when it was sent.
+        :return: How many subscribers got it
+        """
+        event = dict(event, sent=time.time())
+        with self.lock:
+            subscribers = list(self.subscribers.get(uid, []))
+            self.counters["published"] += 1
+        for events in subscribers:
+            while True:
+                try:
+                    events.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        events.get_nowait()
+                        with self.lock:
+                            self.counters["dropped"] += 1
+                    except queue.Empty:
+                        pass
+        with self.lock:
+            self.counters["delivered"] += len(subscribers)
+        return len(subscribers)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["subscribers"] = sum(len(subscribers) for subscribers in self.subscribers.values())
+        return stats
+
+
+hub = EventHub()
+
+
+def stream(uid, timeout=600, keepalive=15):
+    """
+    Server-sent events of uid for timeout seconds, with a comment every
+    keepalive seconds so proxies do not close an idle connection.
+    """
+    events = hub.subscribe(uid)
+    deadline = time.time() + timeout
+    try:
+        # Sent right away so the client knows it is subscribed
+        yield ": subscribed\n\n"
+        while time.time() < deadline:
+            try:
+                event = events.get(timeout=min(keepalive, max(deadline - time.time(), 0)))
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"data: {json.dumps(event)}\n\n"
+    finally:
+        hub.unsubscribe(uid, events)
@@ -0,0 +1,372 @@
+"""
+    Hand landmarks and the mediapipe detector finding them, shared by
+    the feedback and measure functions.
+"""
+import math
+import cv2
+import mediapipe as mp
+import numpy as np
+from metrics import NO_TIMING
+
+
+class HandLandmarks:
+    """
+    Hands found on a frame, kept in NumPy arrays instead of a dict of
+    lists per hand. Indexing or iterating gives HandView objects that
+    read like the dicts findHands() used to return.
+    """
+
+    def __init__(self, points, types):
+        """
+        :param points: Landmarks in pixels, int32 array of shape (hands, 21, 2)
+        :param types: "Left" or "Right" for every hand
+        """
+        self.points = points
+        self.types = types
+        self._bboxes = None
+
+    @property
+    def bboxes(self):
+        """
+        x, y, width and height of every hand, computed on first use.
+        """
+        if self._bboxes is None:
+            low = self.points.min(axis=1)
+            self._bboxes = np.concatenate(
+                (low, self.points.max(axis=1) - low), axis=1)
+        return self._bboxes
+
+    @property
+    def centers(self):
+        return self.bboxes[:, :2] + self.bboxes[:, 2:] // 2
+
+    _empty = None
+
+    @classmethod
+    def fromResults(cls, results, offset, size, flipType=True):
+        """
+        Scales mediapipe's normalised landmarks to pixels.
+        :param results: Output of mediapipe Hands.process()
+        :param offset: Pixel position of the processed image in the frame
+        :param size: Width and height of the processed image in pixels
+        :param flipType: Swap the handedness, the image is mirrored
+        """
+        if not results.multi_hand_landmarks:
+            return cls.empty()
+
+        count = len(results.multi_hand_landmarks)
+        points = np.fromiter((value for handLms in results.multi_hand_landmarks
+                              for lm in handLms.landmark for value in (lm.x, lm.y)),
+                             np.float64, count * 42).reshape(count, 21, 2)
+        points *= size
+        types = []
+        for handType in results.multi_handedness:
+            label = handType.classification[0].label
+            if flipType:
+                types.append("Left" if label == "Right" else "Right")
+            else:
+                types.append(label)
+        # Truncates like int() did, then moves to full frame pixels
+        return cls(points.astype(np.int32) + np.array(offset, np.int32), types)
+
+    @classmethod
+    def empty(cls):
+        if cls._empty is None:
+            cls._empty = cls(np.empty((0, 21, 2), np.int32), [])
+        return cls._empty
+
+    def scaled(self, factor):
+        """
+        The hands in the pixels of a frame factor times as large, e.g
+        the stream before FrameGrabber shrunk it.
+        """
+        if factor == 1 or not len(self):
+            return self
+        return HandLandmarks((self.points * factor).astype(np.int32), self.types)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return HandView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield HandView(self, index)
+
+
+class HandView:
+    """
+    One hand of HandLandmarks with the keys of the old hand dict,
+    lmList, bbox, center and type. The exercises read points and type,
+    which build nothing.
+    """
+
+    def __init__(self, hands, index):
+        self.hands = hands
+        self.index = index
+
+    @property
+    def points(self):
+        """
+        Landmarks of the hand, a (21, 2) view into HandLandmarks.points.
+        """
+        return self.hands.points[self.index]
+
+    @property
+    def type(self):
+        return self.hands.types[self.index]
+
+    def __getitem__(self, key):
+        if key == "lmList":
+            return self.hands.points[self.index].tolist()
+        elif key == "bbox":
+            return tuple(self.hands.bboxes[self.index].tolist())
+        elif key == "center":
+            return tuple(self.hands.centers[self.index].tolist())
+        elif key == "type":
+            return self.hands.types[self.index]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return ["lmList", "bbox", "center", "type"]
+
+
+class HandDetector:
+    """
+    Finds Hands using the mediapipe library. Exports the landmarks
+    in pixel format. Adds extra functionalities like finding how
+    many hands are on screen or the distance of the hand from the screen.
+    """
+
+    # Distance between landmarks 5 and 17 in pixels against the
+    # distance of the hand from the screen in cm
+    x = [300, 245, 200, 170, 145, 130, 112,
+         103, 93, 87, 80, 75, 70, 67, 62, 59, 57]
+    y = [20, 25, 30, 35, 40, 45, 50, 55,
+         60, 65, 70, 75, 80, 85, 90, 95, 100]
+    A, B, C = np.polyfit(x, y, 2)
+
+    # Set by the session using the detector, see runFeedback()
+    timer = NO_TIMING
+
+    def __init__(self, mode=False, maxHands=7, model_complexity=0, detectionCon=0.5, minTrackCon=0.5,
+                 roi=False, roiPadding=0.5, roiScale=1.0, roiRefresh=30):
+        """
+        :param mode: In static mode, detection is done on each image, this is slower
+        :param maxHands: Maximum number of hands to detect
+        :param detectionCon: Minimum Detection Confidence 
+        :param minTrackCon: Minimum Tracking Confidence
+        :param roi: Only search around the hands found on the previous frame
+        :param roiPadding: Padding around the hands, relative to their size
+        :param roiScale: Scale of the region before inference, 1 keeps it as is
+        :param roiRefresh: Search the full frame every roiRefresh frames
+                           so new hands are still found
+        """
+        self.mode = mode
+        self.maxHands = maxHands
+        self.detectionCon = detectionCon
+        self.minTrackCon = minTrackCon
+        self.model_complexity = model_complexity
+        self.roi = roi
+        self.roiPadding = roiPadding
+        self.roiScale = roiScale
+        self.roiRefresh = roiRefresh
+        self.region = None
+        self.regionFrames = 0
+
+        self.mpHands = mp.solutions.hands
+        self.hands = self.mpHands.Hands(static_image_mode=self.mode, max_num_hands=self.maxHands,
+                                        model_complexity=self.model_complexity, min_detection_confidence=self.detectionCon,
+                                        min_tracking_confidence=self.minTrackCon)
+        self.mpDraw = mp.solutions.drawing_utils
+        self.tipIds = [4, 8, 12, 16, 20]
+        self.fingers = []
+        self.lmList = []
+        self.imgRGB = None
+
+    def findHands(self, img, draw=True, flipType=True):
+        """
+        Finds hands in a BGR image.
+        :param img: Image to find the hands in.
+        :param draw: Flag to draw the output on the image, turn it off
+                     when nobody looks at the image.
+        :return: HandLandmarks, image with or without drawings
+        """
+        h, w, c = img.shape
+        x0, y0, x1, y1 = self.searchRegion(w, h)
+        self.results = self.process(img[y0:y1, x0:x1])
+        if not self.results.multi_hand_landmarks and (x1 - x0, y1 - y0) != (w, h):
+            # Lost the hands, search the whole frame again
+            self.region = None
+            x0, y0, x1, y1 = 0, 0, w, h
+            self.results = self.process(img)
+        w, h = x1 - x0, y1 - y0
+
+        allHands = HandLandmarks.fromResults(
+            self.results, (x0, y0), (w, h), flipType)
+
+        # draw
+        if draw:
+            for handLms, myHand in zip(self.results.multi_hand_landmarks or [], allHands):
+                bbox = myHand["bbox"]
+                self.mpDraw.draw_landmarks(img[y0:y1, x0:x1], handLms,
+                                           self.mpHands.HAND_CONNECTIONS)
+                cv2.rectangle(img, (bbox[0] - 20, bbox[1] - 20),
+                              (bbox[0] + bbox[2] + 20,
+                               bbox[1] + bbox[3] + 20),
+                              (255, 0, 255), 2)
+                cv2.putText(img, myHand["type"], (bbox[0] - 30, bbox[1] - 30), cv2.FONT_HERSHEY_PLAIN,
+                            2, (255, 0, 255), 2)
+        if self.roi:
+            self.trackRegion(allHands, img.shape[1], img.shape[0])
+
+        if draw:
+            return allHands, img
+        else:
+            return allHands
+
+    def process(self, img):
+        """
+        Runs the mediapipe model on a BGR image, downscaled by roiScale.
+        """
+        started = self.timer.start()
+        if self.roi and self.roiScale != 1:
+            img = cv2.resize(img, None, fx=self.roiScale, fy=self.roiScale,
+                             interpolation=cv2.INTER_AREA)
+        imgRGB = self.toRGB(img)
+        started = self.timer.lap("convert", started)
+        results = self.hands.process(imgRGB)
+        self.timer.lap("inference", started)
+        return results
+
+    def searchRegion(self, w, h):
+        """
+        Region of the frame to run the model on, as x0, y0, x1, y1.
+        """
+        if not self.roi or self.region is None or self.regionFrames >= self.roiRefresh \
+                or self.region[2] > w or self.region[3] > h:
+            self.regionFrames = 0
+            return 0, 0, w, h
+        self.regionFrames += 1
+        return self.region
+
+    def trackRegion(self, hands, w, h):
+        """
+        Moves the search region around the hands found on this frame.
+        The region is kept while the hands stay well inside it so
+        mediapipe keeps tracking them on an unchanged image.
+        """
+        if not hands:
+            self.region = None
+            return
+
+        xmin, ymin = hands.points.min(axis=(0, 1)).tolist()
+        xmax, ymax = hands.points.max(axis=(0, 1)).tolist()
+        pad = max(int(max(xmax - xmin, ymax - ymin) * self.roiPadding), 20)
+
+        if self.region is not None:
+            x0, y0, x1, y1 = self.region
+            margin = pad // 2
+            if xmin - margin >= x0 and ymin - margin >= y0 and \
+                    xmax + margin <= x1 and ymax + margin <= y1:
+                return
+
+        self.region = (max(xmin - pad, 0), max(ymin - pad, 0),
+                       min(xmax + pad, w), min(ymax + pad, h))
+
+    def reset(self):
+        """
+        Forgets the hands tracked so far, the next frame is searched fully.
+        """
+        self.region = None
+        self.regionFrames = 0
+        if hasattr(self.hands, "reset"):
+            self.hands.reset()
+
+    def close(self):
+        self.hands.close()
+
+    def toRGB(self, img):
+        """
+        Converts a BGR image into a buffer that is reused between frames
+        of the same size instead of allocating a new one every frame.
+        """
+        if self.imgRGB is None or self.imgRGB.shape != img.shape:
+            self.imgRGB = np.empty_like(img)
+        self.imgRGB.flags.writeable = True
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self.imgRGB)
+        # Lets mediapipe use the buffer without copying it
+        self.imgRGB.flags.writeable = False
+        return self.imgRGB
+
+    def findDistanceCM(self, p1, p2):
+        """
+        Find the distance from the screen based on two landmarks.
+        :param p1: Point1
+        :param p2: Point2
+        :return: Distance of the hand from the screen
+        """
+
+        x1, y1 = p1
+        x2, y2 = p2
+        length = math.hypot(x2 - x1, y2 - y1)
+        return round(self.A*length**2 + self.B*length + self.C, 2)
+
+    def findDistancesCM(self, p1, p2):
+        """
+        findDistanceCM() of many pairs of landmarks at once.
+        :param p1: Points, array of shape (n, 2)
+        :param p2: Points, array of shape (n, 2)
+        :return: Array of the distances of the hand from the screen
+        """
+        delta = np.asarray(p2, np.float64) - p1
+        length = np.hypot(delta[:, 0], delta[:, 1])
+        return np.round(self.A*length**2 + self.B*length + self.C, 2)
+
+    def getCoordinate(self, landmark_index, img=None, draw=False):
+        """
+        Get the coordinate of a landmark based on its
+        index numbers.
+        :param landmark_index: Index of the landmark
+        """
+        x, y = landmark_index
+        if draw:
+            cv2.circle(img, (x, y), 7, (255, 255, 255), cv2.FILLED)
+            return (x, y), img
+        else:
+            return (x, y)
+
+    def howManyHands(self, hand: list):
+        """
+        Getting how many hands are on the screen. Default maximum number is 7
+        :param hand: first object returned on findHands() function
+        """
+        return len(hand)
+
+
+class LandmarkDetector(HandDetector):
+    """
+    HandDetector for landmarks found elsewhere, on the phone or in a
+    recorded trace. Only the distance calibration is used, no mediapipe
+    model is loaded.
+    """
+
+    def __init__(self):
+        pass
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
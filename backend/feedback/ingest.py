@@ -0,0 +1,220 @@
+"""
+    Feedback sessions fed with landmarks tracked on the phone instead of
+    a video stream. The phone posts them in batches, every batch goes
+    through the same FeedbackSession as the frames of feedback().
+
+    A batch, all coordinates in pixels of the phone's camera image:
+        {
+            "uid": Firebase Firestore's user id,
+            "session": Id the phone picked for the session,
+            "t": Milliseconds of every frame since the session started,
+                 the first absolute, then the difference to the previous,
+            "hands": Number of hands on every frame,
+            "types": "L" or "R" for every hand, e.g "RRL",
+            "points": 42 ints per hand, x and y of the 21 landmarks. The
+                      first hand of the batch absolute, the others as the
+                      difference to the hand before,
+            "end": true on the last batch, optional
+        }
+"""
+import threading
+import time
+import numpy as np
+from hands import HandLandmarks, LandmarkDetector
+from metrics import StageTimer, processMetrics
+from events import hub
+from profiles import getProfiles
+from main import FEEDBACK_TIMING_SAMPLE, FeedbackSession, getExercise, getHandType, liveWriter
+
+
+TYPES = {"L": "Left", "R": "Right"}
+
+
+def decodeBatch(batch):
+    """
+    :return: Milliseconds of every frame and the HandLandmarks on it
+    :raise ValueError: The batch does not add up
+    """
+    times = np.cumsum(np.asarray(batch["t"], np.int64))
+    counts = np.asarray(batch["hands"], np.int64)
+    types = batch.get("types", "")
+    points = np.asarray(batch.get("points", []), np.int32)
+    if len(counts) != len(times):
+        raise ValueError("t and hands differ in length")
+    total = int(counts.sum())
+    if (counts < 0).any() or len(types) != total or points.size != total * 42:
+        raise ValueError("hands, types and points differ in length")
+    if len(times) > 1 and (np.diff(times) < 0).any():
+        raise ValueError("t goes back in time")
+
+    points = np.cumsum(points.reshape(total, 21, 2), axis=0, dtype=np.int32)
+    try:
+        types = [TYPES[kind] for kind in types]
+    except KeyError as e:
+        raise ValueError(f"Unknown hand type {e}")
+    frames = []
+    first = 0
+    for count in counts.tolist():
+        if count:
+            frames.append(HandLandmarks(points[first:first + count], types[first:first + count]))
+        else:
+            frames.append(HandLandmarks.empty())
+        first += count
+    return times.tolist(), frames
+
+
+class LandmarkSession:
+    """
+    A FeedbackSession and what is needed to continue it with the next batch.
+    """
+
+    def __init__(self, uid, delay=2):
+        """
+        :param uid: Firebase Firestore's user id
+        :param delay: Seconds of frames skipped at the start while the
+                      patient gets ready, like feedback() does
+        """
+        profile = getProfiles().get(uid)
+        self.session = FeedbackSession(uid, getExercise(uid, profile), getHandType(uid, profile),
+                                       LandmarkDetector())
+        self.session.resume()
+        self.timer = StageTimer(FEEDBACK_TIMING_SAMPLE)
+        self.delay = delay * 1000
+        self.first = None
+        self.last = None
+        self.frames = 0
+        self.seen = time.time()
+        self.lock = threading.Lock()
+
+    def feed(self, times, frames):
+        """
+        Analyse the frames of a batch. Frames not newer than the last one
+        analysed are skipped, so a batch sent twice does no harm.
+        :return: The response once the session is over, otherwise None
+        """
+        self.seen = time.time()
+        for now, hands in zip(times, frames):
+            if self.first is None:
+                self.first = now
+                self.session.begin()
+            if self.last is not None and now <= self.last:
+                continue
+            self.last = now
+            if now - self.first < self.delay:
+                continue
+            self.frames += 1
+            self.timer.frame()
+            started = self.timer.start()
+            result = self.session.analyse(hands, self.session.start + (now - self.first) / 1000)
+            self.timer.lap("exercise", started)
+            if result is not None:
+                return result
+        return None
+
+    def discard(self):
+        """
+        Drop a session that never got a frame, without writing anything.
+        """
+        self.session.timeline.close()
+
+    def close(self):
+        self.session.close()
+        processMetrics.merge(self.timer)
+        response = self.session.response
+        response["frames"] = self.frames
+        response["timing"] = self.timer.summary()
+        response["writes"] = liveWriter.stats()
+        response["events"] = hub.stats()
+        if self.session.progress is not None:
+            response["progress"] = self.session.progress.stats()
+        return response
+
+
+class LandmarkSessions:
+    """
+    Running landmark sessions of this instance. A session whose phone
+    has not sent anything for timeout seconds is closed.
+    """
+
+    def __init__(self, timeout=60):
+        self.timeout = timeout
+        self.sessions = {}
+        # Ended sessions, so late batches do not start them again
+        self.ended = {}
+        self.lock = threading.Lock()
+
+    def expire(self):
+        """
+        End the sessions that have not sent anything for timeout seconds.
+        They are closed on a thread of their own, closing waits for their
+        writes and the request that noticed them should not.
+        """
+        now = time.time()
+        with self.lock:
+            for key in [key for key, ended in self.ended.items() if now - ended > self.timeout]:
+                del self.ended[key]
+            expired = [key for key, session in self.sessions.items()
+                       if now - session.seen > self.timeout]
+            for key in expired:
+                # A late batch of an expired session does not start it again
+                self.ended[key] = now
+            expired = [self.sessions.pop(key) for key in expired]
+        if expired:
+            threading.Thread(target=self._close, args=(expired,), daemon=True).start()
+
+    def _close(self, sessions):
+        for session in sessions:
+            with session.lock:
+                session.close()
+
+    def handle(self, batch):
+        """
+        Feed a batch to its session, started on the first one.
+        :return: The response of the session when it is over, otherwise
+                 the frames analysed so far
+        :raise ValueError: The batch is malformed
+        """
+        self.expire()
+        times, frames = decodeBatch(batch)
+        key = (batch["uid"], batch["session"])
+        with self.lock:
+            ended = key in self.ended
+            session = self.sessions.get(key)
+        if session is None and not ended:
+            # Built outside the lock, it reads the profile and checkpoint,
+            # and only kept when no other batch started the session meanwhile
+            created = LandmarkSession(batch["uid"])
+            with self.lock:
+                ended = key in self.ended
+                if not ended:
+                    session = self.sessions.setdefault(key, created)
+            if session is not created:
+                created.discard()
+        if ended:
+            return {"session": batch["session"], "ended": True}
+
+        with session.lock:
+            result = session.feed(times, frames)
+            if result is None and not batch.get("end"):
+                return {"session": batch["session"], "frames": session.frames}
+            with self.lock:
+                self.sessions.pop(key, None)
+                self.ended[key] = time.time()
+            response = session.close()
+        if isinstance(result, tuple):
+            # Unknown exercise, an error response
+            return result
+        return response
+
+
+_sessions = None
+_sessions_lock = threading.Lock()
+
+
+def getSessions():
+    global _sessions
+    if _sessions is None:
+        with _sessions_lock:
+            if _sessions is None:
+                _sessions = LandmarkSessions()
+    return _sessions
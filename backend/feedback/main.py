@@ -1,161 +1,49 @@
 from random import randint
 import time
-import cv2
-import mediapipe as mp
-import math
-import numpy as np
 import datetime
-from google.cloud import firestore
+import os
+import threading
+from hands import HandDetector
+from writer import WriteBehindQueue
+from storage import getStorage
+from profiles import getProfiles
+from timeline import Timeline
+from capture import FrameGrabber
+from pool import DetectorPool
+from sampling import FrameSampler
+from presence import PresenceGate
+from stream import openStream, reconnectStream
+from progress import SessionProgress
+from movement import MovementEngine, SIDE_TO_SIDE, UP_AND_DOWN, GRADES, plain
+from metrics import StageTimer, NO_TIMING, processMetrics
+from events import hub, stream as eventStream
 
 
-class HandDetector:
+class Exercise:
     """
-    Finds Hands using the mediapipe library. Exports the landmarks
-    in pixel format. Adds extra functionalities like finding how
-    many hands are on screen or the distance of the hand from the screen.
+    The exercises, each one feeds the landmarks it follows to a
+    MovementEngine with its own threshold table from movement.py.
     """
 
-    def __init__(self, mode=False, maxHands=7, model_complexity=0, detectionCon=0.5, minTrackCon=0.5):
-        """
-        :param mode: In static mode, detection is done on each image, this is slower
-        :param maxHands: Maximum number of hands to detect
-        :param detectionCon: Minimum Detection Confidence 
-        :param minTrackCon: Minimum Tracking Confidence
-        """
-        self.mode = mode
-        self.maxHands = maxHands
-        self.detectionCon = detectionCon
-        self.minTrackCon = minTrackCon
-        self.model_complexity = model_complexity
-
-        self.mpHands = mp.solutions.hands
-        self.hands = self.mpHands.Hands(static_image_mode=self.mode, max_num_hands=self.maxHands,
-                                        model_complexity=self.model_complexity, min_detection_confidence=self.detectionCon,
-                                        min_tracking_confidence=self.minTrackCon)
-        self.mpDraw = mp.solutions.drawing_utils
-        self.tipIds = [4, 8, 12, 16, 20]
-        self.fingers = []
-        self.lmList = []
-        self.x = [300, 245, 200, 170, 145, 130, 112,
-                  103, 93, 87, 80, 75, 70, 67, 62, 59, 57]
-        self.y = [20, 25, 30, 35, 40, 45, 50, 55,
-                  60, 65, 70, 75, 80, 85, 90, 95, 100]
-        self.A, self.B, self.C = np.polyfit(self.x, self.y, 2)
-
-    def findHands(self, img, draw=True, flipType=True):
-        """
-        Finds hands in a BGR image.
-        :param img: Image to find the hands in.
-        :param draw: Flag to draw the output on the image.
-        :return: Image with or without drawings
-        """
-        imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        self.results = self.hands.process(imgRGB)
-        allHands = []
-        h, w, c = img.shape
-        if self.results.multi_hand_landmarks:
-            for handType, handLms in zip(self.results.multi_handedness, self.results.multi_hand_landmarks):
-                myHand = {}
-
-                mylmList = []
-                xList = []
-                yList = []
-                for id, lm in enumerate(handLms.landmark):
-                    px, py = int(lm.x * w), int(lm.y * h)
-                    mylmList.append([px, py])
-                    xList.append(px)
-                    yList.append(py)
-
-                # bound box
-                xmin, xmax = min(xList), max(xList)
-                ymin, ymax = min(yList), max(yList)
-                boxW, boxH = xmax - xmin, ymax - ymin
-                bbox = xmin, ymin, boxW, boxH
-                cx, cy = bbox[0] + (bbox[2] // 2), \
-                    bbox[1] + (bbox[3] // 2)
-
-                myHand["lmList"] = mylmList
-                myHand["bbox"] = bbox
-                myHand["center"] = (cx, cy)
-
-                if flipType:
-                    if handType.classification[0].label == "Right":
-                        myHand["type"] = "Left"
-                    else:
-                        myHand["type"] = "Right"
-                else:
-                    myHand["type"] = handType.classification[0].label
-                allHands.append(myHand)
-
-                # draw
-                if draw:
-                    self.mpDraw.draw_landmarks(img, handLms,
-                                               self.mpHands.HAND_CONNECTIONS)
-                    cv2.rectangle(img, (bbox[0] - 20, bbox[1] - 20),
-                                  (bbox[0] + bbox[2] + 20,
-                                   bbox[1] + bbox[3] + 20),
-                                  (255, 0, 255), 2)
-                    cv2.putText(img, myHand["type"], (bbox[0] - 30, bbox[1] - 30), cv2.FONT_HERSHEY_PLAIN,
-                                2, (255, 0, 255), 2)
-        if draw:
-            return allHands, img
-        else:
-            return allHands
-
-    def findDistanceCM(self, p1, p2):
-        """
-        Find the distance from the screen based on two landmarks.
-        :param p1: Point1
-        :param p2: Point2
-        :return: Distance of the hand from the screen
-        """
-
-        x1, y1 = p1
-        x2, y2 = p2
-        length = math.hypot(x2 - x1, y2 - y1)
-        return round(self.A*length**2 + self.B*length + self.C, 2)
-
-    def getCoordinate(self, landmark_index, img=None, draw=False):
-        """
-        Get the coordinate of a landmark based on its
-        index numbers.
-        :param landmark_index: Index of the landmark
-        """
-        x, y = landmark_index
-        if draw:
-            cv2.circle(img, (x, y), 7, (255, 255, 255), cv2.FILLED)
-            return (x, y), img
-        else:
-            return (x, y)
-
-    def howManyHands(self, hand: list):
+    def __init__(self, initial0=None, initial12=None, center=None, change=None,
+                 sideToSide=SIDE_TO_SIDE, upAndDown=UP_AND_DOWN, sideValues=(100, 120, 160)):
         """
-        Getting how many hands are on the screen. Default maximum number is 7
-        :param hand: first object returned on findHands() function
+        The defaults are the tuned values, others are only for
+        re-scoring recorded sessions, see traces.py.
+        :param sideToSide: Threshold table of wristSideToSide
+        :param upAndDown: Threshold table of wristUpAndDown
+        :param sideValues: Top band edge of wristSideToSide for a hand
+                           far from, in the middle and near the screen
         """
-        return len(hand)
-
-
-class Exercise:
-    def __init__(self, initial0=None, initial12=None, center=None, change=None):
         self.initial0 = initial0
         self.initial12 = initial12
         self.change = change
-        self.side_value = 120
-        self.uploader = 0
-        self.upload_avr = []
-        self.avr_left_controller = None
-        self.avr_right_controller = None
-        self.average_change = 0
-        self.score_list = []
-        self.start_time = None
-        self.side_done = False
-        self.keys = {
-            0: "bad",
-            1: "trying",
-            2: "nice",
-            3: "very good"
-        }
+        self.sideToSide = sideToSide
+        self.upAndDown = upAndDown
+        self.sideValues = sideValues
+        self.side_value = sideValues[1]
+        self.engine = MovementEngine()
+        self.keys = dict(enumerate(GRADES))
 
     def fluctuation(self, new, old):
         return (abs(new[0] - old[0]) + abs(new[1] - old[1])) // 2
@@ -165,248 +53,28 @@ class Exercise:
             return False
         return True
 
-    def wristSideToSide(self, index0, index12, dista):
+    def wristSideToSide(self, index0, index12, dista, now=None):
         if self.handSeenWell(index0, index12):
             if dista > 100:
-                self.side_value = 100
+                self.side_value = self.sideValues[0]
             elif dista > 50 and dista < 100:
-                self.side_value = 120
+                self.side_value = self.sideValues[1]
             else:
-                self.side_value = 160
+                self.side_value = self.sideValues[2]
 
             if self.initial0 == None and self.initial12 == None:
                 self.initial0 = index0[0]
                 self.initial12 = index12[0]
 
             # The hand is on the same position and not moving the whole hand
-            if index0[0] in list(range(self.initial0 - 20, self.initial0 + 21)):
-
+            if abs(index0[0] - self.initial0) <= 20:
                 self.change = abs(self.initial12 - index12[0])
-
-                if len(self.upload_avr) >= 5:
-                    self.uploader = sum(
-                        self.upload_avr) // (len(self.upload_avr) - 1)
-
-                    self.upload_avr = []
-
-                    return self.keys[self.uploader]
-
-                elif len(self.score_list) >= 3:
-                    score = round(
-                        ((sum(self.score_list) // len(self.score_list)) / 160) * 100, 3)
-                    self.score_list = []
-                    return score
-
-                # Going Right side
-                if index12[0] > self.initial12:
-
-                    # Appending to array of 5 movements
-                    if self.avr_right_controller != None:
-                        self.upload_avr.append(self.avr_right_controller)
-                        self.score_list.append(self.average_change)
-                        self.avr_right_controller = None
-                        self.average_change = 0
-                        self.side_done = False
-
-                    # Checking how far
-                    if self.change >= 5 and self.change <= 20:
-                        if self.start_time == None and self.side_done == False:
-                            self.start_time = time.time()
-
-                        if self.avr_left_controller == None:
-                            self.avr_left_controller = 0
-
-                        elif self.avr_left_controller <= 0:
-                            self.avr_left_controller = 0
-
-                        if self.average_change <= self.change:
-                            self.average_change = self.change
-                        elif self.change + 5 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif self.change > 20 and self.change <= self.side_value - 40:
-                        if self.avr_left_controller == None:
-                            self.avr_left_controller = 1
-                            self.average_change = self.change
-                        elif self.avr_left_controller <= 1:
-                            self.avr_left_controller = 1
-                            self.average_change = self.change
-
-                        if self.average_change <= self.change:
-                            self.average_change = self.change
-                        elif self.change + 5 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif self.change > self.side_value - 40 and self.change <= self.side_value:
-                        if self.avr_left_controller == None:
-                            self.avr_left_controller = 2
-                            self.average_change = self.change
-                        elif self.avr_left_controller <= 2:
-                            self.avr_left_controller = 2
-                            self.average_change = self.change
-
-                        if self.average_change <= self.change:
-                            self.average_change = self.change
-                        elif self.change + 5 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif self.change > self.side_value:
-                        if self.avr_left_controller == None:
-                            self.avr_left_controller = 3
-                            self.average_change = self.change
-                        elif self.avr_left_controller <= 3:
-                            self.avr_left_controller = 3
-                            self.average_change = self.change
-
-                        if self.average_change <= self.change:
-                            self.average_change = self.change
-                        elif self.change + 5 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                # Going Left side
-                elif index12[0] < self.initial12:
-
-                    # Appending to array of 5 movements
-                    if self.avr_left_controller != None:
-                        self.upload_avr.append(self.avr_left_controller)
-                        self.score_list.append(self.average_change)
-                        self.avr_left_controller = None
-                        self.average_change = 0
-                        self.side_done = False
-
-                    # Checking how far
-                    if self.change >= 5 and self.change <= 20:
-                        if self.start_time == None and self.side_done == False:
-                            self.start_time = time.time()
-
-                        if self.avr_right_controller == None:
-                            self.avr_right_controller = 0
-                        elif self.avr_right_controller <= 0:
-                            self.avr_right_controller = 0
-
-                        if self.average_change <= self.change:
-                            self.average_change = self.change
-                        elif self.change + 5 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif self.change > 20 and self.change <= self.side_value - 40:
-                        if self.avr_right_controller == None:
-                            self.avr_right_controller = 1
-                        elif self.avr_right_controller <= 1:
-                            self.avr_right_controller = 1
-
-                        if self.average_change <= self.change:
-                            self.average_change = self.change
-                        elif self.change + 5 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif self.change > self.side_value - 40 and self.change <= self.side_value:
-                        if self.avr_right_controller == None:
-                            self.avr_right_controller = 2
-                        elif self.avr_right_controller <= 2:
-                            self.avr_right_controller = 2
-
-                        if self.average_change <= self.change:
-                            self.average_change = self.change
-                        elif self.change + 5 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif self.change > self.side_value:
-                        if self.avr_right_controller == None:
-                            self.avr_right_controller = 3
-                        elif self.avr_right_controller <= 3:
-                            self.avr_right_controller = 3
-
-                        if self.average_change <= self.change:
-                            self.average_change = self.change
-                        elif self.change + 5 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
+                return self.engine.step(self.sideToSide, index12[0] - self.initial12, now=now,
+                                        edges=(self.sideToSide.edges[0], self.side_value - 40, self.side_value))
 
             else:
                 self.initial0, self.initial12 = None, None
-                self.start_time = None
-                self.side_done = True
-                end_time = 0
+                self.engine.interrupt()
                 return "Whole hand movement"
 
         else:
@@ -417,498 +85,77 @@ class Exercise:
             return True
         return False
 
-    def wristUpAndDown(self, index0, index4, index8, index12, index16, index20, handType):
-
-        dista = abs(index0[0] - index12[0])
+    def wristUpAndDown(self, index0, index4, index8, index12, index16, index20, handType, now=None):
 
         if self.checkUpAndDown(index4, index8, index12, index16, index20):
 
-            if handType == "Right":
-                if len(self.upload_avr) >= 5:
-                    self.uploader = sum(
-                        self.upload_avr) // (len(self.upload_avr) - 1)
-
-                    self.upload_avr = []
-
-                    return self.keys[self.uploader]
-
-                elif len(self.score_list) >= 3:
-                    score = round(
-                        ((sum(self.score_list) // len(self.score_list)) / 200) * 100, 3)
-                    self.score_list = []
-                    return score
-
-                if index12[0] > index0[0]:
-
-                    # Appending to array of 5 movements
-                    if self.avr_right_controller != None:
-                        self.upload_avr.append(self.avr_right_controller)
-                        self.score_list.append(self.average_change)
-                        self.avr_right_controller = None
-                        self.average_change = 0
-                        self.side_done = False
-
-                    # Checking how far
-                    if dista > 6 and dista <= 100:
-                        if self.start_time == None and self.side_done == False:
-                            self.start_time = time.time()
-
-                        if self.avr_left_controller == None:
-                            self.avr_left_controller = 0
-                        elif self.avr_left_controller <= 0:
-                            self.avr_left_controller = 0
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif dista > 100 and dista <= 150:
-                        if self.avr_left_controller == None:
-                            self.avr_left_controller = 1
-                        elif self.avr_left_controller <= 1:
-                            self.avr_left_controller = 1
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif dista > 150 and dista <= 200:
-                        if self.avr_left_controller == None:
-                            self.avr_left_controller = 2
-                        elif self.avr_left_controller <= 2:
-                            self.avr_left_controller = 2
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif dista > 200:
-                        if self.avr_left_controller == None:
-                            self.avr_left_controller = 3
-                        elif self.avr_left_controller <= 3:
-                            self.avr_left_controller = 3
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                elif index12[0] < index0[0]:
-                    # Appending to array of 5 movements
-                    if self.avr_left_controller != None:
-                        self.upload_avr.append(self.avr_left_controller)
-                        self.score_list.append(self.average_change)
-                        self.avr_left_controller = None
-                        self.average_change = 0
-                        self.side_done = False
-
-                    # Checking how far
-                    if dista > 6 and dista <= 100:
-                        if self.start_time == None and self.side_done == False:
-                            self.start_time = time.time()
-
-                        if self.avr_right_controller == None:
-                            self.avr_right_controller = 0
-                        elif self.avr_right_controller <= 0:
-                            self.avr_right_controller = 0
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif dista > 100 and dista <= 150:
-                        if self.avr_right_controller == None:
-                            self.avr_right_controller = 1
-                        elif self.avr_right_controller <= 1:
-                            self.avr_right_controller = 1
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif dista > 150 and dista <= 200:
-                        if self.avr_right_controller == None:
-                            self.avr_right_controller = 2
-                        elif self.avr_right_controller <= 2:
-                            self.avr_right_controller = 2
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif dista > 200:
-                        if self.avr_right_controller == None:
-                            self.avr_right_controller = 3
-                        elif self.avr_right_controller <= 3:
-                            self.avr_right_controller = 3
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-            elif handType == "Left":
-                if len(self.upload_avr) >= 5:
-                    self.uploader = sum(
-                        self.upload_avr) // (len(self.upload_avr) - 1)
-
-                    self.upload_avr = []
-
-                    return self.keys[self.uploader]
-
-                elif len(self.score_list) >= 3:
-                    score = round(
-                        ((sum(self.score_list) // len(self.score_list)) / 200) * 100, 3)
-                    self.score_list = []
-                    return score
-
-                if index12[0] > index0[0]:
-                    # Appending to array of 5 movements
-                    if self.avr_left_controller != None:
-                        self.upload_avr.append(self.avr_left_controller)
-                        self.score_list.append(self.average_change)
-                        self.avr_left_controller = None
-                        self.average_change = 0
-                        self.side_done = False
-
-                    # Checking how far
-                    if dista > 6 and dista <= 100:
-                        if self.start_time == None and self.side_done == False:
-                            self.start_time = time.time()
-
-                        if self.avr_right_controller == None:
-                            self.avr_right_controller = 0
-                        elif self.avr_right_controller <= 0:
-                            self.avr_right_controller = 0
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif dista > 100 and dista <= 150:
-                        if self.avr_right_controller == None:
-                            self.avr_right_controller = 1
-                        elif self.avr_right_controller <= 1:
-                            self.avr_right_controller = 1
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif dista > 150 and dista <= 200:
-                        if self.avr_right_controller == None:
-                            self.avr_right_controller = 2
-                        elif self.avr_right_controller <= 2:
-                            self.avr_right_controller = 2
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif dista > 200:
-                        if self.avr_right_controller == None:
-                            self.avr_right_controller = 3
-                        elif self.avr_right_controller <= 3:
-                            self.avr_right_controller = 3
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                elif index12[0] < index0[0]:
-                    # Appending to array of 5 movements
-                    if self.avr_right_controller != None:
-                        self.upload_avr.append(self.avr_right_controller)
-                        self.score_list.append(self.average_change)
-                        self.avr_right_controller = None
-                        self.average_change = 0
-                        self.side_done = False
-
-                    # Checking how far
-                    if dista > 6 and dista <= 100:
-                        if self.start_time == None and self.side_done == False:
-                            self.start_time = time.time()
-
-                        if self.avr_left_controller == None:
-                            self.avr_left_controller = 0
-                        elif self.avr_left_controller <= 0:
-                            self.avr_left_controller = 0
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif dista > 100 and dista <= 150:
-                        if self.avr_left_controller == None:
-                            self.avr_left_controller = 1
-                        elif self.avr_left_controller <= 1:
-                            self.avr_left_controller = 1
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif dista > 150 and dista <= 200:
-                        if self.avr_left_controller == None:
-                            self.avr_left_controller = 2
-                        elif self.avr_left_controller <= 2:
-                            self.avr_left_controller = 2
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
-
-                    elif dista > 200:
-                        if self.avr_left_controller == None:
-                            self.avr_left_controller = 3
-                        elif self.avr_left_controller <= 3:
-                            self.avr_left_controller = 3
-
-                        if self.average_change <= dista:
-                            self.average_change = dista
-                        elif dista + 10 < self.average_change:
-                            if self.start_time != None:
-                                end_time = time.time()
-                                if end_time - self.start_time > 1:
-                                    final_time = round(
-                                        end_time - self.start_time, 3), "time"
-                                else:
-                                    final_time = "time"
-                                self.start_time = None
-                                self.side_done = True
-                                end_time = 0
-                                return final_time
+            # The left hand moves the other way round
+            if handType == "Right" or handType == "Left":
+                return self.engine.step(self.upAndDown, index12[0] - index0[0],
+                                        flip=handType == "Left", now=now)
 
         else:
             return "Hand position"
 
+    def checkpoint(self):
+        """
+        Where the hand started and the state of the engine, restore()
+        takes it back.
+        """
+        return {
+            "initial0": plain(self.initial0),
+            "initial12": plain(self.initial12),
+            "change": plain(self.change),
+            "sideValue": self.side_value,
+            "engine": self.engine.checkpoint()
+        }
+
+    def restore(self, state):
+        self.initial0 = state["initial0"]
+        self.initial12 = state["initial12"]
+        self.change = state["change"]
+        self.side_value = state["sideValue"]
+        self.engine.restore(state["engine"])
+        # The rep that was going on when the stream broke is lost
+        self.engine.interrupt()
+
 
 def averaging(a_list):
     return round((sum(a_list) / (len(a_list) - 1)) / 0.0319962, 5)
 
 
-def updateLiveComments(error, message, uid):
-    db = firestore.Client()
-    doc_ref = db.document(
-        f"users/{uid}/liveComments/{str(datetime.date.today())}")
-
-    doc = doc_ref.get()
-    if doc.exists:
-        doc_ref.set({
-            u"error": error,
-            u"message": message
-        }, merge=True)
-    else:
-        db.document(f"users/{uid}/liveComments/{str(datetime.date.today())}").set({
-            u"error": error,
-            u"message": message
-        })
+liveWriter = WriteBehindQueue()
 
+# Seconds the Firestore copy of the live comments waits for newer ones
+# while the phone gets them pushed by events.py
+FEEDBACK_MIRROR_DELAY = 1
 
-def updateResults(uid, score, time, exercise):
-    db = firestore.Client()
-    doc_ref = db.document(
-        f"users/{uid}/liveComments/{str(datetime.date.today())}")
 
-    doc = doc_ref.get()
-    if doc.exists:
-        if exercise == "wristSideToSide":
-            doc_ref.set({
-                exercise: {u"score": score,
-                        u"time": time}
-            })
-        elif exercise == "wristUpAndDown":
-            doc_ref.update({
-                exercise: {u"score": score,
-                           u"time": time}
-            })
+def updateLiveComments(error, message, uid):
+    pushed = hub.publish(uid, {"error": error, "message": message})
+    liveWriter.set(getStorage().liveCommentsPath(uid), {
+        u"error": error,
+        u"message": message
+    }, merge=True, delay=FEEDBACK_MIRROR_DELAY if pushed else None)
 
 
 def nextExercise(uid, delete=False):
-    db = firestore.Client()
-    doc_ref = db.collection(u"users").document(uid)
+    profiles = getProfiles()
 
     if delete:  # Delete means end of the day's exercise
         new_date = datetime.datetime.now(
             tz=datetime.timezone.utc) + datetime.timedelta(days=1)
-        doc_ref.update({
-            u"nextExercise": new_date.replace(hour=randint(12, 16)),
-            u"exer": firestore.DELETE_FIELD
-        })
+        profiles.finishDay(uid, new_date.replace(hour=randint(12, 16)))
 
     else:
-        doc = doc_ref.get()
-        if doc.exists:
-            doc_ref.set({"exer": firestore.Increment(1)}, merge=True)
-        else:
-            data = {"exer": 1}
-            db.collection(u"users").document(uid).set(data)
+        profiles.incrementExercise(uid)
+
 
+def errorPosting(error, the_type, uid, timeline=None):
+    if timeline is not None and timeline.holding():
+        # Still showing the whole hand movement warning
+        return the_type
 
-def errorPosting(error, the_type, uid):
     if error == "Hand position" and the_type != error:
         errors = {
             "type": error,
@@ -930,16 +177,21 @@ def errorPosting(error, the_type, uid):
         # print(errors["message"])
         updateLiveComments(
             errors, message, uid)
-        time.sleep(5)
         errors = {
             "type": "none",
             "message": "none"
         }
         message = "Proceed with exercise."
-        updateLiveComments(
-            errors, message, uid)
-        # print(message)
-        time.sleep(2)
+        if timeline is not None:
+            timeline.schedule(5, updateLiveComments,
+                              errors, message, uid, key="proceed")
+            timeline.hold(7)
+        else:
+            time.sleep(5)
+            updateLiveComments(
+                errors, message, uid)
+            # print(message)
+            time.sleep(2)
 
     elif error == "bad":
         errors = {
@@ -985,11 +237,7 @@ def errorPosting(error, the_type, uid):
 
 
 def uploadPostPone(uid):
-    db = firestore.Client()
-    doc_ref = db.collection(u"users").document(uid)
-    doc = doc_ref.get()
-    if doc.exists:
-        doc_ref.update({u"postPoned": firestore.Increment(1)})
+    getProfiles().postpone(uid)
 
 
 def the_average(score):
@@ -998,201 +246,576 @@ def the_average(score):
     return sum(score) // len(score)
 
 
-def getExercise(uid):
-    db = firestore.Client()
-    doc_ref = db.collection(u"users").document(uid)
-    doc = doc_ref.get()
-    if doc.exists:
-        try:
-            return int(doc.get("exer"))
-        except:
-            data = doc.to_dict()
-            data["exer"] = 0
-            db.collection(u"users").document(uid).set(data)
-            return 0
-    else:
-        data = {"exer": 0}
-        db.collection(u"users").document(uid).set(data)
+def getExercise(uid, profile=None):
+    """
+    :param profile: Snapshot of the profile of uid, read when not given
+    """
+    if profile is None:
+        profile = getProfiles().get(uid)
+    try:
+        return int(profile["exer"])
+    except (KeyError, TypeError, ValueError):
+        # Also creates the profile when there is none
+        getProfiles().setExercise(uid, 0)
         return 0
 
 
-def getHandType(uid):
-    db = firestore.Client()
-    doc_ref = db.collection(u"users").document(uid)
-    doc = doc_ref.get()
-    if doc.exists:
-        try:
-            return doc.get("paralysedHand")
-        except:
-            return None
+def getHandType(uid, profile=None):
+    """
+    :param profile: Snapshot of the profile of uid, read when not given
+    """
+    if profile is None:
+        profile = getProfiles().get(uid)
+    return profile.get("paralysedHand")
 
 
-def feedback(request):
-    if request.method == "POST":
-        request_data = request.get_json()
-        response = {}
-
-        cap = cv2.VideoCapture(request_data["source"])  # video stream
-        detector = HandDetector(detectionCon=0.8, maxHands=3)
-        exercise = Exercise()
-        run = True
-        the_type = ""
-        light_issue, post_pone = 0, 0
-        score = []
-        the_time = []
-        exer = getExercise(request_data["uid"])
-        hand_type = getHandType(request_data["uid"])
-        started = False
-        start = time.time()
-        while run:
-            success, img = cap.read()
-            if success:
-                if started == False:
-                    error = {
-                        "type": "none",
-                        "message": "none"
-                    }
-                    message = "Start the exercise."
-                    updateLiveComments(error, message, request_data["uid"])
-                    time.sleep(2)
-                    started = True
-                hands, img = detector.findHands(img, True)
-                if hands:
-                    if the_type == "No hands":
+FEEDBACK_DETECTOR = {"detectionCon": 0.8, "maxHands": 3, "roi": True}
+FEEDBACK_SAMPLING = {"minRate": 4, "maxRate": 15}
+
+# How often the frames are checked for motion while nobody is in front of the camera
+FEEDBACK_PRESENCE = {"rate": 2, "idleAfter": 10, "recheck": 2}
+
+# Seconds the patient gets to get ready before the frames are analysed
+FEEDBACK_START_DELAY = 2
+
+# Seconds between commits of the results and reps of a running session
+FEEDBACK_PROGRESS_INTERVAL = 5
+
+EXERCISES = ("wristSideToSide", "wristUpAndDown")
+
+# Seconds to wait for the stream, and the width frames are shrunk to after
+# decoding. The landmarks are scaled back, so the exercise thresholds
+# keep their meaning in the pixels of the stream.
+FEEDBACK_STREAM = {"timeout": 5, "width": 640}
+
+# Attempts to open a broken stream again, waiting delay seconds before
+# the first and twice as long before every next one, at most maxDelay
+FEEDBACK_RECONNECT = {"attempts": 4, "delay": 0.5, "maxDelay": 4}
+
+# Seconds a checkpoint can be resumed by a new request after its stream broke
+FEEDBACK_CHECKPOINT_TTL = 120
+
+# Share of the frames whose stages are timed, one in 30 by default,
+# 1 times every frame and 0 turns the timers off
+FEEDBACK_TIMING_SAMPLE = float(os.environ.get("FEEDBACK_TIMING_SAMPLE", 1 / 30))
+
+detectorPool = DetectorPool(HandDetector)
+detectorPool.warm(1, **FEEDBACK_DETECTOR)
+
+
+def pickHand(hands, hand_type, previous=None):
+    """
+    The hand to follow among the hands on a frame.
+    :param hands: First object returned on findHands() function
+    :param hand_type: Paralysed hand of the user
+    :param previous: Hand followed on the previous frame, kept when
+                     none of several hands is the paralysed one
+    """
+    if len(hands) > 1:
+        for i in hands:
+            if i.type == hand_type:
+                return i
+        return previous if previous is not None else hands[0]
+    return hands[0]
+
+
+class FeedbackSession:
+    """
+    One patient's exercise session. It is fed with the hands found on
+    every analysed frame, keeps the exercise state and posts the live
+    comments. The frames can come from anywhere, see runFeedback().
+    """
+
+    def __init__(self, uid, exer, hand_type, detector):
+        """
+        :param uid: Firebase Firestore's user id
+        :param exer: Index of the exercise, see getExercise()
+        :param hand_type: Paralysed hand of the user
+        :param detector: Detector the hands come from, for its distance
+                         and hand counting helpers
+        """
+        self.uid = uid
+        self.exer = exer
+        self.hand_type = hand_type
+        self.detector = detector
+        self.exercise = Exercise()
+        self.timeline = Timeline()
+        self.hand = None
+        self.the_type = ""
+        self.light_issue, self.post_pone = 0, 0
+        self.start = time.time()
+        self.progress = SessionProgress(uid, EXERCISES[exer], self.start) \
+            if exer in (0, 1) else None
+        # Held while a frame is analysed, so a checkpoint never sees half of one
+        self.lock = self.progress.lock if self.progress is not None else threading.RLock()
+        self.finished = False
+        self.resumable = True
+        self.response = {}
+        # Frames analysed
+        self.frames = 0
+
+    def checkpoint(self):
+        """
+        The state of the session as plain values, written with the
+        progress so a new request can resume() it.
+        """
+        with self.lock:
+            if not self.resumable:
+                return {}
+            return {
+                "exer": self.exer,
+                "elapsed": round(time.time() - self.start, 3),
+                "saved": time.time(),
+                "type": self.the_type,
+                "lightIssue": self.light_issue,
+                "postPone": self.post_pone,
+                "exercise": self.exercise.checkpoint(),
+                "progress": self.progress.checkpoint()
+            }
+
+    def resume(self, ttl=None):
+        """
+        Continue from the checkpoint of an earlier request of the same
+        exercise, when its stream broke less than ttl seconds ago.
+        :return: True when the session was resumed
+        """
+        if self.progress is None:
+            return False
+        state = getStorage().checkpoint(self.uid)
+        ttl = FEEDBACK_CHECKPOINT_TTL if ttl is None else ttl
+        if not state or state.get("exer") != self.exer or time.time() - state["saved"] > ttl:
+            return False
+        with self.lock:
+            self.start = time.time() - state["elapsed"]
+            self.progress.start = self.start
+            self.the_type = state["type"]
+            self.light_issue = state["lightIssue"]
+            self.post_pone = state["postPone"]
+            self.exercise.restore(state["exercise"])
+            self.progress.restore(state["progress"])
+        self.response["resumed"] = {"elapsed": state["elapsed"], "reps": self.progress.reps}
+        return True
+
+    def reconnected(self):
+        """
+        The stream came back after it broke.
+        """
+        with self.lock:
+            # Time passed without frames, the rep going on is lost
+            self.exercise.engine.interrupt()
+
+    def begin(self):
+        error = {
+            "type": "none",
+            "message": "none"
+        }
+        message = "Continue the exercise." if "resumed" in self.response else "Start the exercise."
+        updateLiveComments(error, message, self.uid)
+        if self.progress is not None:
+            self.timeline.schedule(FEEDBACK_PROGRESS_INTERVAL,
+                                   self.commitProgress, key="progress")
+
+    def commitProgress(self, final=False):
+        self.progress.commit(final, self.checkpoint)
+        if not final and not self.finished:
+            self.timeline.schedule(FEEDBACK_PROGRESS_INTERVAL,
+                                   self.commitProgress, key="progress")
+
+    def finish(self):
+        """
+        The exercise is over, the final results are written after the
+        closing message.
+        """
+        self.finished = True
+        self.timeline.schedule(2, self.commitProgress, True, key="progress")
+
+    def analyse(self, hands, now=None):
+        """
+        Runs the exercise on the hands found on a frame.
+        :param hands: First object returned on findHands() function
+        :param now: When the frame was taken, defaults to now
+        :return: The response once the session is over, otherwise None
+        """
+        with self.lock:
+            self.frames += 1
+            return self._analyse(hands, now)
+
+    def _analyse(self, hands, now):
+        uid = self.uid
+        if hands:
+            if self.the_type == "No hands":
+                error = {
+                    "type": "none",
+                    "message": "none"
+                }
+                message = "Proceed with the exercise."
+                self.the_type = ""
+                updateLiveComments(
+                    error, message, uid)
+            if self.light_issue < 5:
+                hand = self.hand = pickHand(hands, self.hand_type, self.hand)
+
+                # Only the landmarks the exercise reads are turned into
+                # lists, the engine is slower on NumPy numbers
+                points = hand.points
+                handType = hand.type
+
+                if self.exer == 0:
+                    dista = self.detector.findDistanceCM(
+                        points[5].tolist(), points[17].tolist())
+
+                    the_message = self.exercise.wristSideToSide(
+                        points[0].tolist(), points[12].tolist(), dista, now)
+
+                    if the_message == "Whole hand movement":
+                        # Not counted again while its warning is shown,
+                        # like when the warning slept through those frames
+                        if not self.timeline.holding():
+                            self.light_issue += 1
+                    else:
+                        self.progress.record(
+                            the_message, now if now is not None else time.time())
+
+                    self.the_type = errorPosting(
+                        the_message, self.the_type, uid, self.timeline)
+                    end = time.time()
+
+                    if end - self.start >= 60:
                         error = {
                             "type": "none",
                             "message": "none"
                         }
-                        message = "Proceed with the exercise."
-                        the_type = ""
+                        message = "This exercise is over. Get ready for another exercise."
                         updateLiveComments(
-                            error, message, request_data["uid"])
-                    if light_issue < 5:
-                        if detector.howManyHands(hands) > 1:
-                            for i in hands:
-                                if i["type"] == hand_type:
-                                    hand = i
-                        elif detector.howManyHands(hands) == 1:
-                            hand = hands[0]
-
-                        lmList = hand["lmList"]
-                        handType = hand["type"]
-
-                        if exer == 0:
-                            dista = detector.findDistanceCM(
-                                lmList[5], lmList[17])
-
-                            the_message = exercise.wristSideToSide(
-                                lmList[0], lmList[12], dista)
-
-                            if the_message == "Whole hand movement":
-                                light_issue += 1
-                            elif type(the_message) == float:
-                                score.append(the_message)
-                            elif type(the_message) == tuple:
-                                the_time.append(the_message[0])
-
-                            the_type = errorPosting(
-                                the_message, the_type, request_data["uid"])
-                            end = time.time()
-
-                            if end - start >= 60:
-                                error = {
-                                    "type": "none",
-                                    "message": "none"
-                                }
-                                message = "This exercise is over. Get ready for another exercise."
-                                updateLiveComments(
-                                    error, message, request_data["uid"])
-                                nextExercise(request_data["uid"])
-                                time.sleep(2)
-                                updateResults(request_data["uid"], the_average(score), round(
-                                    sum(the_time) / len(the_time), 3), "wristSideToSide")
-                                response["message"] = message
-                                run = False
-                                return response
-
-                        elif exer == 1:
-                            the_message = exercise.wristUpAndDown(
-                                lmList[0], lmList[4], lmList[8], lmList[12], lmList[16], lmList[20], handType)
-
-                            if the_message == "Whole hand movement":
-                                light_issue += 1
-                            elif type(the_message) == float:
-                                score.append(the_message)
-                            elif type(the_message) == tuple:
-                                the_time.append(the_message[0])
-
-                            the_type = errorPosting(
-                                the_message, the_type, request_data["uid"])
-                            end = time.time()
-
-                            if end - start >= 60:
-                                error = {
-                                    "type": "none",
-                                    "message": "none"
-                                }
-                                message = "Congratulation for today's exercise, let's meet again tomorrow."
-                                response["message"] = message
-                                run = False
-                                updateLiveComments(
-                                    error, message, request_data["uid"])
-                                nextExercise(request_data["uid"], True)
-                                time.sleep(2)
-                                updateResults(request_data["uid"], the_average(score), round(
-                                    sum(the_time) / len(the_time), 3), "wristUpAndDown")
-                                return response
-
-                        else:
-                            return f"Unknown exercise requested: {exer}", 404
+                            error, message, uid)
+                        nextExercise(uid)
+                        self.finish()
+                        self.response["message"] = message
+                        return self.response
+
+                elif self.exer == 1:
+                    the_message = self.exercise.wristUpAndDown(
+                        points[0].tolist(), points[4].tolist(), points[8].tolist(),
+                        points[12].tolist(), points[16].tolist(), points[20].tolist(), handType, now)
+
+                    if the_message == "Whole hand movement":
+                        # Not counted again while its warning is shown,
+                        # like when the warning slept through those frames
+                        if not self.timeline.holding():
+                            self.light_issue += 1
                     else:
-                        if post_pone < 3:
-                            error = {
-                                "type": "Insufficient light",
-                                "message": "Please make sure you are on a place with sufficient light and then start again, and trying not to move your whole hand. just move your wrist"
-                            }
-                            message = "none"
-                            updateLiveComments(
-                                error, message, request_data["uid"])
-                            light_issue = 0
-                            post_pone += 1
-                        else:
-                            error = {
-                                "type": "Postponed exercise",
-                                "message": "The exercise is postponed because of light issues on your area, This can cause poor exercising and measurement results so let's meet tomorrow."
-                            }
-                            message = "none"
-                            print(error["message"])
-                            updateLiveComments(
-                                error, message, request_data["uid"])
-                            uploadPostPone(request_data['uid'])
-                            response["message"] = error["message"]
-                            run = False
-                            return response
+                        self.progress.record(
+                            the_message, now if now is not None else time.time())
 
-                else:
-                    if the_type != "No hands":
+                    self.the_type = errorPosting(
+                        the_message, self.the_type, uid, self.timeline)
+                    end = time.time()
+
+                    if end - self.start >= 60:
                         error = {
-                            "type": "No hands",
-                            "message": "There is no any hands, Make sure you put the affected hand on the screen."
+                            "type": "none",
+                            "message": "none"
                         }
-                        message = "none"
-                        the_type = "No hands"
-                        print(error["message"])
+                        message = "Congratulation for today's exercise, let's meet again tomorrow."
+                        self.response["message"] = message
                         updateLiveComments(
-                            error, message, request_data["uid"])
+                            error, message, uid)
+                        nextExercise(uid, True)
+                        self.finish()
+                        return self.response
 
+                else:
+                    return f"Unknown exercise requested: {self.exer}", 404
             else:
+                if self.post_pone < 3:
+                    error = {
+                        "type": "Insufficient light",
+                        "message": "Please make sure you are on a place with sufficient light and then start again, and trying not to move your whole hand. just move your wrist"
+                    }
+                    message = "none"
+                    updateLiveComments(
+                        error, message, uid)
+                    self.light_issue = 0
+                    self.post_pone += 1
+                else:
+                    error = {
+                        "type": "Postponed exercise",
+                        "message": "The exercise is postponed because of light issues on your area, This can cause poor exercising and measurement results so let's meet tomorrow."
+                    }
+                    message = "none"
+                    print(error["message"])
+                    updateLiveComments(
+                        error, message, uid)
+                    uploadPostPone(uid)
+                    self.resumable = False
+                    self.response["message"] = error["message"]
+                    return self.response
+
+        else:
+            if self.the_type != "No hands":
                 error = {
-                    "type": "Stream failure",
-                    "message": "Failed to initialize the stream."
+                    "type": "No hands",
+                    "message": "There is no any hands, Make sure you put the affected hand on the screen."
                 }
                 message = "none"
+                self.the_type = "No hands"
+                print(error["message"])
                 updateLiveComments(
-                    error, message, request_data["uid"])
-                response["message"] = "Failed to initialize the stream"
-                run = False
-                return response
+                    error, message, uid)
+
+    def streamFailure(self):
+        error = {
+            "type": "Stream failure",
+            "message": "Failed to initialize the stream."
+        }
+        message = "none"
+        updateLiveComments(
+            error, message, self.uid)
+        self.response["message"] = "Failed to initialize the stream"
+        return self.response
+
+    def handOff(self):
+        """
+        The session goes on on another node, from the checkpoint close()
+        leaves behind.
+        """
+        self.response["message"] = "Moved to another node"
+        self.response["moved"] = True
+        return self.response
+
+    def close(self):
+        """
+        Waits for the scheduled messages and queued writes of the session.
+        """
+        self.timeline.cancel("proceed")
+        if self.progress is not None and not self.finished:
+            # Ended early, keep what was done so far and where it got to
+            self.timeline.cancel("progress")
+            self.progress.commit(checkpoint=self.checkpoint)
+        self.timeline.drain()
+        self.timeline.close()
+        # Only this session's writes, not those of the others on the instance
+        liveWriter.flush(prefix=f"users/{self.uid}/")
+
+
+def runFeedback(request_data, detector, cold=False, stop=None):
+    """
+    Runs a whole feedback session on the stream in request_data.
+    :param request_data: Body of the feedback request
+    :param detector: HandDetector, or anything with the same methods
+    :param cold: The detector had to be built for this session
+    :param stop: Event set to hand the session off to another node,
+                 it ends at the next frame and leaves its checkpoint
+    :return: The response of the request
+    """
+    requested = time.time()
+    timer = StageTimer(FEEDBACK_TIMING_SAMPLE)
+    detector.timer = timer
+    stream, probe = openStream(
+        request_data["source"], FEEDBACK_STREAM["timeout"])  # video stream
+    # A recorded video is read as fast as it is analysed, none of its
+    # frames are dropped or skipped and they are timed on its own timeline
+    recorded = isinstance(request_data["source"], str) and "://" not in request_data["source"]
+    cap = FrameGrabber(stream, dropFrames=not recorded, timer=timer,
+                       width=FEEDBACK_STREAM["width"], position=recorded)
+    session = None
+    result = None
+    try:
+        sampler = FrameSampler(**FEEDBACK_SAMPLING)
+        gate = PresenceGate(**FEEDBACK_PRESENCE)
+        # Read once for the whole session
+        profile = getProfiles().get(request_data["uid"])
+        session = FeedbackSession(request_data["uid"], getExercise(request_data["uid"], profile),
+                                  getHandType(request_data["uid"], profile), detector)
+        session.resume()
+        session.response["stream"] = probe
+        reconnects = []
+        reconnecting = 0
+        started = None
+        while result is None:
+            if stop is not None and stop.is_set():
+                result = session.handOff()
+                break
+            timer.frame()
+            waited = timer.start()
+            success, img = cap.read()
+            timer.lap("wait", waited)
+            if success:
+                if started == None:
+                    session.begin()
+                    session.response["startup"] = {
+                        "cold": cold,
+                        "seconds": round(time.time() - requested, 4)
+                    }
+                    detectorPool.recordStart(cold, time.time() - requested)
+                    started = cap.timestamp + FEEDBACK_START_DELAY
+                if cap.timestamp < started:
+                    # Keep draining the stream while the patient gets ready
+                    continue
+                if not recorded:
+                    if gate.idle:
+                        if not gate.wake(img, cap.timestamp):
+                            continue
+                    elif not sampler.due(cap.timestamp):
+                        continue
+                hands = detector.findHands(img, False)
+                if hands is None:
+                    # The detector gave up on the frame, see RemoteDetector
+                    continue
+                hands = hands.scaled(cap.scale)
+                analysed = timer.start()
+                if not recorded:
+                    gate.observe(hands, cap.timestamp)
+                    sampler.observe(hands, cap.timestamp)
+                result = session.analyse(hands, cap.timestamp)
+                timer.lap("exercise", analysed)
+            elif started is not None and isinstance(request_data["source"], str) \
+                    and "://" in request_data["source"]:
+                # A live stream broke, a recorded video just ended
+                broke = time.time()
+                stream, attempts = reconnectStream(
+                    request_data["source"], FEEDBACK_STREAM["timeout"], **FEEDBACK_RECONNECT)
+                reconnects.append(attempts)
+                reconnecting += time.time() - broke
+                if stream is None:
+                    result = session.streamFailure()
+                else:
+                    cap.reopen(stream)
+                    session.reconnected()
+            else:
+                result = session.streamFailure()
+    finally:
+        # Also when the analysis failed, so the threads stop and what
+        # was done is written
+        try:
+            if session is not None:
+                session.close()
+        finally:
+            cap.release()
+            detector.timer = NO_TIMING
+            processMetrics.merge(timer)
+    if result is session.response:
+        result["frames"] = session.frames
+        result["capture"] = cap.stats()
+        result["sampling"] = sampler.stats()
+        result["presence"] = gate.stats()
+        result["reconnects"] = reconnects
+        result["reconnectSeconds"] = round(reconnecting, 3)
+        if session.progress is not None:
+            result["progress"] = session.progress.stats()
+        result["writes"] = liveWriter.stats()
+        result["profiles"] = getProfiles().stats()
+        result["events"] = hub.stats()
+        result["detectors"] = detectorPool.stats()
+        result["timing"] = timer.summary()
+    return result
+
+
+def metricsResponse(request):
+    """
+    GET .../metrics on a feedback function returns the stage timings
+    of the instance for Prometheus.
+    """
+    if request.method == "GET" and request.path.rstrip("/").endswith("/metrics"):
+        return processMetrics.prometheus(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+    return None
+
+
+def eventsRequest(request):
+    return request.method == "GET" and request.path.rstrip("/").endswith("/events")
+
+
+def eventsResponse(request):
+    """
+    GET .../events?uid={uid} on feedbackShared streams the live comments
+    of uid as server-sent events, see events.py.
+    """
+    if eventsRequest(request):
+        from flask import Response
+
+        uid = request.args.get("uid")
+        if not uid:
+            return "uid is missing", 400
+        return Response(eventStream(uid), mimetype="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            # Keeps proxies from buffering the events
+            "X-Accel-Buffering": "no"
+        })
+    return None
+
+
+def noEventsResponse(request):
+    """
+    GET .../events on the other entry points. Without request concurrency
+    the listener takes the instance's only request, so the session it
+    waits for runs on another instance and it would never hear anything.
+    """
+    if eventsRequest(request):
+        return "Live comments are only pushed by feedbackShared", 404
+    return None
+
+
+def feedback(request):
+    if request.method == "POST":
+        request_data = request.get_json()
+
+        detector, cold = detectorPool.checkout(**FEEDBACK_DETECTOR)
+        try:
+            return runFeedback(request_data, detector, cold)
+        finally:
+            detectorPool.checkin(detector)
+
+    else:
+        return metricsResponse(request) or noEventsResponse(request) or ("Unknown request", 404)
+
+
+def feedbackShared(request):
+    """
+    Same as feedback(), for instances deployed with request concurrency.
+    The sessions of all requests share one pool of inference processes,
+    a request is turned down when the instance has no room left.
+    GET .../load and POST .../handoff are for router.py, which spreads
+    the sessions over several such nodes.
+    """
+    path = request.path.rstrip("/")
+    if request.method == "POST" and path.endswith("/handoff"):
+        from sessions import getManager
+
+        if getManager().handOff(request.get_json()["uid"]):
+            return {"handedOff": True}
+        return "No session of this user here", 404
+
+    elif request.method == "POST":
+        from sessions import getManager
+
+        response = getManager().run(request.get_json())
+        if response is None:
+            return "Too many sessions on this instance, try again later", 503
+        return response
+
+    elif request.method == "GET" and path.endswith("/load"):
+        from sessions import getManager
+
+        return getManager().load()
+
+    else:
+        return metricsResponse(request) or eventsResponse(request) or ("Unknown request", 404)
+
+
+def feedbackLandmarks(request):
+    """
+    Same as feedback(), for phones that track the hands themselves and
+    post the landmarks in batches, see ingest.py. The response of a batch
+    is the number of frames analysed so far, the one of the last batch
+    is the response of the session.
+    """
+    if request.method == "POST":
+        from ingest import getSessions
+
+        try:
+            return getSessions().handle(request.get_json())
+        except (KeyError, TypeError, ValueError) as e:
+            return f"Bad landmarks: {e!r}", 400
 
     else:
-        return "Unknown request", 404
+        return metricsResponse(request) or noEventsResponse(request) or ("Unknown request", 404)
@@ -0,0 +1,186 @@
+"""
+    Timers around the stages of the feedback pipeline. Every session
+    keeps its own histograms, they are added to the process-wide ones
+    when the session ends, which can be scraped in the Prometheus
+    text format.
+"""
+import bisect
+import threading
+import time
+
+
+# Upper bounds in seconds, 0.1 ms growing by half up to about 2.5 s
+BOUNDS = tuple(round(0.0001 * 1.5 ** i, 7) for i in range(26))
+
+
+class Histogram:
+    """
+    Counts of durations per bucket, with their sum. Percentiles are
+    estimated as the upper bound of the bucket they fall in.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def merge(self, other):
+        for bucket, count in enumerate(other.counts):
+            self.counts[bucket] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q):
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return BOUNDS[bucket] if bucket < len(BOUNDS) else float("inf")
+        return 0
+
+    def summary(self):
+        """
+        Count plus mean and percentiles in milliseconds.
+        """
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count * 1000, 3),
+            "p50": round(self.quantile(0.5) * 1000, 3),
+            "p90": round(self.quantile(0.9) * 1000, 3),
+            "p99": round(self.quantile(0.99) * 1000, 3)
+        }
+
+
+class StageTimer:
+    """
+    Times the stages of one session. Only one frame in 1/sample is timed,
+    start() returns None on the others and lap() does nothing with None,
+    so an untimed frame costs a counter increment.
+
+        started = timer.start()
+        ...
+        started = timer.lap("convert", started)
+        ...
+        timer.lap("inference", started)
+    """
+
+    def __init__(self, sample=1.0):
+        """
+        :param sample: Share of the frames timed, 0 turns the timer off
+        """
+        self.sample = sample
+        self.period = max(1, round(1 / sample)) if sample > 0 else 0
+        self.frames = 0
+        self.active = False
+        self.stages = {}
+
+    def due(self, counter):
+        """
+        Whether the frame with this number is one of the timed ones.
+        """
+        return self.period > 0 and counter % self.period == 0
+
+    def frame(self):
+        """
+        A new frame starts, decide whether it is timed.
+        """
+        self.active = self.due(self.frames)
+        self.frames += 1
+
+    def start(self):
+        return time.perf_counter() if self.active else None
+
+    def lap(self, stage, started):
+        """
+        Record the time since started under stage.
+        :return: Start of the next stage, None when this frame is not timed
+        """
+        if started is None:
+            return None
+        now = time.perf_counter()
+        self.observe(stage, now - started)
+        return now
+
+    def observe(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages.setdefault(stage, Histogram())
+        histogram.observe(seconds)
+
+    def summary(self):
+        return {
+            "sample": self.sample,
+            "stages": {stage: histogram.summary() for stage, histogram in self.stages.items()}
+        }
+
+
+# Shared by detectors nobody times
+NO_TIMING = StageTimer(0)
+
+
+class ProcessMetrics:
+    """
+    Histograms of all the sessions of this process plus the Firestore
+    commits of the write-behind queue.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.sessions = 0
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.stages.setdefault(stage, Histogram()).observe(seconds)
+
+    def merge(self, timer):
+        """
+        Add the histograms of a finished session.
+        """
+        with self.lock:
+            self.sessions += 1
+            for stage, histogram in list(timer.stages.items()):
+                self.stages.setdefault(stage, Histogram()).merge(histogram)
+
+    def summary(self):
+        with self.lock:
+            return {
+                "sessions": self.sessions,
+                "stages": {stage: histogram.summary() for stage, histogram in self.stages.items()}
+            }
+
+    def prometheus(self):
+        """
+        The histograms in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP feedback_sessions_total Feedback sessions finished by this process.",
+            "# TYPE feedback_sessions_total counter",
+            "# HELP feedback_stage_seconds Time spent per frame in each stage of the feedback pipeline.",
+            "# TYPE feedback_stage_seconds histogram"
+        ]
+        with self.lock:
+            lines.insert(2, f"feedback_sessions_total {self.sessions}")
+            for stage in sorted(self.stages):
+                histogram = self.stages[stage]
+                cumulative = 0
+                for bound, count in zip(BOUNDS, histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f'feedback_stage_seconds_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+                lines.append(
+                    f'feedback_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'feedback_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'feedback_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+processMetrics = ProcessMetrics()
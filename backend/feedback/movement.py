@@ -0,0 +1,167 @@
+"""
+    Rep detection shared by the exercises. An exercise is a table of
+    thresholds, the engine follows a landmark moving away from its
+    reference point and grades, scores and times the movements.
+"""
+import time
+from collections import namedtuple
+import numpy as np
+
+
+Movement = namedtuple("Movement", [
+    "minimum",    # Smallest distance counted as a movement
+    "inclusive",  # Whether the minimum itself counts
+    "edges",      # Upper edges of bands 0, 1 and 2, band 3 is above them
+    "drop",       # How far under its peak the movement has to come back to end
+    "divisor",    # Distance of a full score
+    "restartPeak" # Per direction, whether reaching a higher band restarts the peak
+])
+
+
+SIDE_TO_SIDE = Movement(minimum=5, inclusive=True, edges=(20, 80, 120),
+                        drop=5, divisor=160, restartPeak=(True, False))
+
+UP_AND_DOWN = Movement(minimum=6, inclusive=False, edges=(100, 150, 200),
+                       drop=10, divisor=200, restartPeak=(False, False))
+
+
+GRADES = ("bad", "trying", "nice", "very good")
+
+
+def plain(value):
+    """
+    A numpy number as the Python one, for storing it.
+    """
+    return np.asarray(value).item() if value is not None else None
+
+
+class MovementEngine:
+    """
+    State of the rep detection. Each of the two directions has a
+    controller, the highest band reached on the current movement. When
+    the movement turns around, the band and the peak distance of the
+    finished one are stored, 3 peaks give a score and 5 bands a grade.
+    Everything is preallocated, a sample costs O(1).
+    """
+
+    def __init__(self, grades=5, scores=3):
+        """
+        :param grades: Bands averaged into a grade
+        :param scores: Peaks averaged into a score
+        """
+        # Read on every sample, a list is cheaper to index than an array
+        self.controllers = [-1, -1]  # -1 is no movement yet
+        self.bands = np.zeros(grades, np.int64)
+        self.peaks = np.zeros(scores, np.int64)
+        self.band_count = 0
+        self.peak_count = 0
+        self.peak = 0
+        self.start_time = None
+        self.side_done = False
+
+    def band(self, movement, distance, edges=None):
+        """
+        Band of a distance, -1 when it is too small to count.
+        """
+        if distance < movement.minimum or (distance == movement.minimum and not movement.inclusive):
+            return -1
+        edges = edges or movement.edges
+        for band in range(3):
+            if distance <= edges[band]:
+                return band
+        return 3
+
+    def step(self, movement, offset, flip=False, now=None, edges=None):
+        """
+        Feed one sample.
+        :param movement: Threshold table of the exercise
+        :param offset: Signed distance of the moving landmark from its reference
+        :param flip: Swap the directions, e.g for the other hand
+        :param now: Timestamp of the sample, defaults to now
+        :param edges: Band edges to use instead of the table's
+        :return: A grade, a float score, a (seconds, "time") tuple, "time"
+                 or None, the same values the Exercise methods return
+        """
+        if self.band_count >= len(self.bands):
+            grade = int(self.bands.sum()) // (self.band_count - 1)
+            self.band_count = 0
+            return GRADES[grade]
+
+        elif self.peak_count >= len(self.peaks):
+            score = round(((int(self.peaks.sum()) // self.peak_count) /
+                           movement.divisor) * 100, 3)
+            self.peak_count = 0
+            return score
+
+        if offset == 0:
+            return None
+
+        current = int(offset < 0) ^ int(flip)
+        other = 1 - current
+        distance = abs(offset)
+
+        # Turned around, store the movement that just finished
+        if self.controllers[other] >= 0:
+            self.bands[self.band_count] = self.controllers[other]
+            self.band_count += 1
+            self.peaks[self.peak_count] = self.peak
+            self.peak_count += 1
+            self.controllers[other] = -1
+            self.peak = 0
+            self.side_done = False
+
+        band = self.band(movement, distance, edges)
+        if band < 0:
+            return None
+
+        if band == 0 and self.start_time == None and self.side_done == False:
+            self.start_time = now if now is not None else time.time()
+
+        if self.controllers[current] <= band:
+            self.controllers[current] = band
+            if band > 0 and movement.restartPeak[current]:
+                self.peak = distance
+
+        if self.peak <= distance:
+            self.peak = distance
+        elif distance + movement.drop < self.peak:
+            if self.start_time != None:
+                end_time = now if now is not None else time.time()
+                if end_time - self.start_time > 1:
+                    final_time = round(end_time - self.start_time, 3), "time"
+                else:
+                    final_time = "time"
+                self.start_time = None
+                self.side_done = True
+                return final_time
+        return None
+
+    def checkpoint(self):
+        """
+        The state as plain values, restore() takes it back.
+        """
+        return {
+            "controllers": list(self.controllers),
+            "bands": self.bands[:self.band_count].tolist(),
+            "peaks": self.peaks[:self.peak_count].tolist(),
+            "peak": plain(self.peak),
+            "start": self.start_time,
+            "sideDone": self.side_done
+        }
+
+    def restore(self, state):
+        self.controllers = list(state["controllers"])
+        self.band_count = len(state["bands"])
+        self.bands[:self.band_count] = state["bands"]
+        self.peak_count = len(state["peaks"])
+        self.peaks[:self.peak_count] = state["peaks"]
+        self.peak = state["peak"]
+        self.start_time = state["start"]
+        self.side_done = state["sideDone"]
+
+    def interrupt(self):
+        """
+        The movement was broken off, e.g the whole hand moved.
+        """
+        self.start_time = None
+        self.side_done = True
@@ -0,0 +1,97 @@
+"""
+    Keeps initialised hand detectors around between requests so
+    a session does not have to load the mediapipe graph again.
+"""
+import threading
+
+
+class DetectorPool:
+    """
+    Pool of detectors keyed by their configuration. Sessions check a
+    detector out, and check it back in when they are done, the reset hook
+    clears its tracking state before the next session gets it.
+    """
+
+    def __init__(self, factory, size=4, reset=None):
+        """
+        :param factory: Called with the configuration to build a detector
+        :param size: Idle detectors kept per configuration
+        :param reset: Called with a detector when it is checked in,
+                      defaults to its reset() method
+        """
+        self.factory = factory
+        self.size = size
+        self.resetHook = reset or (lambda detector: detector.reset())
+        self.idle = {}
+        self.keys = {}
+        self.starts = {"cold": [0, 0, 0], "warm": [0, 0, 0]}
+        self.lock = threading.Lock()
+
+    def key(self, config):
+        return tuple(sorted(config.items()))
+
+    def warm(self, count=1, **config):
+        """
+        Build detectors ahead of time, e.g when the instance starts.
+        """
+        key = self.key(config)
+        for _ in range(count):
+            detector = self.factory(**config)
+            with self.lock:
+                self.keys[id(detector)] = key
+                self.idle.setdefault(key, []).append(detector)
+
+    def checkout(self, **config):
+        """
+        Take a detector with the given configuration, building one
+        when none is idle.
+        :return: detector, True when it had to be built
+        """
+        key = self.key(config)
+        with self.lock:
+            if self.idle.get(key):
+                return self.idle[key].pop(), False
+
+        detector = self.factory(**config)
+        with self.lock:
+            self.keys[id(detector)] = key
+        return detector, True
+
+    def checkin(self, detector):
+        """
+        Give a detector back after resetting it.
+        """
+        self.resetHook(detector)
+        with self.lock:
+            key = self.keys.get(id(detector))
+            idle = self.idle.setdefault(key, [])
+            if key is not None and len(idle) < self.size:
+                idle.append(detector)
+                return
+            self.keys.pop(id(detector), None)
+        detector.close()
+
+    def recordStart(self, cold, seconds):
+        """
+        Record how long a session took to start.
+        :param cold: The session had to build its detector
+        """
+        with self.lock:
+            starts = self.starts["cold" if cold else "warm"]
+            starts[0] += 1
+            starts[1] += seconds
+            starts[2] = max(starts[2], seconds)
+
+    def stats(self):
+        """
+        Idle detectors and the cold and warm session start times.
+        """
+        with self.lock:
+            stats = {"idle": sum(len(idle) for idle in self.idle.values())}
+            for kind, (count, total, longest) in self.starts.items():
+                stats[kind] = {
+                    "count": count,
+                    "mean": round(total / count, 4) if count else 0,
+                    "max": round(longest, 4)
+                }
+        return stats
@@ -0,0 +1,105 @@
+"""
+    Cheap check for a patient coming back in front of the camera, so the
+    hand model does not run on every frame of an empty picture.
+"""
+import time
+import cv2
+import numpy as np
+
+
+class PresenceGate:
+    """
+    After idleAfter analysed frames in a row without hands the gate goes
+    idle. While idle, rate frames per second are shrunk to a tiny grey
+    image and compared with the previous one, the hand model only runs
+    again when enough of the picture changed or every recheck seconds,
+    in case a hand came in without much motion. The first frame with
+    hands makes the gate active again.
+    """
+
+    def __init__(self, rate=2, idleAfter=10, recheck=2, size=(64, 48), motion=0.02, change=25):
+        """
+        :param rate: Frames per second checked while idle
+        :param idleAfter: Analysed frames without hands before going idle
+        :param recheck: Seconds between inferences while nothing moves
+        :param size: Width and height the frames are shrunk to
+        :param motion: Share of the pixels that have to change to wake up
+        :param change: Difference of a grey level that counts as a change
+        """
+        self.rate = rate
+        self.idleAfter = idleAfter
+        self.recheck = recheck
+        self.size = size
+        self.motion = motion
+        self.change = change
+        self.idle = False
+        self.misses = 0
+        self.previous = None
+        self.small = None
+        self.grey = np.empty((size[1], size[0]), np.uint8)
+        self.last_check = None
+        self.last_inference = None
+        self.checks = 0
+        self.wakes = 0
+        # Wall and CPU seconds spent in each state
+        self.times = {"idle": [0.0, 0.0], "active": [0.0, 0.0]}
+        self.since = (time.time(), time.process_time())
+
+    def _switch(self, idle):
+        wall, cpu = time.time(), time.process_time()
+        spent = self.times["idle" if self.idle else "active"]
+        spent[0] += wall - self.since[0]
+        spent[1] += cpu - self.since[1]
+        self.since = wall, cpu
+        self.idle = idle
+
+    def wake(self, img, timestamp):
+        """
+        While idle, whether the hand model should run on this frame.
+        :param img: BGR frame
+        :param timestamp: When the frame was taken
+        """
+        if self.last_check is not None and timestamp - self.last_check < 0.9 / self.rate:
+            return False
+        self.last_check = timestamp
+        self.checks += 1
+
+        self.small = cv2.resize(img, self.size, self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, self.grey)
+        previous, self.previous = self.previous, self.grey.copy()
+        moved = previous is not None and np.count_nonzero(
+            cv2.absdiff(self.grey, previous) > self.change) > self.motion * self.grey.size
+
+        if moved or timestamp - self.last_inference >= self.recheck:
+            self.wakes += 1
+            return True
+        return False
+
+    def observe(self, hands, timestamp):
+        """
+        Record the result of the hand model on a frame.
+        """
+        self.last_inference = timestamp
+        if hands:
+            self.misses = 0
+            if self.idle:
+                self._switch(False)
+        else:
+            self.misses += 1
+            if not self.idle and self.misses >= self.idleAfter:
+                self.previous = None
+                self._switch(True)
+
+    def stats(self):
+        """
+        Frames checked and wake ups while idle, plus the wall seconds and
+        the process CPU seconds per wall second in each state.
+        """
+        self._switch(self.idle)
+        stats = {"checks": self.checks, "wakes": self.wakes}
+        for state, (wall, cpu) in self.times.items():
+            stats[state] = {
+                "seconds": round(wall, 3),
+                "cpu": round(cpu / wall, 3) if wall else 0
+            }
+        return stats
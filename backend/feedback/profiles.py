@@ -0,0 +1,110 @@
+"""
+    User profiles, users/{uid}, read once per session and cached by the
+    instance for a while. Every write is a field-level one that needs no
+    read first, and drops the cached copy of the profile it wrote.
+"""
+import copy
+import os
+import threading
+import time
+from storage import getStorage
+
+
+class ProfileCache:
+    """
+    Read-through cache of profiles, a profile is read again once it is
+    older than ttl seconds or after this instance wrote to it.
+    """
+
+    def __init__(self, storage=None, ttl=30):
+        """
+        :param storage: Storage read and written, defaults to the shared one
+        :param ttl: Seconds a profile is used without reading it again,
+                    changes made by the app show up after that
+        """
+        self.storage = storage
+        self.ttl = ttl
+        self.entries = {}
+        # Bumped on every write, so a read that raced with one is not kept
+        self.generations = {}
+        self.counters = {"hits": 0, "misses": 0, "invalidated": 0}
+        self.lock = threading.Lock()
+
+    def _storage(self):
+        return self.storage or getStorage()
+
+    def get(self, uid):
+        """
+        Snapshot of the profile of uid, empty when there is none. The
+        snapshot is the session's own, changing it changes nothing else.
+        """
+        now = time.time()
+        storage = self._storage()
+        with self.lock:
+            entry = self.entries.get(uid)
+            # Not from another storage, e.g one a benchmark set before
+            if entry is not None and now - entry[0] < self.ttl and entry[1] is storage:
+                self.counters["hits"] += 1
+                return copy.deepcopy(entry[2])
+            self.counters["misses"] += 1
+            generation = self.generations.get(uid, 0)
+
+        profile = storage.profile(uid) or {}
+        with self.lock:
+            if self.generations.get(uid, 0) == generation:
+                self.entries[uid] = (now, storage, profile)
+        return copy.deepcopy(profile)
+
+    def invalidate(self, uid):
+        with self.lock:
+            self.entries.pop(uid, None)
+            self.generations[uid] = self.generations.get(uid, 0) + 1
+            self.counters["invalidated"] += 1
+
+    # Writes, see the Storage methods of the same names
+
+    def setExercise(self, uid, exer):
+        try:
+            self._storage().setExercise(uid, exer)
+        finally:
+            self.invalidate(uid)
+
+    def incrementExercise(self, uid):
+        try:
+            self._storage().incrementExercise(uid)
+        finally:
+            self.invalidate(uid)
+
+    def finishDay(self, uid, nextExercise):
+        try:
+            self._storage().finishDay(uid, nextExercise)
+        finally:
+            self.invalidate(uid)
+
+    def postpone(self, uid):
+        try:
+            self._storage().postpone(uid)
+        finally:
+            self.invalidate(uid)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["cached"] = len(self.entries)
+        return stats
+
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def getProfiles():
+    """
+    Process-wide profile cache, FEEDBACK_PROFILE_TTL sets its ttl.
+    """
+    global _profiles
+    if _profiles is None:
+        with _profiles_lock:
+            if _profiles is None:
+                _profiles = ProfileCache(ttl=float(os.environ.get("FEEDBACK_PROFILE_TTL", 30)))
+    return _profiles
@@ -0,0 +1,224 @@
+"""
+    Results of a session kept as running statistics, plus a log of its
+    reps, committed to Firestore every few seconds so a session that dies
+    early still leaves its progress behind.
+"""
+import math
+import threading
+from storage import getStorage, SERVER_TIMESTAMP
+from movement import GRADES
+
+
+class QuantileSketch:
+    """
+    Counts of values in logarithmic buckets, a quantile is off by at most
+    accuracy relative to the true one. The number of buckets only grows
+    with the range of the values, not with how many there are.
+    """
+
+    def __init__(self, accuracy=0.01):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.logGamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        bucket = math.ceil(math.log(value) / self.logGamma)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def quantile(self, q):
+        if not self.count:
+            return 0
+        # Nearest rank, counted from 1
+        rank = max(1, math.ceil(q * self.count))
+        seen = self.zeros
+        if seen >= rank:
+            return 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return 2 * self.gamma ** bucket / (self.gamma + 1)
+        return 0
+
+    def checkpoint(self):
+        # Firestore map keys are strings
+        return {"buckets": {str(bucket): count for bucket, count in self.buckets.items()},
+                "zeros": self.zeros, "count": self.count}
+
+    def restore(self, state):
+        self.buckets = {int(bucket): count for bucket, count in state["buckets"].items()}
+        self.zeros = state["zeros"]
+        self.count = state["count"]
+
+
+class RunningStats:
+    """
+    Count, sum, min, max and a quantile sketch of a stream of values.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch()
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sketch.add(value)
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0
+
+    def checkpoint(self):
+        return {"count": self.count, "sum": self.sum, "min": self.min, "max": self.max,
+                "sketch": self.sketch.checkpoint()}
+
+    def restore(self, state):
+        self.count = state["count"]
+        self.sum = state["sum"]
+        self.min = state["min"]
+        self.max = state["max"]
+        self.sketch.restore(state["sketch"])
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.mean, 3),
+            "min": self.min,
+            "max": self.max,
+            "p50": round(self.sketch.quantile(0.5), 3),
+            "p90": round(self.sketch.quantile(0.9), 3)
+        }
+
+
+class SessionProgress:
+    """
+    Scores, rep times and grades of one exercise session. commit() writes
+    the statistics to the day's live comments document and the reps not
+    written yet to its reps collection, in one batched write.
+    """
+
+    def __init__(self, uid, exercise, start, storage=None):
+        """
+        :param uid: Firebase Firestore's user id
+        :param exercise: Name of the exercise, e.g wristSideToSide
+        :param start: When the session started, the reps are logged
+                      in seconds since then
+        :param storage: Storage written to, defaults to the shared one
+        """
+        self.uid = uid
+        self.exercise = exercise
+        self.start = start
+        self.storage = storage
+        self.scores = RunningStats()
+        self.times = RunningStats()
+        self.grades = {}
+        self.reps = 0
+        self.pending = []
+        self.commits = 0
+        # Reentrant, the session holds it around a whole frame, see
+        # FeedbackSession.analyse()
+        self.lock = threading.RLock()
+
+    def record(self, the_message, now):
+        """
+        Keep a message returned by the exercise if it is a result.
+        """
+        if type(the_message) == float:
+            event = {"score": the_message}
+        elif type(the_message) == tuple:
+            event = {"time": the_message[0]}
+        elif the_message in GRADES:
+            event = {"grade": the_message}
+        else:
+            return
+        event["at"] = round(now - self.start, 3)
+        with self.lock:
+            if "score" in event:
+                self.scores.add(the_message)
+            elif "time" in event:
+                self.times.add(the_message[0])
+            else:
+                self.grades[the_message] = self.grades.get(the_message, 0) + 1
+            event["rep"] = self.reps
+            self.reps += 1
+            self.pending.append(event)
+
+    def score(self):
+        # Floored like the_average()
+        return self.scores.sum // self.scores.count if self.scores.count else 0
+
+    def time(self):
+        return round(self.times.mean, 3)
+
+    def results(self, final=False):
+        return {self.exercise: {
+            u"score": self.score(),
+            u"time": self.time(),
+            u"final": final,
+            u"stats": {
+                u"score": self.scores.summary(),
+                u"time": self.times.summary(),
+                u"grades": dict(self.grades)
+            },
+            u"updated": SERVER_TIMESTAMP
+        }}
+
+    def checkpoint(self):
+        """
+        The statistics as plain values, restore() takes them back. The
+        reps not committed yet are not part of it.
+        """
+        with self.lock:
+            return {
+                "scores": self.scores.checkpoint(),
+                "times": self.times.checkpoint(),
+                "grades": dict(self.grades),
+                "reps": self.reps
+            }
+
+    def restore(self, state):
+        with self.lock:
+            self.scores.restore(state["scores"])
+            self.times.restore(state["times"])
+            self.grades = dict(state["grades"])
+            self.reps = state["reps"]
+
+    def commit(self, final=False, checkpoint=None):
+        """
+        Write the statistics and the new reps together.
+        Reps of a failed commit are kept for the next one.
+        :param final: The session is over
+        :param checkpoint: Called under the lock for the checkpoint of the
+                           session written along, the final commit clears it
+        """
+        with self.lock:
+            events, self.pending = self.pending, []
+            results = self.results(final)
+            state = {} if final else checkpoint() if checkpoint is not None else None
+
+        try:
+            (self.storage or getStorage()).commitResults(self.uid, results, {
+                f"{self.exercise}-{event['rep']}": event for event in events}, state)
+            self.commits += 1
+        except Exception as e:
+            print(f"Failed to commit the progress of {self.uid}: {e}")
+            with self.lock:
+                self.pending = events + self.pending
+            return False
+        return True
+
+    def stats(self):
+        return {"reps": self.reps, "commits": self.commits, "pending": len(self.pending)}
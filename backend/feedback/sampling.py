@@ -0,0 +1,72 @@
+"""
+    Decides which frames are worth analysing, the exercises only
+    need a handful of landmark samples per second.
+"""
+
+
+class FrameSampler:
+    """
+    Lets frames through at a target rate measured on frame timestamps,
+    not frame counts, so it behaves the same on any stream fps. The rate
+    drops towards minRate while the hand is still or missing and jumps to
+    maxRate as soon as it moves.
+    """
+
+    def __init__(self, minRate=4, maxRate=15, still=40, decay=0.8):
+        """
+        :param minRate: Frames per second analysed while nothing happens
+        :param maxRate: Frames per second analysed during movement
+        :param still: Speed in pixels per second under which the hand is still
+        :param decay: How fast the rate goes down once the hand stops
+        """
+        self.minRate = minRate
+        self.maxRate = maxRate
+        self.still = still
+        self.decay = decay
+        self.rate = maxRate
+        self.last = None
+        self.previous = None
+        self.analysed = 0
+        self.skipped = 0
+
+    def due(self, timestamp):
+        """
+        Whether the frame taken at timestamp should be analysed.
+        """
+        # Some slack so frame timing jitter does not skip an extra frame
+        if self.last is not None and timestamp - self.last < 0.9 / self.rate:
+            self.skipped += 1
+            return False
+        self.last = timestamp
+        self.analysed += 1
+        return True
+
+    def observe(self, hands, timestamp):
+        """
+        Adjust the rate to the hands found on the analysed frame.
+        :param hands: First object returned on findHands() function
+        :param timestamp: When the frame was taken
+        """
+        if not hands:
+            self.previous = None
+            self.rate = self.minRate
+            return
+
+        points = hands.points[0]
+        current = tuple(points[0].tolist() + points[12].tolist())
+        if self.previous is not None:
+            old, taken = self.previous
+            elapsed = max(timestamp - taken, 1e-3)
+            speed = max(abs(a - b) for a, b in zip(current, old)) / elapsed
+            if speed >= self.still:
+                self.rate = self.maxRate
+            else:
+                self.rate = max(self.minRate, self.rate * self.decay)
+        self.previous = current, timestamp
+
+    def stats(self):
+        return {
+            "analysed": self.analysed,
+            "skipped": self.skipped,
+            "rate": round(self.rate, 2)
+        }
@@ -0,0 +1,409 @@
+"""
+    Runs many patient sessions in one process. Every session keeps its
+    own capture thread and exercise state, the hand inference is done
+    by a shared pool of worker processes because mediapipe holds the GIL.
+"""
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+import numpy as np
+from hands import HandDetector
+from main import FEEDBACK_DETECTOR, runFeedback
+
+
+def inferenceWorker(requests, results, config):
+    """
+    Body of an inference process. Keeps one detector per session so the
+    region and mediapipe tracking of a session is not mixed with others.
+    """
+    from main import detectorPool
+
+    detectors = {}
+    frames = {}
+    while True:
+        message = requests.get()
+        kind, session = message[0], message[1]
+
+        if kind == "stop":
+            return
+
+        elif kind == "open":
+            if session in frames:
+                frames[session].close()
+            frames[session] = shared_memory.SharedMemory(name=message[2])
+            if session not in detectors:
+                detectors[session], _ = detectorPool.checkout(**config)
+
+        elif kind == "batch":
+            # Frames of several sessions, run back to back and
+            # answered together with the seconds they took
+            started = time.perf_counter()
+            answers = []
+            for session, request_id, shape in message[2]:
+                try:
+                    img = np.ndarray(shape, np.uint8, frames[session].buf)
+                    answers.append(
+                        (request_id, detectors[session].findHands(img, False), None))
+                except Exception as e:
+                    answers.append((request_id, None, repr(e)))
+            results.put((time.perf_counter() - started, answers))
+
+        elif kind == "close":
+            if session in detectors:
+                detectorPool.checkin(detectors.pop(session))
+            if session in frames:
+                frames.pop(session).close()
+
+
+class InferenceWorkers:
+    """
+    Pool of inference processes. A session sticks to the worker it is
+    assigned to, new sessions go to the worker with the fewest sessions.
+    Frames sent to a worker within maxDelay of each other are batched
+    into one message, so a busy worker is woken up once per batch.
+    """
+
+    def __init__(self, count, config=FEEDBACK_DETECTOR, maxDelay=0.005, maxBatch=8):
+        """
+        :param count: Number of worker processes
+        :param config: HandDetector configuration used by the workers
+        :param maxDelay: Seconds a frame may wait for others to join its batch
+        :param maxBatch: Frames sent at most in one batch
+        """
+        context = multiprocessing.get_context("spawn")
+        self.results = context.Queue()
+        self.requests = []
+        self.processes = []
+        self.sessions = [0] * count
+        for _ in range(count):
+            requests = context.Queue()
+            process = context.Process(target=inferenceWorker, args=(
+                requests, self.results, config), daemon=True)
+            process.start()
+            self.requests.append(requests)
+            self.processes.append(process)
+
+        self.maxDelay = maxDelay
+        self.maxBatch = maxBatch
+        self.batches = [[] for _ in range(count)]
+        self.batched = {"batches": 0, "frames": 0, "timeouts": 0}
+        self.busy = 0
+        self.pending = {}
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+        self.batcher = threading.Thread(target=self._batch, daemon=True)
+        self.batcher.start()
+
+    def _dispatch(self):
+        while True:
+            busy, answers = self.results.get()
+            with self.lock:
+                self.busy += busy
+            for request_id, hands, error in answers:
+                with self.lock:
+                    future = self.pending.pop(request_id, None)
+                if future is None:
+                    continue
+                if error is not None:
+                    future.set_exception(RuntimeError(error))
+                else:
+                    future.set_result(hands)
+
+    def _batch(self):
+        while True:
+            with self.condition:
+                while True:
+                    now = time.time()
+                    waiting = [batch[0][0] for batch in self.batches if batch]
+                    due = [worker for worker, batch in enumerate(self.batches) if batch and (
+                        len(batch) >= self.maxBatch or now - batch[0][0] >= self.maxDelay)]
+                    if due:
+                        break
+                    if waiting:
+                        self.condition.wait(
+                            min(waiting) + self.maxDelay - now)
+                    else:
+                        self.condition.wait()
+
+                sending = []
+                for worker in due:
+                    batch = [frame for _, frame in self.batches[worker]]
+                    self.batches[worker] = []
+                    self.batched["batches"] += 1
+                    self.batched["frames"] += len(batch)
+                    sending.append((worker, batch))
+
+            for worker, batch in sending:
+                self.send(worker, "batch", None, batch)
+
+    def assign(self):
+        with self.lock:
+            worker = self.sessions.index(min(self.sessions))
+            self.sessions[worker] += 1
+        return worker
+
+    def release(self, worker):
+        with self.lock:
+            self.sessions[worker] -= 1
+
+    def send(self, worker, *message):
+        self.requests[worker].put(message)
+
+    def submit(self, worker, session, shape):
+        """
+        Ask worker to find the hands on the frame in the session's
+        shared memory.
+        :return: Future with the hands
+        """
+        future = Future()
+        with self.condition:
+            request_id = next(self.ids)
+            future.request_id = request_id
+            self.pending[request_id] = future
+            self.batches[worker].append(
+                (time.time(), (session, request_id, shape)))
+            self.condition.notify()
+        return future
+
+    def cancel(self, future):
+        """
+        Forget a frame whose hands are not waited for any more after a
+        timeout. A late answer for it is dropped.
+        """
+        with self.condition:
+            self.batched["timeouts"] += 1
+            self.pending.pop(future.request_id, None)
+            for worker, batch in enumerate(self.batches):
+                self.batches[worker] = [entry for entry in batch
+                                        if entry[1][1] != future.request_id]
+        future.cancel()
+
+    def stats(self):
+        with self.lock:
+            batches, frames = self.batched["batches"], self.batched["frames"]
+            timeouts = self.batched["timeouts"]
+        return {
+            "batches": batches,
+            "frames": frames,
+            "batchSize": round(frames / batches, 2) if batches else 0,
+            "timeouts": timeouts
+        }
+
+    def load(self):
+        """
+        Frames waiting for their hands, frames batched and seconds the
+        processes spent on inference so far.
+        """
+        with self.lock:
+            return {"queue": len(self.pending), "frames": self.batched["frames"], "busy": self.busy}
+
+    def stop(self):
+        for requests in self.requests:
+            requests.put(("stop", None))
+        for process in self.processes:
+            process.join(timeout=5)
+
+
+_session_ids = itertools.count()
+
+
+class RemoteDetector(HandDetector):
+    """
+    HandDetector of a session whose inference runs on InferenceWorkers.
+    Frames are handed over through shared memory, one frame at a time.
+    """
+
+    def __init__(self, workers, timeout=5):
+        """
+        :param workers: InferenceWorkers running the model
+        :param timeout: Seconds to wait for the hands of a frame
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.session = next(_session_ids)
+        self.worker = workers.assign()
+        self.frame = None
+        self.buffer = None
+        # Frames given up on after timeout seconds
+        self.timeouts = 0
+
+    def findHands(self, img, draw=False, flipType=True):
+        """
+        Same as HandDetector.findHands(), but None when the worker did not
+        answer within timeout seconds. The frame is then skipped.
+        """
+        if self.buffer is None or self.buffer.shape != img.shape:
+            self._allocate(img.shape)
+        started = self.timer.start()
+        self.buffer[:] = img
+        future = self.workers.submit(self.worker, self.session, img.shape)
+        try:
+            hands = future.result(self.timeout)
+        except FutureTimeout:
+            self.workers.cancel(future)
+            self.timeouts += 1
+            return (None, img) if draw else None
+        # Includes the hand over to the worker and the wait for it
+        self.timer.lap("inference", started)
+        if draw:
+            return hands, img
+        return hands
+
+    def _allocate(self, shape):
+        if self.frame is not None:
+            self.frame.close()
+            self.frame.unlink()
+        self.frame = shared_memory.SharedMemory(
+            create=True, size=int(np.prod(shape)))
+        self.buffer = np.ndarray(shape, np.uint8, self.frame.buf)
+        self.workers.send(self.worker, "open", self.session, self.frame.name)
+
+    def reset(self):
+        pass
+
+    def close(self):
+        self.workers.send(self.worker, "close", self.session)
+        self.workers.release(self.worker)
+        if self.frame is not None:
+            self.buffer = None
+            self.frame.close()
+            self.frame.unlink()
+            self.frame = None
+
+
+class SessionManager:
+    """
+    Admits feedback sessions while the instance has room for them and
+    runs them on shared InferenceWorkers.
+    """
+
+    def __init__(self, workers=None, sessionsPerWorker=4, queueTimeout=0, maxLoad=1.5, maxBatchDelay=0.005):
+        """
+        :param workers: Number of inference processes, one per CPU by default
+        :param sessionsPerWorker: Sessions one inference process can keep up with
+        :param queueTimeout: Seconds a new session waits for room before it is rejected
+        :param maxLoad: Reject sessions while the load average per CPU is above it
+        :param maxBatchDelay: Seconds a frame may wait to be batched with
+                              frames of other sessions
+        """
+        workers = workers or os.cpu_count()
+        self.count = workers
+        self.workers = InferenceWorkers(workers, maxDelay=maxBatchDelay)
+        self.capacity = workers * sessionsPerWorker
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.queueTimeout = queueTimeout
+        self.maxLoad = maxLoad
+        self.active = 0
+        self.rejected = 0
+        self.handedOff = 0
+        # Stop flag of the running session of every user
+        self.running = {}
+        self.lastLoad = (time.time(), self.workers.load())
+        self.lock = threading.Lock()
+
+    def overloaded(self):
+        return os.getloadavg()[0] / os.cpu_count() > self.maxLoad
+
+    def run(self, request_data):
+        """
+        Run a feedback session if there is room for it.
+        :return: The response of the session, None when it was rejected
+        """
+        if self.overloaded() or not self.slots.acquire(timeout=self.queueTimeout):
+            with self.lock:
+                self.rejected += 1
+            return None
+
+        stop = threading.Event()
+        with self.lock:
+            self.active += 1
+            self.running[request_data["uid"]] = stop
+        detector = RemoteDetector(self.workers)
+        try:
+            response = runFeedback(request_data, detector, stop=stop)
+            if isinstance(response, dict):
+                response["timeouts"] = detector.timeouts
+                response["sessions"] = self.stats()
+            return response
+        finally:
+            detector.close()
+            with self.lock:
+                self.active -= 1
+                if self.running.get(request_data["uid"]) is stop:
+                    del self.running[request_data["uid"]]
+            self.slots.release()
+
+    def handOff(self, uid):
+        """
+        End the session of uid at the next frame, leaving its checkpoint
+        for the node it is moved to.
+        :return: False when uid has no session here
+        """
+        with self.lock:
+            stop = self.running.get(uid)
+            if stop is None:
+                return False
+            self.handedOff += 1
+        stop.set()
+        return True
+
+    def load(self, minHeadroom=0.1):
+        """
+        Load report of the instance for a router, the rates are over the
+        time since the previous report.
+        :param minHeadroom: Share of the inference time left under which
+                            the instance reports itself saturated
+        """
+        now, current = time.time(), self.workers.load()
+        with self.lock:
+            (then, last), self.lastLoad = self.lastLoad, (now, current)
+            report = {
+                "active": self.active,
+                "capacity": self.capacity,
+                "sessions": sorted(self.running),
+                "handedOff": self.handedOff
+            }
+        elapsed = max(now - then, 1e-6)
+        headroom = 1 - (current["busy"] - last["busy"]) / (elapsed * self.count)
+        report["fps"] = round((current["frames"] - last["frames"]) / elapsed, 2)
+        report["headroom"] = round(max(headroom, 0), 3)
+        report["queue"] = current["queue"]
+        report["load"] = round(os.getloadavg()[0] / os.cpu_count(), 3)
+        report["saturated"] = headroom < minHeadroom or self.overloaded()
+        return report
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                "active": self.active,
+                "capacity": self.capacity,
+                "rejected": self.rejected
+            }
+        stats["inference"] = self.workers.stats()
+        return stats
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def getManager():
+    """
+    Process-wide SessionManager, started on first use.
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = SessionManager(
+                    workers=int(os.environ.get("FEEDBACK_WORKERS", 0)) or None,
+                    sessionsPerWorker=int(os.environ.get("FEEDBACK_SESSIONS_PER_WORKER", 4)),
+                    maxBatchDelay=float(os.environ.get("FEEDBACK_MAX_BATCH_DELAY_MS", 5)) / 1000)
+    return _manager
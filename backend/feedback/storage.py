@@ -0,0 +1,348 @@
+"""
+    Where the functions keep their data. Firestore when deployed, a
+    dict in memory or a SQLite file to run the pipeline offline, e.g in
+    benchmarks, optionally with latency added to every call to see how
+    slow writes affect the frame rate.
+
+    FEEDBACK_STORAGE selects it: firestore (default), memory or
+    sqlite:path/to/file.db. FEEDBACK_STORAGE_LATENCY_MS adds latency to
+    the memory and SQLite ones.
+"""
+import copy
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from google.cloud import firestore
+
+
+# Field values with the same meaning as their firestore counterparts
+Increment = namedtuple("Increment", ["value"])
+DELETE_FIELD = object()
+SERVER_TIMESTAMP = object()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def getClient():
+    """
+    Process-wide Firestore client, created on first use so every
+    request served by this instance reuses the same gRPC channel.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = firestore.Client()
+    return _client
+
+
+def today():
+    return str(datetime.date.today())
+
+
+class Storage:
+    """
+    Documents addressed by their Firestore path, e.g users/{uid}. The
+    subclasses implement get, set, update and commit, the records of the
+    app are built on them here.
+    """
+
+    def get(self, path):
+        """
+        :return: The fields of the document, None when it does not exist
+        """
+        raise NotImplementedError
+
+    def set(self, path, data, merge=False):
+        raise NotImplementedError
+
+    def update(self, path, data):
+        """
+        Change fields of a document that exists.
+        """
+        raise NotImplementedError
+
+    def commit(self, writes):
+        """
+        Apply (path, data, merge) sets all together.
+        """
+        raise NotImplementedError
+
+    # User profile, users/{uid}
+
+    def profile(self, uid):
+        return self.get(f"users/{uid}")
+
+    def setProfile(self, uid, data):
+        self.set(f"users/{uid}", data)
+
+    # Index of the exercise of the day
+
+    def setExercise(self, uid, exer):
+        self.set(f"users/{uid}", {"exer": exer}, merge=True)
+
+    def incrementExercise(self, uid):
+        # Starts at 1 when there is no profile yet, no need to read it
+        self.set(f"users/{uid}", {"exer": Increment(1)}, merge=True)
+
+    def finishDay(self, uid, nextExercise):
+        """
+        The exercises of the day are done, the next ones are at nextExercise.
+        """
+        self.update(f"users/{uid}", {
+            u"nextExercise": nextExercise,
+            u"exer": DELETE_FIELD
+        })
+
+    def postpone(self, uid):
+        self.set(f"users/{uid}", {u"postPoned": Increment(1)}, merge=True)
+
+    # Live comments and results of the day
+
+    def liveCommentsPath(self, uid, day=None):
+        return f"users/{uid}/liveComments/{day or today()}"
+
+    def setLiveComments(self, uid, data):
+        self.set(self.liveCommentsPath(uid), data, merge=True)
+
+    def commitResults(self, uid, results, reps, checkpoint=None):
+        """
+        Merge results into the day's live comments and store the reps,
+        in one commit.
+        :param results: Fields of the live comments document
+        :param reps: Document id to fields of the reps collection under it
+        :param checkpoint: Checkpoint of the session written along, an
+                           empty one clears it, None leaves it as it is
+        """
+        path = self.liveCommentsPath(uid)
+        writes = [(path, results, True)]
+        writes += [(f"{path}/reps/{rep}", event, False) for rep, event in reps.items()]
+        if checkpoint is not None:
+            writes.append((self.checkpointPath(uid), checkpoint, False))
+        self.commit(writes)
+
+    # Checkpoint of the running session, to resume it after the stream broke
+
+    def checkpointPath(self, uid, day=None):
+        return f"users/{uid}/checkpoints/{day or today()}"
+
+    def checkpoint(self, uid):
+        """
+        :return: The checkpoint of uid's session of the day, None when
+                 there is none
+        """
+        return self.get(self.checkpointPath(uid)) or None
+
+    # Comments and results of the day's measurement
+
+    def measureCommentsPath(self, uid, day=None):
+        return f"users/{uid}/measureComments/{day or today()}"
+
+    def setMeasureComments(self, uid, data):
+        self.set(self.measureCommentsPath(uid), data, merge=True)
+
+
+class FirestoreStorage(Storage):
+
+    def __init__(self, client=None):
+        """
+        :param client: Firestore client, defaults to the shared one
+        """
+        self.client = client
+
+    def _client(self):
+        return self.client or getClient()
+
+    def _fields(self, data):
+        if isinstance(data, dict):
+            return {key: self._fields(value) for key, value in data.items()}
+        if isinstance(data, Increment):
+            return firestore.Increment(data.value)
+        if data is DELETE_FIELD:
+            return firestore.DELETE_FIELD
+        if data is SERVER_TIMESTAMP:
+            return firestore.SERVER_TIMESTAMP
+        return data
+
+    def get(self, path):
+        doc = self._client().document(path).get()
+        return doc.to_dict() if doc.exists else None
+
+    def set(self, path, data, merge=False):
+        self._client().document(path).set(self._fields(data), merge=merge)
+
+    def update(self, path, data):
+        self._client().document(path).update(self._fields(data))
+
+    def commit(self, writes):
+        client = self._client()
+        # A batch takes at most 500 writes
+        for first in range(0, len(writes), 500):
+            batch = client.batch()
+            for path, data, merge in writes[first:first + 500]:
+                batch.set(client.document(path), self._fields(data), merge=merge)
+            batch.commit()
+
+
+def applyFields(old, data, merge):
+    """
+    The document after writing data over old the way Firestore does.
+    """
+    doc = copy.deepcopy(old) if merge and old else {}
+    for key, value in data.items():
+        if isinstance(value, dict) and merge and isinstance(doc.get(key), dict):
+            doc[key] = applyFields(doc[key], value, True)
+        elif isinstance(value, dict):
+            doc[key] = applyFields({}, value, False)
+        elif isinstance(value, Increment):
+            current = doc.get(key)
+            doc[key] = (current if isinstance(current, (int, float)) else 0) + value.value
+        elif value is DELETE_FIELD:
+            doc.pop(key, None)
+        elif value is SERVER_TIMESTAMP:
+            doc[key] = datetime.datetime.now(tz=datetime.timezone.utc)
+        else:
+            doc[key] = copy.deepcopy(value)
+    return doc
+
+
+class MemoryStorage(Storage):
+    """
+    Documents in a dict, for one process.
+    """
+
+    def __init__(self, latency=0):
+        """
+        :param latency: Seconds every call takes
+        """
+        self.latency = latency
+        self.documents = {}
+        self.lock = threading.Lock()
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get(self, path):
+        self._wait()
+        with self.lock:
+            doc = self.documents.get(path)
+            return copy.deepcopy(doc) if doc is not None else None
+
+    def set(self, path, data, merge=False):
+        self.commit([(path, data, merge)])
+
+    def update(self, path, data):
+        self._wait()
+        with self.lock:
+            if path not in self.documents:
+                raise KeyError(f"No document to update: {path}")
+            self.documents[path] = applyFields(self.documents[path], data, True)
+
+    def commit(self, writes):
+        self._wait()
+        with self.lock:
+            for path, data, merge in writes:
+                self.documents[path] = applyFields(self.documents.get(path), data, merge)
+
+
+class SQLiteStorage(Storage):
+    """
+    Documents as JSON in a SQLite table, kept between runs.
+    """
+
+    def __init__(self, path, latency=0):
+        """
+        :param path: SQLite file, ":memory:" for none
+        :param latency: Seconds every call takes
+        """
+        self.latency = latency
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents (path TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self.connection.commit()
+        self.lock = threading.Lock()
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _load(self, path):
+        row = self.connection.execute(
+            "SELECT data FROM documents WHERE path = ?", (path,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store(self, path, doc):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO documents (path, data) VALUES (?, ?)",
+            (path, json.dumps(doc, default=str)))
+
+    def get(self, path):
+        self._wait()
+        with self.lock:
+            return self._load(path)
+
+    def set(self, path, data, merge=False):
+        self.commit([(path, data, merge)])
+
+    def update(self, path, data):
+        self._wait()
+        with self.lock, self.connection:
+            old = self._load(path)
+            if old is None:
+                raise KeyError(f"No document to update: {path}")
+            self._store(path, applyFields(old, data, True))
+
+    def commit(self, writes):
+        self._wait()
+        # One transaction for all of them
+        with self.lock, self.connection:
+            for path, data, merge in writes:
+                self._store(path, applyFields(self._load(path), data, merge))
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def makeStorage(kind, latency=0):
+    """
+    :param kind: firestore, memory or sqlite:path
+    :param latency: Seconds added to every call of memory and sqlite
+    """
+    if kind == "firestore":
+        return FirestoreStorage()
+    if kind == "memory":
+        return MemoryStorage(latency)
+    if kind.startswith("sqlite:"):
+        return SQLiteStorage(kind[len("sqlite:"):] or ":memory:", latency)
+    raise ValueError(f"Unknown storage: {kind}")
+
+
+def getStorage():
+    """
+    Process-wide storage, picked by FEEDBACK_STORAGE on first use.
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = makeStorage(
+                    os.environ.get("FEEDBACK_STORAGE", "firestore"),
+                    float(os.environ.get("FEEDBACK_STORAGE_LATENCY_MS", 0)) / 1000)
+    return _storage
+
+
+def setStorage(storage):
+    """
+    Use storage from now on, e.g a MemoryStorage in a benchmark.
+    """
+    global _storage
+    with _storage_lock:
+        _storage = storage
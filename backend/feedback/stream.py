@@ -0,0 +1,98 @@
+"""
+    Opens the patient's video stream with bounded timeouts and FFmpeg
+    options that favour latency over smoothness.
+"""
+import os
+import random
+import threading
+import time
+import cv2
+
+
+# FFmpeg demuxer options for network streams. Do not buffer, hand packets
+# out as soon as they arrive and give up probing the stream format early.
+# Files keep the defaults. Set OPENCV_FFMPEG_CAPTURE_OPTIONS to override them.
+LOW_LATENCY_OPTIONS = "|".join([
+    "fflags;nobuffer",
+    "flags;low_delay",
+    "probesize;32768",
+    "analyzeduration;500000",
+    "rtmp_live;live"
+])
+
+# OpenCV reads the options from the environment when a capture is opened,
+# so captures are opened one at a time for files not to get them as well
+_options_lock = threading.Lock()
+_user_options = "OPENCV_FFMPEG_CAPTURE_OPTIONS" in os.environ
+
+
+def openCapture(source, params):
+    if _user_options:
+        return cv2.VideoCapture(source, cv2.CAP_FFMPEG, params)
+    with _options_lock:
+        if "://" in source:
+            os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = LOW_LATENCY_OPTIONS
+        try:
+            return cv2.VideoCapture(source, cv2.CAP_FFMPEG, params)
+        finally:
+            os.environ.pop("OPENCV_FFMPEG_CAPTURE_OPTIONS", None)
+
+
+def openStream(source, timeout=5):
+    """
+    Open a video stream.
+    :param source: URL or file of the stream, or a camera index
+    :param timeout: Seconds to wait for the stream to open and for
+                    every frame, a dead URL fails after that
+    :return: The cv2.VideoCapture and the probe of the stream
+    """
+    started = time.time()
+    if isinstance(source, str):
+        cap = openCapture(source, [
+            cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(timeout * 1000),
+            cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(timeout * 1000)
+        ])
+    else:
+        cap = cv2.VideoCapture(source)
+    probe = probeStream(cap)
+    probe["openSeconds"] = round(time.time() - started, 4)
+    return cap, probe
+
+
+def reconnectStream(source, timeout=5, attempts=4, delay=0.5, maxDelay=4):
+    """
+    Open a stream that broke again, with exponential backoff between the
+    attempts. The waits are jittered so the sessions of a network outage
+    do not all come back at the same moment.
+    :param source: URL of the stream
+    :param timeout: Seconds to wait for the stream to open
+    :param attempts: How many times to try
+    :param delay: Seconds before the first attempt, doubled on every next one
+    :param maxDelay: Longest wait between two attempts
+    :return: The opened cv2.VideoCapture, None when every attempt failed,
+             and the attempts made
+    """
+    for attempt in range(attempts):
+        time.sleep(min(delay * 2 ** attempt, maxDelay) * random.uniform(0.5, 1))
+        cap, probe = openStream(source, timeout)
+        if probe["opened"]:
+            return cap, attempt + 1
+        cap.release()
+    return None, attempts
+
+
+def probeStream(cap):
+    """
+    Codec, resolution and frame rate of an opened stream.
+    """
+    if not cap.isOpened():
+        return {"opened": False}
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    return {
+        "opened": True,
+        "backend": cap.getBackendName(),
+        "codec": fourcc.to_bytes(4, "little").decode("ascii", "replace").strip("\x00") if fourcc else None,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": round(cap.get(cv2.CAP_PROP_FPS), 2)
+    }
@@ -0,0 +1,121 @@
+"""
+    Scheduled coaching messages, so follow-up messages can be
+    delayed without pausing the frame loop.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+
+class Timeline:
+    """
+    Runs callbacks after a delay on one background thread. Entries can
+    be tagged with a key, scheduling a new entry with the same key
+    replaces the old one.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.keys = {}
+        self.counter = itertools.count()
+        self.hold_until = 0
+        self.running = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def schedule(self, delay, fn, *args, key=None):
+        """
+        Call fn(*args) after delay seconds.
+        :param delay: Seconds from now
+        :param fn: Callback
+        :param key: Optional key, replaces a pending entry with the same key
+        """
+        with self.condition:
+            if key is not None:
+                self._cancel(key)
+            entry = [time.time() + delay, next(self.counter), fn, args, key]
+            heapq.heappush(self.entries, entry)
+            if key is not None:
+                self.keys[key] = entry
+            self.condition.notify()
+            return entry
+
+    def _cancel(self, key):
+        entry = self.keys.pop(key, None)
+        if entry is not None:
+            entry[2] = None
+
+    def cancel(self, key):
+        """
+        Drop the pending entry scheduled with key, if any.
+        """
+        with self.condition:
+            self._cancel(key)
+
+    def hold(self, seconds):
+        """
+        Mark the next seconds as a quiet period for new coaching messages.
+        """
+        with self.condition:
+            self.hold_until = max(self.hold_until, time.time() + seconds)
+
+    def holding(self):
+        return time.time() < self.hold_until
+
+    def pending(self):
+        with self.condition:
+            return sum(1 for entry in self.entries if entry[2] is not None) + self.running
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed and (not self.entries or self.entries[0][0] > time.time()):
+                    if self.entries:
+                        self.condition.wait(self.entries[0][0] - time.time())
+                    else:
+                        self.condition.wait()
+                if self.closed:
+                    return
+                entry = heapq.heappop(self.entries)
+                when, _, fn, args, key = entry
+                if key is not None and self.keys.get(key) is entry:
+                    del self.keys[key]
+                if fn is None:
+                    continue
+                self.running += 1
+
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Scheduled message failed: {e}")
+
+            with self.condition:
+                self.running -= 1
+                self.condition.notify_all()
+
+    def drain(self, timeout=10):
+        """
+        Wait for every pending entry to run.
+        :return: True when nothing is left to run
+        """
+        deadline = time.time() + timeout
+        while self.pending():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            with self.condition:
+                self.condition.wait(min(remaining, 0.05))
+        return True
+
+    def close(self):
+        """
+        Drop pending entries and stop the thread.
+        """
+        with self.condition:
+            self.entries = []
+            self.keys = {}
+            self.closed = True
+            self.condition.notify_all()
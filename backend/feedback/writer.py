@@ -0,0 +1,180 @@
+"""
+    Write-behind queue for the documents the feedback function
+    writes while frames are processed.
+"""
+import threading
+import time
+from metrics import processMetrics
+from storage import getStorage, Increment
+
+
+def deepMerge(old, new):
+    """
+    Merge two Firestore payloads the same way set(merge=True) merges
+    maps on the server. An Increment on top of an Increment or a number
+    adds up, as the two writes one after the other would.
+    """
+    merged = dict(old)
+    for key, value in new.items():
+        previous = merged.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            merged[key] = deepMerge(previous, value)
+        elif isinstance(value, Increment) and isinstance(previous, Increment):
+            merged[key] = Increment(previous.value + value.value)
+        elif isinstance(value, Increment) and isinstance(previous, (int, float)) \
+                and not isinstance(previous, bool):
+            merged[key] = previous + value.value
+        else:
+            merged[key] = value
+    return merged
+
+
+class WriteBehindQueue:
+    """
+    Queues document writes and commits them from background threads.
+    Writes waiting for the same document are coalesced into one, so the
+    caller never waits on the storage and a burst of messages costs a single
+    round trip. Different documents are committed in parallel, the writes
+    of one document always one after the other.
+    """
+
+    def __init__(self, storage=None, interval=0.1, retries=2, workers=4):
+        """
+        :param storage: Storage written to, defaults to the shared one
+        :param interval: Seconds to wait for more writes before committing
+        :param retries: How many times a failed write is retried
+        :param workers: Threads committing at the same time
+        """
+        self.storage = storage
+        self.interval = interval
+        self.retries = retries
+        self.workers = workers
+        self.pending = {}
+        self.order = []
+        self.due = {}
+        # Path prefixes being flushed, committed without waiting
+        self.flushing = []
+        self.committing = set()
+        self.counters = {"queued": 0, "coalesced": 0,
+                         "written": 0, "failed": 0}
+        self.condition = threading.Condition()
+        self.threads = []
+
+    def set(self, path, data, merge=False, delay=None):
+        """
+        Queue a set() on the document at path.
+        :param path: Document path, e.g users/{uid}/liveComments/{date}
+        :param data: Fields to write
+        :param merge: Same meaning as in DocumentReference.set()
+        :param delay: Seconds to wait for more writes to the document
+                      before committing, defaults to interval
+        """
+        due = time.time() + (self.interval if delay is None else delay)
+        with self.condition:
+            self.counters["queued"] += 1
+            self.due[path] = min(due, self.due.get(path, due))
+            if path in self.pending:
+                old_data, old_merge = self.pending[path]
+                if merge:
+                    self.pending[path] = deepMerge(old_data, data), old_merge
+                else:
+                    self.pending[path] = data, False
+                self.counters["coalesced"] += 1
+            else:
+                self.pending[path] = data, merge
+                self.order.append(path)
+            self._start()
+            self.condition.notify_all()
+
+    def _start(self):
+        self.threads = [thread for thread in self.threads if thread.is_alive()]
+        while len(self.threads) < min(self.workers, len(self.order)):
+            thread = threading.Thread(target=self._run, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _next(self):
+        """
+        The path to commit now, or None and the seconds until one is due,
+        None when nothing is waiting. Called with the condition held.
+        """
+        now = time.time()
+        wait = None
+        for path in self.order:
+            if path in self.committing:
+                # Its earlier write is still on its way
+                continue
+            if self.due[path] <= now or any(path.startswith(prefix) for prefix in self.flushing):
+                return path, 0
+            wait = self.due[path] - now if wait is None else min(wait, self.due[path] - now)
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self.condition:
+                # Give the frame loop a moment to pile more writes on top
+                path, wait = self._next()
+                while path is None:
+                    self.condition.wait(wait)
+                    path, wait = self._next()
+                self.order.remove(path)
+                del self.due[path]
+                data, merge = self.pending.pop(path)
+                self.committing.add(path)
+
+            failed = not self._commit(path, data, merge)
+
+            with self.condition:
+                self.committing.discard(path)
+                if failed:
+                    self.counters["failed"] += 1
+                else:
+                    self.counters["written"] += 1
+                self.condition.notify_all()
+
+    def _commit(self, path, data, merge):
+        for attempt in range(self.retries + 1):
+            try:
+                storage = self.storage or getStorage()
+                started = time.perf_counter()
+                storage.set(path, data, merge=merge)
+                processMetrics.observe("commit", time.perf_counter() - started)
+                return True
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"Failed to write {path}: {e}")
+                else:
+                    time.sleep(0.2 * (attempt + 1))
+        return False
+
+    def flush(self, timeout=10, prefix=""):
+        """
+        Block until the queued writes are committed or timeout seconds pass.
+        :param prefix: Only wait for the documents whose path starts with
+                       it, e.g users/{uid}/ for the writes of one session
+        :return: True when none of them is left in the queue
+        """
+        deadline = time.time() + timeout
+        with self.condition:
+            # Commit them without waiting for the delays
+            self.flushing.append(prefix)
+            self.condition.notify_all()
+            try:
+                while any(path.startswith(prefix) for path in self.order) or \
+                        any(path.startswith(prefix) for path in self.committing):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    self.condition.wait(remaining)
+            finally:
+                self.flushing.remove(prefix)
+        return True
+
+    def stats(self):
+        """
+        Counters of queued, coalesced, written and failed writes.
+        """
+        with self.condition:
+            stats = dict(self.counters)
+            stats["pending"] = len(self.order) + len(self.committing)
+        return stats
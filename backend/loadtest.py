@@ -0,0 +1,295 @@
+"""
+    Load test of a feedback function served by functions-framework.
+    Starts more and more sessions at once and records how each one did,
+    the result is a capacity curve to compare between releases.
+
+    The sessions watch a local video, served by this script as a live
+    MJPEG stream at the video's frame rate, instead of RTMP streams.
+    Run the function against in-memory storage so no Firestore is needed:
+
+        FEEDBACK_STORAGE=memory functions-framework --source feedback/main.py --target feedbackShared --port 8080
+        python loadtest.py test.avi --url http://localhost:8080 --levels 1 2 4 8 --pid <functions-framework pid>
+
+    Compare with the curve of an earlier release: --compare old.json
+"""
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+import requests
+
+
+# An exercise is over 60 s after its session started, the streams last
+# longer so the sessions end with the exercise, not by failing to
+# reconnect once their stream is over
+STREAM_SECONDS = 75
+
+
+class StreamServer:
+    """
+    Serves a video over HTTP as multipart MJPEG, paced at its frame rate
+    and looped for duration seconds, to every client on its own. Every
+    URL is a live stream that starts with its first connection, a client
+    reconnecting picks it up where it is now, after duration seconds the
+    stream is over and a reconnecting session gives up.
+    """
+
+    def __init__(self, video, duration=STREAM_SECONDS, port=0):
+        """
+        :param video: Video file streamed
+        :param duration: Seconds every stream lasts, longer than an
+                         exercise so the sessions end with it
+        :param port: Port to listen on, a free one by default
+        """
+        cap = cv2.VideoCapture(video)
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        self.frames = []
+        while True:
+            success, img = cap.read()
+            if not success:
+                break
+            self.frames.append(cv2.imencode(".jpg", img)[1].tobytes())
+        cap.release()
+        if not self.frames:
+            raise ValueError(f"No frames in {video}")
+        self.duration = duration
+        self.streams = {}
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.serve(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def url(self, host=None):
+        return f"http://{host or socket.gethostname()}:{self.port}/stream.mjpg"
+
+    def serve(self, handler):
+        with self.lock:
+            started = self.streams.setdefault(handler.path, time.time())
+        if time.time() - started >= self.duration:
+            handler.send_error(404, "Stream is over")
+            return
+        handler.send_response(200)
+        handler.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        handler.end_headers()
+        index = int((time.time() - started) * self.fps)
+        try:
+            while time.time() - started < self.duration:
+                frame = self.frames[index % len(self.frames)]
+                handler.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n"
+                                    + f"Content-Length: {len(frame)}\r\n\r\n".encode()
+                                    + frame + b"\r\n")
+                index += 1
+                # Paced against the start so a slow write does not add up
+                delay = started + index / self.fps - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+def processTree(pid):
+    """
+    pid and all its descendants, e.g the inference processes.
+    """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree = [pid]
+    for parent in tree:
+        tree.extend(children.get(parent, []))
+    return tree
+
+
+def usage(pid):
+    """
+    CPU seconds used so far and resident memory in MB of a process tree.
+    """
+    ticks = os.sysconf("SC_CLK_TCK")
+    pagesize = os.sysconf("SC_PAGE_SIZE")
+    cpu = 0
+    memory = 0
+    for process in processTree(pid):
+        try:
+            with open(f"/proc/{process}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{process}/statm") as f:
+                memory += int(f.read().split()[1]) * pagesize
+        except (OSError, IndexError, ValueError):
+            continue
+        # utime and stime, fields 14 and 15 of stat
+        cpu += (int(fields[11]) + int(fields[12])) / ticks
+    return cpu, memory / 2 ** 20
+
+
+class UsageSampler:
+    """
+    Samples usage() of a process tree on a thread.
+    """
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.samples.append((time.time(),) + usage(self.pid))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        """
+        :return: Mean CPUs busy and peak memory in MB while sampling
+        """
+        self.stopped.set()
+        self.thread.join()
+        self.samples.append((time.time(),) + usage(self.pid))
+        (start, cpu0, _), (end, cpu1, _) = self.samples[0], self.samples[-1]
+        return {
+            "cpu": round((cpu1 - cpu0) / (end - start), 3) if end > start else 0,
+            "memory": round(max(sample[2] for sample in self.samples), 1)
+        }
+
+
+def session(url, source, uid, timeout):
+    """
+    One feedback request.
+    :return: What the session reported about itself
+    """
+    started = time.time()
+    try:
+        response = requests.post(url, json={"source": source, "uid": uid}, timeout=timeout)
+    except requests.RequestException as e:
+        return {"error": repr(e)}
+    elapsed = time.time() - started
+    if response.status_code == 503:
+        return {"rejected": True}
+    if response.status_code != 200:
+        return {"error": f"{response.status_code} {response.text[:200]}"}
+
+    body = response.json()
+    capture = body.get("capture", {})
+    startup = body.get("startup", {}).get("seconds")
+    # Not the time spent waiting for a broken stream to come back
+    running = elapsed - (startup or 0) - body.get("reconnectSeconds", 0)
+    return {
+        "seconds": round(elapsed, 3),
+        # The first comment is posted when the first frame arrives
+        "firstComment": startup,
+        "fps": round(body.get("frames", 0) / running, 2) if running > 0 else 0,
+        "captured": capture.get("captured", 0),
+        "dropped": capture.get("dropped", 0),
+        "latency": capture.get("latency", {}).get("mean")
+    }
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+
+def level(url, source, count, timeout, pid=None):
+    """
+    Run count sessions at once.
+    :return: Point of the capacity curve
+    """
+    sampler = UsageSampler(pid) if pid else None
+    with ThreadPoolExecutor(count) as executor:
+        results = list(executor.map(lambda n: session(url, f"{source}?session={count}-{n}",
+                                                      f"loadtest-{count}-{n}", timeout),
+                                    range(count)))
+    point = {"sessions": count}
+    if sampler is not None:
+        point.update(sampler.stop())
+
+    done = [result for result in results if "fps" in result]
+    point["completed"] = len(done)
+    point["rejected"] = sum(1 for result in results if result.get("rejected"))
+    point["errors"] = [result["error"] for result in results if "error" in result]
+    fps = [result["fps"] for result in done]
+    first = [result["firstComment"] for result in done if result["firstComment"] is not None]
+    captured = sum(result["captured"] for result in done)
+    point["fps"] = {"p50": percentile(fps, 50), "min": min(fps) if fps else None}
+    point["firstComment"] = {"p50": percentile(first, 50), "p90": percentile(first, 90)}
+    point["dropped"] = round(sum(result["dropped"] for result in done) / captured, 3) if captured else None
+    return point
+
+
+def compare(curve, baseline):
+    old = {point["sessions"]: point for point in baseline}
+    for point in curve:
+        before = old.get(point["sessions"])
+        if before is None:
+            continue
+        print(f"{point['sessions']} sessions: fps p50 {before['fps']['p50']} -> {point['fps']['p50']}, "
+              f"first comment p50 {before['firstComment']['p50']} -> {point['firstComment']['p50']} s, "
+              f"dropped {before['dropped']} -> {point['dropped']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video", help="Video file every session watches")
+    parser.add_argument("--url", default="http://localhost:8080", help="URL of the feedback function")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Sessions run at once, one level after the other")
+    parser.add_argument("--duration", type=float, default=STREAM_SECONDS, help="Seconds every stream lasts")
+    parser.add_argument("--host", help="Host name the function reaches this machine with")
+    parser.add_argument("--pid", type=int, help="Process of the function, for its CPU and memory")
+    parser.add_argument("--output", default="capacity.json")
+    parser.add_argument("--compare", help="Capacity curve of an earlier run")
+    args = parser.parse_args()
+
+    server = StreamServer(args.video, args.duration)
+    source = server.url(args.host)
+    curve = []
+    try:
+        for count in args.levels:
+            point = level(args.url, source, count, args.duration + 60, args.pid)
+            print(json.dumps(point))
+            curve.append(point)
+    finally:
+        server.close()
+
+    with open(args.output, "w") as f:
+        json.dump(curve, f, indent=2)
+    print(f"Capacity curve written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(curve, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,11 @@
+import os
+import sys
+
+# updateExercise uses the storage of the feedback function
+FEEDBACK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "feedback")
+if FEEDBACK_PATH not in sys.path:
+    sys.path.insert(0, FEEDBACK_PATH)
+
 
 def hello(request):
     if request.method == "POST":
@@ -25,25 +33,17 @@ def hello(request):
 
 
 def updateExercise(request):
-    from google.cloud import firestore
-    import google.auth
-    import datetime
+    from storage import getStorage
 
     if request.method == "POST":
         request_data = request.get_json()
 
-        credentials, project = google.auth.default()
-        db = firestore.Client(project=project, credentials=credentials)
-
         uid = request_data["uid"]
-        doc_ref = db.document(
-            f"users/{uid}/measureComments/{str(datetime.date.today())}")
-
-        doc_ref.set({
+        getStorage().setMeasureComments(uid, {
             u"Error": {"type": "No hand",
                        "message": "Make sure there is hands on the screen"},
             u"message": "none"
-        }, merge=True)
+        })
         return "Successful", 200
 
     else:
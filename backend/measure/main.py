@@ -0,0 +1,178 @@
+"""
+    Measures how far the paralysed hand moves. The patient moves the
+    wrist side to side and up and down and opens and closes the hand in
+    front of the camera for MEASURE_WINDOW seconds, then the range of
+    every movement is written to the day's measureComments document.
+
+    The stream is read and the hands are found the same way as in the
+    feedback function, with its modules. deploy.py copies them next to
+    this file, so the folder it builds deploys on its own.
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Run from the repository, the modules are still in the feedback folder
+FEEDBACK_PATH = os.path.join(HERE, "..", "feedback")
+if not os.path.exists(os.path.join(HERE, "hands.py")) and FEEDBACK_PATH not in sys.path:
+    sys.path.insert(0, FEEDBACK_PATH)
+
+from hands import HandDetector  # noqa: E402
+from capture import FrameGrabber  # noqa: E402
+from stream import openStream  # noqa: E402
+from pool import DetectorPool  # noqa: E402
+from metrics import StageTimer, NO_TIMING, processMetrics  # noqa: E402
+from storage import getStorage, SERVER_TIMESTAMP  # noqa: E402
+from writer import WriteBehindQueue  # noqa: E402
+from profiles import getProfiles  # noqa: E402
+from motion import LandmarkHistory, rangeOfMotion  # noqa: E402
+
+
+# Same detector and stream settings as feedback, so a frame costs the same
+MEASURE_DETECTOR = {"detectionCon": 0.8, "maxHands": 3, "roi": True}
+MEASURE_STREAM = {"timeout": 5, "width": 640}
+
+# Seconds the patient gets to get ready, then seconds measured
+MEASURE_DELAY = 2
+MEASURE_WINDOW = 30
+
+detectorPool = DetectorPool(HandDetector)
+detectorPool.warm(1, **MEASURE_DETECTOR)
+
+measureWriter = WriteBehindQueue()
+
+NO_ERROR = {
+    "type": "none",
+    "message": "none"
+}
+
+
+def updateMeasureComments(error, message, uid):
+    measureWriter.set(getStorage().measureCommentsPath(uid), {
+        u"Error": error,
+        u"message": message
+    }, merge=True)
+
+
+def pickHand(hands, hand_type):
+    """
+    Index of the paralysed hand among the hands on a frame, None when
+    it is not clear which one it is.
+    """
+    if len(hands) == 1:
+        return 0
+    matching = [index for index, kind in enumerate(hands.types) if kind == hand_type]
+    return matching[0] if len(matching) == 1 else None
+
+
+def runMeasure(request_data, detector, cold=False):
+    """
+    Runs a whole measurement on the stream in request_data. Every frame
+    only adds the landmarks of the hand to the history, the ranges are
+    computed once at the end and written in one go.
+    :param request_data: Body of the measure request
+    :param detector: HandDetector, or anything with the same methods
+    :param cold: The detector had to be built for this measurement
+    :return: The response of the request
+    """
+    requested = time.time()
+    uid = request_data["uid"]
+    hand_type = getProfiles().get(uid).get("paralysedHand")
+    timer = StageTimer(1)
+    detector.timer = timer
+    stream, probe = openStream(request_data["source"], MEASURE_STREAM["timeout"])
+    # A recorded video is read as fast as it is measured, none of its
+    # frames are dropped and they are timed on its own timeline
+    recorded = isinstance(request_data["source"], str) and "://" not in request_data["source"]
+    cap = FrameGrabber(stream, dropFrames=not recorded, timer=timer,
+                       width=MEASURE_STREAM["width"], position=recorded)
+    history = LandmarkHistory()
+    response = {"stream": probe}
+    started = None
+    missing = False
+    try:
+        while True:
+            timer.frame()
+            waited = timer.start()
+            success, img = cap.read()
+            timer.lap("wait", waited)
+            if not success:
+                break
+            if started is None:
+                updateMeasureComments(NO_ERROR, "Start the measurement.", uid)
+                response["startup"] = {
+                    "cold": cold,
+                    "seconds": round(time.time() - requested, 4)
+                }
+                started = cap.timestamp + MEASURE_DELAY
+            if cap.timestamp < started:
+                # Keep draining the stream while the patient gets ready
+                continue
+            if cap.timestamp - started >= MEASURE_WINDOW:
+                break
+
+            hands = detector.findHands(img, False).scaled(cap.scale)
+            measured = timer.start()
+            if not len(hands):
+                if not missing:
+                    updateMeasureComments({
+                        "type": "No hand",
+                        "message": "Make sure there is hands on the screen"
+                    }, "none", uid)
+                    missing = True
+            else:
+                if missing:
+                    updateMeasureComments(NO_ERROR, "Continue the measurement.", uid)
+                    missing = False
+                index = pickHand(hands, hand_type)
+                if index is not None:
+                    history.append(hands.points[index], cap.timestamp)
+            timer.lap("measure", measured)
+    finally:
+        cap.release()
+        detector.timer = NO_TIMING
+        processMetrics.merge(timer)
+
+    points, times = history.arrays()
+    results = rangeOfMotion(points, times, detector)
+    if started is None:
+        error = {
+            "type": "Stream failure",
+            "message": "Failed to initialize the stream."
+        }
+        response["message"] = "Failed to initialize the stream"
+    elif results is None:
+        error = {
+            "type": "No hand",
+            "message": "The hand was not seen long enough to measure it, please try again."
+        }
+        response["message"] = "No hand measured"
+    else:
+        error = NO_ERROR
+        response["message"] = "The measurement is over."
+        response["results"] = results
+
+    data = {u"Error": error, u"message": response["message"]}
+    if results is not None:
+        data[u"results"] = dict(results, updated=SERVER_TIMESTAMP)
+    measureWriter.set(getStorage().measureCommentsPath(uid), data, merge=True)
+    measureWriter.flush()
+    response["capture"] = cap.stats()
+    response["writes"] = measureWriter.stats()
+    response["timing"] = timer.summary()
+    return response
+
+
+def measure(request):
+    if request.method == "POST":
+        request_data = request.get_json()
+
+        detector, cold = detectorPool.checkout(**MEASURE_DETECTOR)
+        try:
+            return runMeasure(request_data, detector, cold)
+        finally:
+            detectorPool.checkin(detector)
+
+    else:
+        return "Unknown request", 404
@@ -0,0 +1,105 @@
+"""
+    Range of motion of a hand over a whole measurement. The landmarks of
+    every frame are only stored while the stream runs, the ranges are
+    computed at the end on all of them at once with NumPy.
+"""
+import numpy as np
+
+
+WRIST = 0
+TIPS = [4, 8, 12, 16, 20]
+
+
+class LandmarkHistory:
+    """
+    Landmarks of one hand and when they were seen, in preallocated
+    arrays that double when they are full.
+    """
+
+    def __init__(self, capacity=1024):
+        self.points = np.empty((capacity, 21, 2), np.int32)
+        self.times = np.empty(capacity, np.float64)
+        self.count = 0
+
+    def append(self, points, now):
+        """
+        :param points: Landmarks of the hand in pixels, shape (21, 2)
+        :param now: When the frame was taken
+        """
+        if self.count == len(self.times):
+            self._grow()
+        self.points[self.count] = points
+        self.times[self.count] = now
+        self.count += 1
+
+    def _grow(self):
+        points = np.empty((2 * len(self.times), 21, 2), np.int32)
+        times = np.empty(2 * len(self.times), np.float64)
+        points[:self.count] = self.points[:self.count]
+        times[:self.count] = self.times[:self.count]
+        self.points, self.times = points, times
+
+    def __len__(self):
+        return self.count
+
+    def arrays(self):
+        return self.points[:self.count], self.times[:self.count]
+
+
+def norm(delta):
+    return np.hypot(delta[..., 0], delta[..., 1])
+
+
+def rangeOfMotion(points, times, detector, trim=5):
+    """
+    :param points: Landmarks of the hand on every frame, shape (n, 21, 2)
+    :param times: When every frame was taken, in seconds
+    :param detector: HandDetector, for the distance from the screen
+    :param trim: Percent of the frames left out at both ends of a range,
+                 so a few bad detections do not widen it
+    :return: The ranges, None without at least two frames
+    """
+    if len(points) < 2:
+        return None
+    points = points.astype(np.float64)
+    wrist = points[:, WRIST]
+    # Width of the palm, the lengths are relative to it so they do not
+    # change with the distance from the screen
+    palm = np.maximum(norm(points[:, 17] - points[:, 5]), 1)
+
+    # Side to side: angle of the line from the wrist to the tip of the
+    # middle finger, 0 is straight up
+    axis = points[:, 12] - wrist
+    angle = np.degrees(np.arctan2(axis[:, 0], -axis[:, 1]))
+    centre = np.median(angle)
+    left, right = np.percentile(angle, [trim, 100 - trim])
+    speed = np.abs(np.diff(angle)) / np.maximum(np.diff(times), 1e-3)
+
+    # Up and down: the hand looks shorter the more the wrist bends
+    # towards or away from the screen
+    length = norm(axis) / palm
+    short, full = np.percentile(length, [trim, 100 - trim])
+
+    # Opening and closing: mean distance of the finger tips to the wrist
+    reach = norm(points[:, TIPS] - wrist[:, None]).mean(axis=1) / palm
+    closed, opened = np.percentile(reach, [trim, 100 - trim])
+
+    distance = detector.findDistancesCM(points[:, 5], points[:, 17])
+    return {
+        u"frames": len(points),
+        u"seconds": round(float(times[-1] - times[0]), 2),
+        u"distanceCM": round(float(np.median(distance)), 1),
+        u"sideToSide": {
+            u"range": round(float(right - left), 1),
+            u"left": round(float(centre - left), 1),
+            u"right": round(float(right - centre), 1),
+            u"speed": round(float(np.percentile(speed, 95)), 1)
+        },
+        u"upAndDown": {
+            # Percent of the straight hand's length
+            u"range": round(float((full - short) / full * 100), 1) if full else 0
+        },
+        u"grip": {
+            u"range": round(float((opened - closed) / opened * 100), 1) if opened else 0
+        }
+    }
@@ -0,0 +1,62 @@
+"""
+    Listens to the live comments of a user pushed by feedbackShared,
+    like the phone does, and reports how long they took to arrive. Start
+    it, then a session of the same user on the same instance:
+
+        FEEDBACK_STORAGE=memory functions-framework --source feedback/main.py --target feedbackShared --port 8080
+        python push_client.py --url http://localhost:8080 --uid test
+        curl -X POST localhost:8080 -H "Content-Type: application/json" -d '{"source": "test.avi", "uid": "test"}'
+
+    The latency is measured against the clock of the function, run both
+    on the same machine.
+"""
+import argparse
+import json
+import time
+import numpy as np
+import requests
+
+
+def listen(url, uid, seconds, show=False):
+    """
+    :return: Seconds between every comment being sent and received
+    """
+    latencies = []
+    deadline = time.time() + seconds
+    with requests.get(f"{url.rstrip('/')}/events", params={"uid": uid},
+                      stream=True, timeout=(5, 30)) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(chunk_size=1, decode_unicode=True):
+            received = time.time()
+            if line and line.startswith("data:"):
+                event = json.loads(line[len("data:"):])
+                latencies.append(received - event["sent"])
+                if show:
+                    print(f"{latencies[-1] * 1000:7.1f} ms  {event['message']}")
+            if received > deadline:
+                break
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8080", help="URL of the feedback function")
+    parser.add_argument("--uid", default="test", help="User whose comments are listened to")
+    parser.add_argument("--seconds", type=float, default=60, help="How long to listen")
+    parser.add_argument("--show", action="store_true", help="Print every comment")
+    args = parser.parse_args()
+
+    try:
+        latencies = listen(args.url, args.uid, args.seconds, args.show)
+    except KeyboardInterrupt:
+        return
+    if not latencies:
+        print("No comments received")
+        return
+    ms = np.array(latencies) * 1000
+    print(f"{len(ms)} comments, latency p50 {np.percentile(ms, 50):.1f} ms, "
+          f"p90 {np.percentile(ms, 90):.1f} ms, max {ms.max():.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+    Replays recorded videos, e.g the ones made with video_record.py,
+    through HandDetector and Exercise as fast as possible. No stream
+    and no Firestore needed, the messages go to a stub sink.
+
+    Run: python replay.py test.avi --exercise 0 --hand Right
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "feedback"))
+
+from hands import HandDetector  # noqa: E402
+from main import Exercise, FEEDBACK_DETECTOR, pickHand, the_average  # noqa: E402
+
+
+STAGES = ("decode", "detect", "exercise", "sink")
+
+
+class StubSink:
+    """
+    Keeps the messages Exercise returns instead of posting them.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.score = []
+        self.the_time = []
+        self.grades = {}
+
+    def post(self, the_message, now):
+        if the_message is None:
+            return
+        self.messages.append((round(now, 3), the_message))
+        if type(the_message) == float:
+            self.score.append(the_message)
+        elif type(the_message) == tuple:
+            self.the_time.append(the_message[0])
+        elif type(the_message) == str and the_message != "time":
+            self.grades[the_message] = self.grades.get(the_message, 0) + 1
+
+    def results(self):
+        return {
+            "score": the_average(self.score),
+            "time": round(sum(self.the_time) / len(self.the_time), 3) if self.the_time else 0,
+            "messages": self.grades
+        }
+
+
+def percentiles(timings):
+    """
+    Milliseconds at the 50th, 90th and 99th percentile and the mean.
+    """
+    if not timings:
+        return {"p50": 0, "p90": 0, "p99": 0, "mean": 0}
+    timings = np.array(timings) * 1000
+    p50, p90, p99 = np.percentile(timings, (50, 90, 99))
+    return {"p50": round(float(p50), 3), "p90": round(float(p90), 3),
+            "p99": round(float(p99), 3), "mean": round(float(timings.mean()), 3)}
+
+
+def exerciseStep(exercise, detector, exer, hand, now):
+    """
+    Feed a hand to the exercise the way feedback() does.
+    """
+    points = hand.points
+    if exer == 0:
+        dista = detector.findDistanceCM(points[5].tolist(), points[17].tolist())
+        return exercise.wristSideToSide(points[0].tolist(), points[12].tolist(), dista, now)
+    return exercise.wristUpAndDown(
+        points[0].tolist(), points[4].tolist(), points[8].tolist(),
+        points[12].tolist(), points[16].tolist(), points[20].tolist(), hand.type, now)
+
+
+def replay(video, exer=0, hand_type=None, detector=None, sink=None):
+    """
+    Run a video through the pipeline.
+    :param video: Path of the video file
+    :param exer: 0 for wristSideToSide, 1 for wristUpAndDown
+    :param hand_type: Paralysed hand, picked when several hands are seen
+    :param detector: HandDetector to use, a new one by default
+    :return: Report with frames/s, per stage latencies and the results
+    """
+    detector = detector or HandDetector(**FEEDBACK_DETECTOR)
+    sink = sink or StubSink()
+    exercise = Exercise()
+    cap = cv2.VideoCapture(video)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    timings = {stage: [] for stage in STAGES}
+    hand = None
+    frames = 0
+
+    started = time.perf_counter()
+    while True:
+        tick = time.perf_counter()
+        success, img = cap.read()
+        if not success:
+            break
+        # Timestamps of the video, not of the replay, so the rep
+        # times come out as if it was watched live
+        now = frames / fps
+        frames += 1
+
+        detected = time.perf_counter()
+        timings["decode"].append(detected - tick)
+        hands = detector.findHands(img, False)
+
+        analysed = time.perf_counter()
+        timings["detect"].append(analysed - detected)
+        the_message = None
+        if hands:
+            hand = pickHand(hands, hand_type, hand)
+            the_message = exerciseStep(exercise, detector, exer, hand, now)
+
+        posted = time.perf_counter()
+        timings["exercise"].append(posted - analysed)
+        sink.post(the_message, now)
+        timings["sink"].append(time.perf_counter() - posted)
+    elapsed = time.perf_counter() - started
+    cap.release()
+
+    return {
+        "video": video,
+        "frames": frames,
+        "seconds": round(elapsed, 3),
+        "fps": round(frames / elapsed, 2) if elapsed else 0,
+        "stages": {stage: percentiles(timings[stage]) for stage in STAGES},
+        "results": sink.results()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--exercise", type=int, default=0,
+                        help="0 for wristSideToSide, 1 for wristUpAndDown")
+    parser.add_argument("--hand", default=None, help="Paralysed hand, Left or Right")
+    args = parser.parse_args()
+
+    for video in args.videos:
+        print(json.dumps(replay(video, args.exercise, args.hand), indent=2))
+
+
+if __name__ == "__main__":
+    main()
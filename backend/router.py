@@ -0,0 +1,257 @@
+"""
+    Spreads feedback sessions over several nodes running feedbackShared.
+    The router polls the load of every node, sends each new session to
+    the least loaded one and moves sessions off a node that saturates:
+    the node ends the session leaving its checkpoint, and the router
+    posts the same request to another node, which resumes it. The nodes
+    need a storage they all share for that, Firestore when deployed.
+
+    Three nodes and the router on one machine:
+
+        export FEEDBACK_STORAGE=sqlite:/tmp/feedback.db FEEDBACK_WORKERS=1
+        functions-framework --source feedback/main.py --target feedbackShared --port 8081 &
+        functions-framework --source feedback/main.py --target feedbackShared --port 8082 &
+        functions-framework --source feedback/main.py --target feedbackShared --port 8083 &
+        python router.py http://localhost:8081 http://localhost:8082 http://localhost:8083 --port 8080
+
+    Clients post to the router as they would to a node, GET /nodes shows
+    the last load report of every node.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+
+class Node:
+    """
+    A node as the router sees it.
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.report = None
+        self.seen = 0
+        self.failures = 0
+        # Sessions sent since the last report, not counted in it yet
+        self.placing = 0
+        self.moved = 0
+
+    @property
+    def alive(self):
+        return self.report is not None and self.failures < 3
+
+    def room(self):
+        return self.report["capacity"] - self.report["active"] - self.placing
+
+    def load(self):
+        """
+        Share of the node's capacity in use, counting the sessions on their way.
+        """
+        return (self.report["active"] + self.placing) / max(self.report["capacity"], 1)
+
+    def stats(self):
+        return {"url": self.url, "alive": self.alive, "placing": self.placing,
+                "moved": self.moved, "report": self.report}
+
+
+class Router:
+    """
+    Places sessions on nodes and moves them off saturated ones.
+    """
+
+    def __init__(self, urls, interval=1, cooldown=10, timeout=600):
+        """
+        :param urls: URLs of the nodes' feedbackShared functions
+        :param interval: Seconds between two polls of the load
+        :param cooldown: Seconds between two sessions moved off the same node
+        :param timeout: Seconds a session may take on a node
+        """
+        self.nodes = [Node(url) for url in urls]
+        self.interval = interval
+        self.cooldown = cooldown
+        self.timeout = timeout
+        # Node every user's session runs on
+        self.sessions = {}
+        self.counters = {"placed": 0, "moved": 0, "rejected": 0, "failed": 0}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.poll()
+            self.rebalance()
+            self.stopped.wait(self.interval)
+
+    def poll(self):
+        for node in self.nodes:
+            try:
+                report = requests.get(f"{node.url}/load", timeout=2).json()
+            except (requests.RequestException, ValueError):
+                with self.lock:
+                    node.failures += 1
+                continue
+            with self.lock:
+                node.report = report
+                node.seen = time.time()
+                node.failures = 0
+                node.placing = 0
+
+    def place(self, exclude=()):
+        """
+        The least loaded node with room, preferring the ones that are not
+        saturated and then the most inference headroom.
+        :return: None when every node is full
+        """
+        with self.lock:
+            nodes = [node for node in self.nodes
+                     if node.alive and node not in exclude and node.room() > 0]
+            if not nodes:
+                return None
+            node = min(nodes, key=lambda node: (node.report["saturated"], node.load(),
+                                                -node.report["headroom"]))
+            node.placing += 1
+            return node
+
+    def route(self, body):
+        """
+        Run a feedback session on the nodes until it is over.
+        :return: Status code and response of the node that finished it
+        """
+        tried = []
+        nodes = []
+        while True:
+            node = self.place(tried)
+            if node is None:
+                with self.lock:
+                    self.counters["rejected"] += 1
+                return 503, {"message": "Too many sessions on every node, try again later",
+                             "nodes": nodes}
+
+            nodes.append(node.url)
+            with self.lock:
+                self.sessions[body["uid"]] = node
+                self.counters["placed"] += 1
+            try:
+                response = requests.post(node.url, json=body, timeout=(5, self.timeout))
+            except requests.RequestException as e:
+                with self.lock:
+                    node.failures += 1
+                    self.counters["failed"] += 1
+                print(f"Session of {body['uid']} failed on {node.url}: {e!r}")
+                tried.append(node)
+                continue
+            finally:
+                with self.lock:
+                    if self.sessions.get(body["uid"]) is node:
+                        del self.sessions[body["uid"]]
+
+            if response.status_code == 503:
+                # Full since its last report
+                tried.append(node)
+                continue
+            try:
+                result = response.json()
+            except ValueError:
+                return response.status_code, {"message": response.text, "nodes": nodes}
+            if isinstance(result, dict) and result.get("moved"):
+                # Resumed from its checkpoint on another node
+                tried = [node]
+                continue
+            if isinstance(result, dict):
+                result["nodes"] = nodes
+            return response.status_code, result
+
+    def rebalance(self):
+        """
+        Move a session off every saturated node, to a node with room
+        that is not saturated.
+        """
+        now = time.time()
+        with self.lock:
+            saturated = [node for node in self.nodes if node.alive and node.report["saturated"]
+                         and node.report["active"] > 1 and now - node.moved > self.cooldown]
+            free = [node for node in self.nodes if node.alive and not node.report["saturated"]
+                    and node.room() > 0]
+        if not free:
+            return
+        for node in saturated:
+            with self.lock:
+                uids = [uid for uid, on in self.sessions.items() if on is node]
+            if not uids:
+                continue
+            try:
+                moved = requests.post(f"{node.url}/handoff", json={"uid": uids[-1]}, timeout=2).ok
+            except requests.RequestException:
+                moved = False
+            if moved:
+                with self.lock:
+                    node.moved = now
+                    self.counters["moved"] += 1
+
+    def stats(self):
+        with self.lock:
+            return {"nodes": [node.stats() for node in self.nodes],
+                    "sessions": len(self.sessions), **self.counters}
+
+    def close(self):
+        self.stopped.set()
+
+
+def serve(router, port):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or "null")
+            if not isinstance(body, dict) or "uid" not in body:
+                self.reply(400, {"message": "uid is missing"})
+                return
+            self.reply(*router.route(body))
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/nodes"):
+                self.reply(200, router.stats())
+            else:
+                self.reply(404, {"message": "Unknown request"})
+
+        def reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    httpd.daemon_threads = True
+    return httpd
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("nodes", nargs="+", help="URLs of the feedbackShared functions")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--interval", type=float, default=1, help="Seconds between load polls")
+    parser.add_argument("--cooldown", type=float, default=10,
+                        help="Seconds between two sessions moved off the same node")
+    args = parser.parse_args()
+
+    router = Router(args.nodes, args.interval, args.cooldown)
+    httpd = serve(router, args.port)
+    print(f"Routing to {len(router.nodes)} nodes on port {args.port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        router.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,716 @@
+"""
+    Exercise as it was before the rep detection moved to movement.py,
+    kept unchanged as the reference test_movement.py compares the
+    engine with. It times the reps with time.time().
+"""
+import time
+
+
+class Exercise:
+    def __init__(self, initial0=None, initial12=None, center=None, change=None):
+        self.initial0 = initial0
+        self.initial12 = initial12
+        self.change = change
+        self.side_value = 120
+        self.uploader = 0
+        self.upload_avr = []
+        self.avr_left_controller = None
+        self.avr_right_controller = None
+        self.average_change = 0
+        self.score_list = []
+        self.start_time = None
+        self.side_done = False
+        self.keys = {
+            0: "bad",
+            1: "trying",
+            2: "nice",
+            3: "very good"
+        }
+
+    def fluctuation(self, new, old):
+        return (abs(new[0] - old[0]) + abs(new[1] - old[1])) // 2
+
+    def handSeenWell(self, index0, index12):
+        if abs(index12[1] - index0[1]) <= 15:
+            return False
+        return True
+
+    def wristSideToSide(self, index0, index12, dista):
+        if self.handSeenWell(index0, index12):
+            if dista > 100:
+                self.side_value = 100
+            elif dista > 50 and dista < 100:
+                self.side_value = 120
+            else:
+                self.side_value = 160
+
+            if self.initial0 == None and self.initial12 == None:
+                self.initial0 = index0[0]
+                self.initial12 = index12[0]
+
+            # The hand is on the same position and not moving the whole hand
+            if index0[0] in list(range(self.initial0 - 20, self.initial0 + 21)):
+
+                self.change = abs(self.initial12 - index12[0])
+
+                if len(self.upload_avr) >= 5:
+                    self.uploader = sum(
+                        self.upload_avr) // (len(self.upload_avr) - 1)
+
+                    self.upload_avr = []
+
+                    return self.keys[self.uploader]
+
+                elif len(self.score_list) >= 3:
+                    score = round(
+                        ((sum(self.score_list) // len(self.score_list)) / 160) * 100, 3)
+                    self.score_list = []
+                    return score
+
+                # Going Right side
+                if index12[0] > self.initial12:
+
+                    # Appending to array of 5 movements
+                    if self.avr_right_controller != None:
+                        self.upload_avr.append(self.avr_right_controller)
+                        self.score_list.append(self.average_change)
+                        self.avr_right_controller = None
+                        self.average_change = 0
+                        self.side_done = False
+
+                    # Checking how far
+                    if self.change >= 5 and self.change <= 20:
+                        if self.start_time == None and self.side_done == False:
+                            self.start_time = time.time()
+
+                        if self.avr_left_controller == None:
+                            self.avr_left_controller = 0
+
+                        elif self.avr_left_controller <= 0:
+                            self.avr_left_controller = 0
+
+                        if self.average_change <= self.change:
+                            self.average_change = self.change
+                        elif self.change + 5 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif self.change > 20 and self.change <= self.side_value - 40:
+                        if self.avr_left_controller == None:
+                            self.avr_left_controller = 1
+                            self.average_change = self.change
+                        elif self.avr_left_controller <= 1:
+                            self.avr_left_controller = 1
+                            self.average_change = self.change
+
+                        if self.average_change <= self.change:
+                            self.average_change = self.change
+                        elif self.change + 5 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif self.change > self.side_value - 40 and self.change <= self.side_value:
+                        if self.avr_left_controller == None:
+                            self.avr_left_controller = 2
+                            self.average_change = self.change
+                        elif self.avr_left_controller <= 2:
+                            self.avr_left_controller = 2
+                            self.average_change = self.change
+
+                        if self.average_change <= self.change:
+                            self.average_change = self.change
+                        elif self.change + 5 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif self.change > self.side_value:
+                        if self.avr_left_controller == None:
+                            self.avr_left_controller = 3
+                            self.average_change = self.change
+                        elif self.avr_left_controller <= 3:
+                            self.avr_left_controller = 3
+                            self.average_change = self.change
+
+                        if self.average_change <= self.change:
+                            self.average_change = self.change
+                        elif self.change + 5 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                # Going Left side
+                elif index12[0] < self.initial12:
+
+                    # Appending to array of 5 movements
+                    if self.avr_left_controller != None:
+                        self.upload_avr.append(self.avr_left_controller)
+                        self.score_list.append(self.average_change)
+                        self.avr_left_controller = None
+                        self.average_change = 0
+                        self.side_done = False
+
+                    # Checking how far
+                    if self.change >= 5 and self.change <= 20:
+                        if self.start_time == None and self.side_done == False:
+                            self.start_time = time.time()
+
+                        if self.avr_right_controller == None:
+                            self.avr_right_controller = 0
+                        elif self.avr_right_controller <= 0:
+                            self.avr_right_controller = 0
+
+                        if self.average_change <= self.change:
+                            self.average_change = self.change
+                        elif self.change + 5 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif self.change > 20 and self.change <= self.side_value - 40:
+                        if self.avr_right_controller == None:
+                            self.avr_right_controller = 1
+                        elif self.avr_right_controller <= 1:
+                            self.avr_right_controller = 1
+
+                        if self.average_change <= self.change:
+                            self.average_change = self.change
+                        elif self.change + 5 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif self.change > self.side_value - 40 and self.change <= self.side_value:
+                        if self.avr_right_controller == None:
+                            self.avr_right_controller = 2
+                        elif self.avr_right_controller <= 2:
+                            self.avr_right_controller = 2
+
+                        if self.average_change <= self.change:
+                            self.average_change = self.change
+                        elif self.change + 5 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif self.change > self.side_value:
+                        if self.avr_right_controller == None:
+                            self.avr_right_controller = 3
+                        elif self.avr_right_controller <= 3:
+                            self.avr_right_controller = 3
+
+                        if self.average_change <= self.change:
+                            self.average_change = self.change
+                        elif self.change + 5 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+            else:
+                self.initial0, self.initial12 = None, None
+                self.start_time = None
+                self.side_done = True
+                end_time = 0
+                return "Whole hand movement"
+
+        else:
+            return "Hand position"
+
+    def checkUpAndDown(self, index4, index8, index12, index16, index20):
+        if index4[1] < index8[1] and index8[1] < index12[1] and index12[1] < index16[1] and index16[1] < index20[1]:
+            return True
+        return False
+
+    def wristUpAndDown(self, index0, index4, index8, index12, index16, index20, handType):
+
+        dista = abs(index0[0] - index12[0])
+
+        if self.checkUpAndDown(index4, index8, index12, index16, index20):
+
+            if handType == "Right":
+                if len(self.upload_avr) >= 5:
+                    self.uploader = sum(
+                        self.upload_avr) // (len(self.upload_avr) - 1)
+
+                    self.upload_avr = []
+
+                    return self.keys[self.uploader]
+
+                elif len(self.score_list) >= 3:
+                    score = round(
+                        ((sum(self.score_list) // len(self.score_list)) / 200) * 100, 3)
+                    self.score_list = []
+                    return score
+
+                if index12[0] > index0[0]:
+
+                    # Appending to array of 5 movements
+                    if self.avr_right_controller != None:
+                        self.upload_avr.append(self.avr_right_controller)
+                        self.score_list.append(self.average_change)
+                        self.avr_right_controller = None
+                        self.average_change = 0
+                        self.side_done = False
+
+                    # Checking how far
+                    if dista > 6 and dista <= 100:
+                        if self.start_time == None and self.side_done == False:
+                            self.start_time = time.time()
+
+                        if self.avr_left_controller == None:
+                            self.avr_left_controller = 0
+                        elif self.avr_left_controller <= 0:
+                            self.avr_left_controller = 0
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif dista > 100 and dista <= 150:
+                        if self.avr_left_controller == None:
+                            self.avr_left_controller = 1
+                        elif self.avr_left_controller <= 1:
+                            self.avr_left_controller = 1
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif dista > 150 and dista <= 200:
+                        if self.avr_left_controller == None:
+                            self.avr_left_controller = 2
+                        elif self.avr_left_controller <= 2:
+                            self.avr_left_controller = 2
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif dista > 200:
+                        if self.avr_left_controller == None:
+                            self.avr_left_controller = 3
+                        elif self.avr_left_controller <= 3:
+                            self.avr_left_controller = 3
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                elif index12[0] < index0[0]:
+                    # Appending to array of 5 movements
+                    if self.avr_left_controller != None:
+                        self.upload_avr.append(self.avr_left_controller)
+                        self.score_list.append(self.average_change)
+                        self.avr_left_controller = None
+                        self.average_change = 0
+                        self.side_done = False
+
+                    # Checking how far
+                    if dista > 6 and dista <= 100:
+                        if self.start_time == None and self.side_done == False:
+                            self.start_time = time.time()
+
+                        if self.avr_right_controller == None:
+                            self.avr_right_controller = 0
+                        elif self.avr_right_controller <= 0:
+                            self.avr_right_controller = 0
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif dista > 100 and dista <= 150:
+                        if self.avr_right_controller == None:
+                            self.avr_right_controller = 1
+                        elif self.avr_right_controller <= 1:
+                            self.avr_right_controller = 1
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif dista > 150 and dista <= 200:
+                        if self.avr_right_controller == None:
+                            self.avr_right_controller = 2
+                        elif self.avr_right_controller <= 2:
+                            self.avr_right_controller = 2
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif dista > 200:
+                        if self.avr_right_controller == None:
+                            self.avr_right_controller = 3
+                        elif self.avr_right_controller <= 3:
+                            self.avr_right_controller = 3
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+            elif handType == "Left":
+                if len(self.upload_avr) >= 5:
+                    self.uploader = sum(
+                        self.upload_avr) // (len(self.upload_avr) - 1)
+
+                    self.upload_avr = []
+
+                    return self.keys[self.uploader]
+
+                elif len(self.score_list) >= 3:
+                    score = round(
+                        ((sum(self.score_list) // len(self.score_list)) / 200) * 100, 3)
+                    self.score_list = []
+                    return score
+
+                if index12[0] > index0[0]:
+                    # Appending to array of 5 movements
+                    if self.avr_left_controller != None:
+                        self.upload_avr.append(self.avr_left_controller)
+                        self.score_list.append(self.average_change)
+                        self.avr_left_controller = None
+                        self.average_change = 0
+                        self.side_done = False
+
+                    # Checking how far
+                    if dista > 6 and dista <= 100:
+                        if self.start_time == None and self.side_done == False:
+                            self.start_time = time.time()
+
+                        if self.avr_right_controller == None:
+                            self.avr_right_controller = 0
+                        elif self.avr_right_controller <= 0:
+                            self.avr_right_controller = 0
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif dista > 100 and dista <= 150:
+                        if self.avr_right_controller == None:
+                            self.avr_right_controller = 1
+                        elif self.avr_right_controller <= 1:
+                            self.avr_right_controller = 1
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif dista > 150 and dista <= 200:
+                        if self.avr_right_controller == None:
+                            self.avr_right_controller = 2
+                        elif self.avr_right_controller <= 2:
+                            self.avr_right_controller = 2
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif dista > 200:
+                        if self.avr_right_controller == None:
+                            self.avr_right_controller = 3
+                        elif self.avr_right_controller <= 3:
+                            self.avr_right_controller = 3
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                elif index12[0] < index0[0]:
+                    # Appending to array of 5 movements
+                    if self.avr_right_controller != None:
+                        self.upload_avr.append(self.avr_right_controller)
+                        self.score_list.append(self.average_change)
+                        self.avr_right_controller = None
+                        self.average_change = 0
+                        self.side_done = False
+
+                    # Checking how far
+                    if dista > 6 and dista <= 100:
+                        if self.start_time == None and self.side_done == False:
+                            self.start_time = time.time()
+
+                        if self.avr_left_controller == None:
+                            self.avr_left_controller = 0
+                        elif self.avr_left_controller <= 0:
+                            self.avr_left_controller = 0
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif dista > 100 and dista <= 150:
+                        if self.avr_left_controller == None:
+                            self.avr_left_controller = 1
+                        elif self.avr_left_controller <= 1:
+                            self.avr_left_controller = 1
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif dista > 150 and dista <= 200:
+                        if self.avr_left_controller == None:
+                            self.avr_left_controller = 2
+                        elif self.avr_left_controller <= 2:
+                            self.avr_left_controller = 2
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+                    elif dista > 200:
+                        if self.avr_left_controller == None:
+                            self.avr_left_controller = 3
+                        elif self.avr_left_controller <= 3:
+                            self.avr_left_controller = 3
+
+                        if self.average_change <= dista:
+                            self.average_change = dista
+                        elif dista + 10 < self.average_change:
+                            if self.start_time != None:
+                                end_time = time.time()
+                                if end_time - self.start_time > 1:
+                                    final_time = round(
+                                        end_time - self.start_time, 3), "time"
+                                else:
+                                    final_time = "time"
+                                self.start_time = None
+                                self.side_done = True
+                                end_time = 0
+                                return final_time
+
+        else:
+            return "Hand position"
@@ -0,0 +1,72 @@
+"""
+    Runs the feedback pipeline on a short recorded video against
+    in-memory storage. Run from backend: python -m pytest tests
+"""
+import os
+import sys
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "feedback"))
+
+from storage import MemoryStorage, setStorage  # noqa: E402
+from hands import HandDetector, HandLandmarks, LandmarkDetector  # noqa: E402
+from main import FEEDBACK_DETECTOR, FEEDBACK_START_DELAY, FeedbackSession, runFeedback  # noqa: E402
+
+
+def randomVideo(path, frames=30, fps=30):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (640, 480))
+    for _ in range(frames):
+        writer.write(np.random.randint(0, 255, (480, 640, 3), np.uint8))
+    writer.release()
+    return str(path)
+
+
+def test_recorded_video_is_analysed(tmp_path):
+    setStorage(MemoryStorage())
+    frames, fps = 90, 30
+    video = randomVideo(tmp_path / "short.avi", frames, fps)
+    detector = HandDetector(**FEEDBACK_DETECTOR)
+    try:
+        response = runFeedback({"source": video, "uid": "test"}, detector)
+    finally:
+        detector.close()
+
+    assert response["capture"]["analysed"] == frames
+    assert response["capture"]["dropped"] == 0
+    # Every frame after the start delay, on the video's own timeline
+    assert response["frames"] == frames - FEEDBACK_START_DELAY * fps
+
+
+def wholeHand(x):
+    """
+    A right hand with its wrist at x, upright and seen well.
+    """
+    points = np.zeros((1, 21, 2), np.int32)
+    points[0, :, 0] = x
+    points[0, :, 1] = 400 - np.arange(21) * 10
+    return HandLandmarks(points, ["Right"])
+
+
+def test_whole_hand_movement_counted_once_per_warning():
+    storage = MemoryStorage()
+    setStorage(storage)
+    session = FeedbackSession("hold", 0, "Right", LandmarkDetector())
+    try:
+        # The whole hand goes back and forth, every other frame is a
+        # whole hand movement
+        for i in range(20):
+            session.analyse(wholeHand(320 + 40 * (i % 2)))
+        # One warning, the others came while it was shown
+        assert session.light_issue == 1
+        assert session.post_pone == 0
+
+        session.timeline.hold_until = 0
+        for i in range(2):
+            session.analyse(wholeHand(320 + 40 * (i % 2)))
+        assert session.light_issue == 2
+    finally:
+        session.close()
+    comments = storage.get(storage.liveCommentsPath("hold"))
+    assert comments["error"]["type"] == "Whole hand movement"
@@ -0,0 +1,148 @@
+"""
+    Decoding of the landmark batches phones post to feedbackLandmarks,
+    and the end of sessions whose phone went quiet, against in-memory
+    storage. Run from backend: python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "feedback"))
+
+from storage import MemoryStorage, setStorage  # noqa: E402
+from ingest import LandmarkSessions, decodeBatch  # noqa: E402
+
+
+def encodeBatch(frames, uid="a", session="s1", end=False):
+    """
+    A batch the way the phone sends it.
+    :param frames: Milliseconds and the (type, (21, 2) points) hands of every frame
+    """
+    t, counts, types, points = [], [], "", []
+    lastTime, lastHand = 0, np.zeros((21, 2), np.int32)
+    for now, hands in frames:
+        t.append(now - lastTime)
+        lastTime = now
+        counts.append(len(hands))
+        for kind, hand in hands:
+            types += kind
+            points += (hand - lastHand).ravel().tolist()
+            lastHand = hand
+    batch = {"uid": uid, "session": session, "t": t, "hands": counts, "types": types,
+             "points": points}
+    if end:
+        batch["end"] = True
+    return batch
+
+
+def hand(x):
+    return np.stack([np.arange(21) * 3 + x, np.arange(21) * 5 + 100], axis=1).astype(np.int32)
+
+
+def test_decode_batch():
+    frames = [(1000, [("R", hand(10))]), (1033, []), (1066, [("R", hand(12)), ("L", hand(300))])]
+    times, decoded = decodeBatch(encodeBatch(frames))
+
+    assert times == [1000, 1033, 1066]
+    assert [len(hands) for hands in decoded] == [1, 0, 2]
+    assert decoded[0].types == ["Right"]
+    assert decoded[2].types == ["Right", "Left"]
+    np.testing.assert_array_equal(decoded[0].points[0], hand(10))
+    np.testing.assert_array_equal(decoded[2].points[1], hand(300))
+
+
+@pytest.mark.parametrize("change", [
+    # Truncated on the way, the last hand misses landmarks
+    lambda batch: batch.update(points=batch["points"][:-10]),
+    lambda batch: batch.update(t=batch["t"][:-1]),
+    lambda batch: batch.update(types="R"),
+    lambda batch: batch.update(types="RX"),
+    lambda batch: batch.update(hands=[2, -1]),
+    lambda batch: batch.update(t=[1000, -5]),
+])
+def test_bad_batch(change):
+    batch = encodeBatch([(1000, [("R", hand(10))]), (1033, [("L", hand(20))])])
+    change(batch)
+    with pytest.raises(ValueError):
+        decodeBatch(batch)
+
+
+def test_bad_batch_starts_no_session():
+    sessions = LandmarkSessions()
+    batch = encodeBatch([(1000, [("R", hand(10))])])
+    batch["points"] = batch["points"][:40]
+    with pytest.raises(ValueError):
+        sessions.handle(batch)
+    assert not sessions.sessions
+
+
+def test_session_over_the_last_batch():
+    storage = MemoryStorage()
+    storage.setProfile("ingest", {"exer": 0, "paralysedHand": "Right"})
+    setStorage(storage)
+    sessions = LandmarkSessions()
+    # 3 s of frames, the first 2 s are skipped while the patient gets ready
+    frames = [(i * 100, [("R", hand(10 + i % 5))]) for i in range(31)]
+
+    response = sessions.handle(encodeBatch(frames[:15], uid="ingest"))
+    assert response == {"session": "s1", "frames": 0}
+    # Sent again, the frames already analysed are skipped
+    sessions.handle(encodeBatch(frames[:15], uid="ingest"))
+    response = sessions.handle(encodeBatch(frames[15:], uid="ingest", end=True))
+    assert response["frames"] == 11
+    assert not sessions.sessions
+
+    late = sessions.handle(encodeBatch(frames[-1:], uid="ingest"))
+    assert late == {"session": "s1", "ended": True}
+
+
+class QuietSession:
+    """
+    A session whose phone stopped sending, close() waits for release.
+    """
+
+    def __init__(self):
+        self.seen = time.time() - 10
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        self.closed = threading.Event()
+
+    def close(self):
+        self.release.wait(5)
+        self.closed.set()
+
+
+def test_expired_session_closes_in_the_background():
+    sessions = LandmarkSessions(timeout=1)
+    quiet = QuietSession()
+    sessions.sessions[("a", "s1")] = quiet
+    sessions.sessions[("b", "s1")] = active = QuietSession()
+    active.seen = time.time()
+
+    started = time.time()
+    sessions.expire()
+    # Not waiting for the close
+    assert time.time() - started < 1
+    assert list(sessions.sessions) == [("b", "s1")]
+    assert ("a", "s1") in sessions.ended
+
+    # A late batch does not start the session again
+    late = sessions.handle(encodeBatch([(1000, [("R", hand(10))])]))
+    assert late == {"session": "s1", "ended": True}
+    assert ("a", "s1") not in sessions.sessions
+
+    quiet.release.set()
+    assert quiet.closed.wait(5)
+    assert not active.closed.is_set()
+
+
+def test_ended_sessions_are_forgotten():
+    sessions = LandmarkSessions(timeout=1)
+    sessions.ended[("a", "s1")] = time.time() - 2
+    sessions.ended[("a", "s2")] = time.time()
+    sessions.expire()
+    assert list(sessions.ended) == [("a", "s2")]
@@ -0,0 +1,99 @@
+"""
+    MovementEngine against the hand-written Exercise it replaced: the
+    same landmark sequences have to give the same grades, scores, times
+    and warnings. Run from backend: python -m pytest tests
+"""
+import math
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "feedback"))
+
+import legacy_exercise  # noqa: E402
+from main import Exercise  # noqa: E402
+
+
+def swings(rng, count, fps=15):
+    """
+    Samples of a landmark swinging around its start with changing
+    amplitude and speed, plus the noise of the detection.
+    :return: Timestamp and signed offset of every sample
+    """
+    phase = 0
+    amplitude = rng.randint(10, 240)
+    speed = rng.uniform(1, 4)
+    for i in range(count):
+        if rng.random() < 0.02:
+            amplitude = rng.randint(0, 240)
+            speed = rng.uniform(1, 4)
+        phase += speed / fps
+        yield i / fps, int(amplitude * math.sin(phase)) + rng.randint(-3, 3)
+
+
+def sideToSideSamples(rng, count):
+    shift = 0
+    dista = 75
+    for now, offset in swings(rng, count):
+        if rng.random() < 0.01:
+            # The whole hand moves away and comes back later
+            shift = rng.choice((0, 0, 25, -40))
+        if rng.random() < 0.02:
+            dista = rng.choice((30, 50, 75, 100, 140))
+        # Sometimes the hand is flat on the screen and not seen well
+        height = 5 if rng.random() < 0.02 else 200
+        index0 = [320 + shift + rng.randint(-2, 2), 400]
+        index12 = [320 + shift + offset, 400 - height]
+        yield now, index0, index12, dista
+
+
+def upAndDownSamples(rng, count):
+    handType = "Right"
+    for now, offset in swings(rng, count):
+        if rng.random() < 0.01:
+            handType = rng.choice(("Right", "Left"))
+        fingers = [[320 + offset, 100 + 20 * k] for k in range(5)]
+        if rng.random() < 0.03:
+            # Fingers out of order, the hand is not held as instructed
+            fingers[1], fingers[3] = fingers[3], fingers[1]
+        yield now, [320, 400], fingers, handType
+
+
+def compare(monkeypatch, samples, old, new):
+    """
+    Feed both exercises the samples, the old one reads the clock.
+    :return: The outputs that differ and how many were not None
+    """
+    clock = SimpleNamespace(now=0)
+    monkeypatch.setattr(legacy_exercise, "time", SimpleNamespace(time=lambda: clock.now))
+    mismatches = []
+    outputs = 0
+    for index, (now, *sample) in enumerate(samples):
+        clock.now = now
+        expected, got = old(*sample), new(*sample, now)
+        if expected != got:
+            mismatches.append((index, expected, got))
+        outputs += expected is not None
+    return mismatches, outputs
+
+
+def test_side_to_side_matches_the_old_exercise(monkeypatch):
+    for seed in range(5):
+        old, new = legacy_exercise.Exercise(), Exercise()
+        mismatches, outputs = compare(monkeypatch, sideToSideSamples(random.Random(seed), 3000),
+                                      old.wristSideToSide, new.wristSideToSide)
+        assert not mismatches[:5]
+        assert outputs > 100
+
+
+def test_up_and_down_matches_the_old_exercise(monkeypatch):
+    for seed in range(5):
+        old, new = legacy_exercise.Exercise(), Exercise()
+        mismatches, outputs = compare(
+            monkeypatch, ((now, index0, *fingers, handType)
+                          for now, index0, fingers, handType in upAndDownSamples(random.Random(seed), 3000)),
+            old.wristUpAndDown, new.wristUpAndDown)
+        assert not mismatches[:5]
+        assert outputs > 100
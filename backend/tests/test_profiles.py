@@ -0,0 +1,113 @@
+"""
+    Expiry and invalidation of the profile cache, on in-memory storage.
+    Run from backend: python -m pytest tests
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "feedback"))
+
+import profiles  # noqa: E402
+from profiles import ProfileCache  # noqa: E402
+from storage import MemoryStorage  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(profiles, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_entries_expire_after_the_ttl(clock):
+    storage = MemoryStorage()
+    storage.setProfile("a", {"exer": 0})
+    cache = ProfileCache(storage, ttl=30)
+    assert cache.get("a") == {"exer": 0}
+
+    # Changed by the app, not through the cache
+    storage.setExercise("a", 1)
+    clock.now += 29
+    assert cache.get("a") == {"exer": 0}
+    clock.now += 1
+    assert cache.get("a") == {"exer": 1}
+    assert cache.stats() == {"hits": 1, "misses": 2, "invalidated": 0, "cached": 1}
+
+
+def test_write_makes_the_next_read_fresh(clock):
+    storage = MemoryStorage()
+    storage.setProfile("a", {"exer": 0})
+    cache = ProfileCache(storage, ttl=30)
+    cache.get("a")
+
+    cache.incrementExercise("a")
+    assert cache.get("a") == {"exer": 1}
+    cache.finishDay("a", 2)
+    assert cache.get("a") == {"nextExercise": 2}
+    cache.postpone("a")
+    assert cache.get("a") == {"nextExercise": 2, "postPoned": 1}
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["invalidated"] == 3
+
+
+class RacingStorage(MemoryStorage):
+    """
+    A write of the profile lands while it is being read.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.cache = None
+
+    def profile(self, uid):
+        profile = super().profile(uid)
+        if self.cache is not None:
+            cache, self.cache = self.cache, None
+            cache.setExercise(uid, 5)
+        return profile
+
+
+def test_read_racing_with_a_write_is_not_kept(clock):
+    storage = RacingStorage()
+    storage.setProfile("a", {"exer": 0})
+    cache = ProfileCache(storage, ttl=30)
+    storage.cache = cache
+
+    # Read before the write landed, not cached
+    assert cache.get("a") == {"exer": 0}
+    assert cache.stats()["cached"] == 0
+    assert cache.get("a") == {"exer": 5}
+    assert cache.get("a") == {"exer": 5}
+    assert cache.stats()["hits"] == 1
+
+
+class FailingStorage(MemoryStorage):
+    """
+    The write is applied but the call fails, e.g a timeout of Firestore.
+    """
+
+    def setExercise(self, uid, exer):
+        super().setExercise(uid, exer)
+        raise TimeoutError("No answer")
+
+
+def test_failed_write_still_invalidates(clock):
+    storage = FailingStorage()
+    storage.setProfile("a", {"exer": 0})
+    cache = ProfileCache(storage, ttl=30)
+    cache.get("a")
+    with pytest.raises(TimeoutError):
+        cache.setExercise("a", 3)
+    assert cache.get("a") == {"exer": 3}
+
+
+def test_snapshots_are_copies(clock):
+    storage = MemoryStorage()
+    storage.setProfile("a", {"exer": 0, "stats": {"days": 1}})
+    cache = ProfileCache(storage, ttl=30)
+    cache.get("a")["stats"]["days"] = 9
+    assert cache.get("a") == {"exer": 0, "stats": {"days": 1}}
@@ -0,0 +1,70 @@
+"""
+    A session checkpointed halfway through the exercise and resumed from
+    storage ends with the same reps and results as one that never broke.
+    Run from backend: python -m pytest tests
+"""
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "feedback"))
+
+from main import Exercise  # noqa: E402
+from progress import SessionProgress  # noqa: E402
+from storage import MemoryStorage  # noqa: E402
+
+
+def samples(count, fps=15):
+    """
+    wristSideToSide landmarks of a hand swinging wider and wider.
+    """
+    for i in range(count):
+        offset = int((40 + i // 3) * math.sin(i * 2.5 / fps))
+        yield i / fps, [320, 400], [320 + offset, 200], 75
+
+
+def run(exercise, progress, frames):
+    for now, index0, index12, dista in frames:
+        progress.record(exercise.wristSideToSide(index0, index12, dista, now), now)
+
+
+def test_resumed_session_ends_like_an_unbroken_one():
+    frames = list(samples(600))
+    half = len(frames) // 2
+
+    storage = MemoryStorage()
+    exercise = Exercise()
+    progress = SessionProgress("a", "wristSideToSide", 0, storage)
+    run(exercise, progress, frames[:half])
+    assert progress.reps > 0
+    assert progress.commit(checkpoint=lambda: {
+        "exercise": exercise.checkpoint(), "progress": progress.checkpoint()})
+
+    # A new request picks the session up from the checkpoint
+    state = storage.checkpoint("a")
+    resumedExercise = Exercise()
+    resumed = SessionProgress("a", "wristSideToSide", 0, storage)
+    resumedExercise.restore(state["exercise"])
+    resumed.restore(state["progress"])
+    run(resumedExercise, resumed, frames[half:])
+    assert resumed.commit(final=True)
+    resumedDocs = storage.documents
+
+    # The same frames without the break, the rep going on is lost all the same
+    storage = MemoryStorage()
+    exercise = Exercise()
+    progress = SessionProgress("a", "wristSideToSide", 0, storage)
+    run(exercise, progress, frames[:half])
+    exercise.engine.interrupt()
+    run(exercise, progress, frames[half:])
+    assert progress.commit(final=True)
+
+    assert resumed.reps == progress.reps
+    assert resumed.results(True) == progress.results(True)
+    # Apart from when they were written
+    for docs in (resumedDocs, storage.documents):
+        docs[storage.liveCommentsPath("a")]["wristSideToSide"].pop("updated")
+    assert resumedDocs == storage.documents
+    # The final commit cleared the checkpoint
+    assert storage.checkpoint("a") is None
@@ -0,0 +1,84 @@
+"""
+    Quantiles of QuantileSketch and the statistics of RunningStats
+    against numpy on the same values. Run from backend: python -m pytest tests
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "feedback"))
+
+from progress import QuantileSketch, RunningStats  # noqa: E402
+
+
+QUANTILES = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1)
+
+
+def distributions():
+    rng = np.random.default_rng(0)
+    return {
+        "uniform": rng.uniform(0, 100, 10000),
+        "lognormal": rng.lognormal(0, 2, 10000),
+        # Rep times, a few seconds each
+        "times": rng.normal(1.5, 0.3, 2000).clip(0.1),
+        "scores": rng.integers(0, 101, 500).astype(float),
+        "few": np.array([3.0, 1.0, 2.0]),
+    }
+
+
+@pytest.mark.parametrize("name", sorted(distributions()))
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+def test_quantiles_within_accuracy(name, accuracy):
+    values = distributions()[name]
+    sketch = QuantileSketch(accuracy)
+    for value in values.tolist():
+        sketch.add(value)
+
+    for q in QUANTILES:
+        # The nearest rank the sketch looks for
+        expected = np.percentile(values, q * 100, method="inverted_cdf")
+        assert abs(sketch.quantile(q) - expected) <= accuracy * expected + 1e-9, q
+
+
+def test_zeros_and_empty():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.5) == 0
+    for value in [0, 0, 0, 5, 10]:
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 0
+    assert sketch.quantile(0.8) == pytest.approx(5, rel=0.01)
+    assert sketch.quantile(1) == pytest.approx(10, rel=0.01)
+
+
+def test_checkpoint_round_trip():
+    sketch = QuantileSketch()
+    for value in distributions()["lognormal"].tolist():
+        sketch.add(value)
+    restored = QuantileSketch()
+    restored.restore(sketch.checkpoint())
+    assert [restored.quantile(q) for q in QUANTILES] == [sketch.quantile(q) for q in QUANTILES]
+
+
+@pytest.mark.parametrize("name", sorted(distributions()))
+def test_running_stats(name):
+    values = distributions()[name]
+    stats = RunningStats()
+    for value in values.tolist():
+        stats.add(value)
+
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.min == values.min()
+    assert stats.max == values.max()
+    summary = stats.summary()
+    assert summary["p50"] == pytest.approx(np.percentile(values, 50, method="inverted_cdf"),
+                                           rel=0.01, abs=0.001)
+    assert summary["p90"] == pytest.approx(np.percentile(values, 90, method="inverted_cdf"),
+                                           rel=0.01, abs=0.001)
+
+
+def test_empty_running_stats():
+    assert RunningStats().summary() == {"count": 0}
+    assert RunningStats().mean == 0
@@ -0,0 +1,96 @@
+"""
+    Firestore semantics of the offline storages: increments, deleted
+    fields, server timestamps and merges of nested maps, the same on
+    MemoryStorage and SQLiteStorage. Run from backend: python -m pytest tests
+"""
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "feedback"))
+
+from storage import (DELETE_FIELD, SERVER_TIMESTAMP, Increment,  # noqa: E402
+                     MemoryStorage, SQLiteStorage)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStorage()
+    return SQLiteStorage(str(tmp_path / "storage.db"))
+
+
+def test_increment(storage):
+    storage.set("users/a", {"exer": Increment(1)}, merge=True)
+    storage.set("users/a", {"exer": Increment(2), "name": "a"}, merge=True)
+    assert storage.get("users/a") == {"exer": 3, "name": "a"}
+
+    # Counts from 0 when the field is not a number
+    storage.set("users/a", {"name": Increment(1)}, merge=True)
+    assert storage.get("users/a")["name"] == 1
+
+    storage.incrementExercise("b")
+    storage.postpone("b")
+    assert storage.profile("b") == {"exer": 1, "postPoned": 1}
+
+
+def test_delete_field(storage):
+    storage.setProfile("a", {"exer": 4, "nextExercise": 0})
+    storage.finishDay("a", 5)
+    assert storage.profile("a") == {"nextExercise": 5}
+
+    storage.set("users/a", {"stats": {"reps": 1, "score": 2}})
+    storage.set("users/a", {"stats": {"reps": DELETE_FIELD}}, merge=True)
+    assert storage.get("users/a") == {"stats": {"score": 2}}
+
+    # Deleting a field that is not there does nothing
+    storage.update("users/a", {"missing": DELETE_FIELD})
+    assert storage.get("users/a") == {"stats": {"score": 2}}
+
+
+def test_server_timestamp(storage):
+    before = datetime.datetime.now(tz=datetime.timezone.utc)
+    storage.set("users/a", {"seen": SERVER_TIMESTAMP})
+    seen = storage.get("users/a")["seen"]
+    # SQLite keeps the JSON of it, a string
+    if isinstance(seen, str):
+        seen = datetime.datetime.fromisoformat(seen)
+    assert before <= seen <= datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+def test_nested_merge(storage):
+    storage.set("users/a", {"results": {"score": 0.5, "messages": {"Good": 1}}, "exer": 0})
+    storage.set("users/a", {"results": {"messages": {"Bad": 2, "Good": Increment(1)}}}, merge=True)
+    assert storage.get("users/a") == {
+        "results": {"score": 0.5, "messages": {"Good": 2, "Bad": 2}}, "exer": 0}
+
+    # Without merge the whole document is replaced, maps too
+    storage.set("users/a", {"results": {"messages": {"Bad": 1}}})
+    assert storage.get("users/a") == {"results": {"messages": {"Bad": 1}}}
+
+    # A map replaces a value that is not one
+    storage.set("users/a", {"results": {"messages": 3}}, merge=True)
+    storage.set("users/a", {"results": {"messages": {"Good": 1}}}, merge=True)
+    assert storage.get("users/a") == {"results": {"messages": {"Good": 1}}}
+
+
+def test_update_needs_a_document(storage):
+    with pytest.raises(KeyError):
+        storage.update("users/none", {"exer": 1})
+    assert storage.get("users/none") is None
+
+
+def test_commit_results(storage):
+    storage.commitResults("a", {"score": 0.5}, {"0": {"time": 1.5}}, checkpoint={"reps": 1})
+    path = storage.liveCommentsPath("a")
+    assert storage.get(path) == {"score": 0.5}
+    assert storage.get(f"{path}/reps/0") == {"time": 1.5}
+    assert storage.checkpoint("a") == {"reps": 1}
+
+    # An empty checkpoint clears it
+    storage.commitResults("a", {"score": 0.7}, {}, checkpoint={})
+    assert storage.checkpoint("a") is None
+    assert storage.get(path) == {"score": 0.7}
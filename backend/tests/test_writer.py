@@ -0,0 +1,59 @@
+"""
+    Coalescing and flushing of the write-behind queue, on in-memory
+    storage. Run from backend: python -m pytest tests
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "feedback"))
+
+from storage import MemoryStorage, Increment  # noqa: E402
+from writer import WriteBehindQueue, deepMerge  # noqa: E402
+
+
+class SlowStorage(MemoryStorage):
+    """
+    Takes a second to write the documents of users/slow.
+    """
+
+    def commit(self, writes):
+        if any(path.startswith("users/slow/") for path, _, _ in writes):
+            time.sleep(1)
+        super().commit(writes)
+
+
+def test_coalesced_increments_add_up():
+    storage = MemoryStorage()
+    queue = WriteBehindQueue(storage, interval=0.5)
+    for _ in range(3):
+        queue.set("users/a", {"exer": Increment(1)}, merge=True)
+    assert queue.flush()
+
+    assert storage.get("users/a") == {"exer": 3}
+    assert queue.stats()["coalesced"] == 2
+    assert queue.stats()["written"] == 1
+
+
+def test_increment_on_a_pending_value():
+    assert deepMerge({"exer": 5}, {"exer": Increment(2)}) == {"exer": 7}
+    assert deepMerge({"stats": {"reps": Increment(1)}}, {"stats": {"reps": Increment(4)}}) == \
+        {"stats": {"reps": Increment(5)}}
+    # A value set after an increment replaces it
+    assert deepMerge({"exer": Increment(1)}, {"exer": 0}) == {"exer": 0}
+
+
+def test_flush_waits_only_for_its_own_documents():
+    storage = SlowStorage()
+    queue = WriteBehindQueue(storage, interval=0)
+    queue.set("users/slow/liveComments/today", {"message": "slow"})
+    queue.set("users/fast/liveComments/today", {"message": "fast"})
+
+    started = time.time()
+    assert queue.flush(prefix="users/fast/")
+    # Committed next to the slow one, not after it
+    assert time.time() - started < 0.5
+    assert storage.get("users/fast/liveComments/today") == {"message": "fast"}
+    assert queue.flush()
+    assert storage.get("users/slow/liveComments/today") == {"message": "slow"}
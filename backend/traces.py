@@ -0,0 +1,287 @@
+"""
+    Landmark traces of recorded videos. The hands HandDetector finds on
+    every frame are stored once per video and detector configuration, so
+    tuning Exercise only means re-scoring the traces, not running
+    mediapipe again.
+
+    A trace is a folder in the cache named after the sha256 of the video
+    and of the detector configuration:
+        points.npy  int32 (frames, maxHands, 21, 2), landmarks in pixels
+        types.npy   int8 (frames, maxHands), 0 Left, 1 Right, -1 no hand
+        meta.json   fps, frames, video and configuration
+    The arrays are memory-mapped when read.
+
+    Record: python traces.py record videos/*.avi --cache traces
+    Re-score: python traces.py rescore --cache traces --exercise 0 --divisor 180
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "feedback"))
+
+from hands import HandDetector, HandLandmarks, LandmarkDetector  # noqa: E402
+from main import Exercise, FEEDBACK_DETECTOR, pickHand  # noqa: E402
+from movement import SIDE_TO_SIDE, UP_AND_DOWN  # noqa: E402
+from replay import StubSink, exerciseStep  # noqa: E402
+
+
+TYPES = ("Left", "Right")
+
+
+def contentHash(video):
+    digest = hashlib.sha256()
+    with open(video, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def traceKey(video, config):
+    """
+    Name of the trace of a video found with a detector configuration,
+    a renamed video keeps its trace, a changed configuration does not.
+    """
+    configHash = hashlib.sha256(json.dumps(
+        config, sort_keys=True).encode()).hexdigest()
+    return f"{contentHash(video)[:24]}-{configHash[:12]}"
+
+
+class Trace:
+    """
+    Landmarks of every frame of a recorded video.
+    """
+
+    def __init__(self, points, types, fps):
+        """
+        :param points: int32 array of shape (frames, maxHands, 21, 2)
+        :param types: int8 array of shape (frames, maxHands)
+        :param fps: Frame rate of the video
+        """
+        self.points = points
+        self.types = types
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.types)
+
+    def hands(self, frame):
+        """
+        The hands of a frame, as findHands() returned them.
+        """
+        types = self.types[frame]
+        count = int((types >= 0).sum())
+        if count == 0:
+            return HandLandmarks.empty()
+        return HandLandmarks(np.array(self.points[frame, :count]),
+                             [TYPES[kind] for kind in types[:count]])
+
+    @classmethod
+    def record(cls, video, detector):
+        """
+        Run detector over every frame of the video.
+        """
+        cap = cv2.VideoCapture(video)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        maxHands = detector.maxHands
+        points = []
+        types = []
+        while True:
+            success, img = cap.read()
+            if not success:
+                break
+            hands = detector.findHands(img, False)
+            framePoints = np.zeros((maxHands, 21, 2), np.int32)
+            frameTypes = np.full(maxHands, -1, np.int8)
+            count = min(len(hands), maxHands)
+            framePoints[:count] = hands.points[:count]
+            frameTypes[:count] = [TYPES.index(kind) for kind in hands.types[:count]]
+            points.append(framePoints)
+            types.append(frameTypes)
+        cap.release()
+
+        if not points:
+            return cls(np.zeros((0, maxHands, 21, 2), np.int32),
+                       np.zeros((0, maxHands), np.int8), fps)
+        return cls(np.stack(points), np.stack(types), fps)
+
+
+class TraceCache:
+    """
+    Folder of traces, see the top of the file.
+    """
+
+    def __init__(self, directory, config=FEEDBACK_DETECTOR):
+        """
+        :param directory: Folder of the traces, created when missing
+        :param config: HandDetector configuration the traces are recorded with
+        """
+        self.directory = directory
+        self.config = config
+        self.detector = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def keys(self):
+        return sorted(key for key in os.listdir(self.directory)
+                      if os.path.exists(os.path.join(self.path(key), "meta.json")))
+
+    def load(self, key):
+        """
+        :return: The memory-mapped trace, None when it is not cached
+        """
+        path = self.path(key)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        return Trace(np.load(os.path.join(path, "points.npy"), mmap_mode="r"),
+                     np.load(os.path.join(path, "types.npy"), mmap_mode="r"),
+                     meta["fps"])
+
+    def store(self, key, trace, video):
+        path = self.path(key)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "points.npy"), trace.points)
+        np.save(os.path.join(path, "types.npy"), trace.types)
+        # Written last, a trace without it is an interrupted one
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"fps": trace.fps, "frames": len(trace),
+                       "video": os.path.basename(video), "config": self.config}, f)
+
+    def get(self, video):
+        """
+        The trace of a video, recorded first when it is not cached.
+        :return: The key and the trace
+        """
+        key = traceKey(video, self.config)
+        trace = self.load(key)
+        if trace is None:
+            if self.detector is None:
+                self.detector = HandDetector(**self.config)
+            else:
+                self.detector.reset()
+            self.store(key, Trace.record(video, self.detector), video)
+            trace = self.load(key)
+        return key, trace
+
+
+def rescore(trace, exer=0, hand_type=None, exercise=None):
+    """
+    Feed a trace to an exercise the way replay() feeds a video.
+    :return: The results, as replay() reports them, and the frame count
+    """
+    exercise = exercise or Exercise()
+    detector = LandmarkDetector()
+    sink = StubSink()
+    hand = None
+    for frame in range(len(trace)):
+        hands = trace.hands(frame)
+        if hands:
+            hand = pickHand(hands, hand_type, hand)
+            sink.post(exerciseStep(exercise, detector, exer, hand, frame / trace.fps),
+                      frame / trace.fps)
+    results = sink.results()
+    results["frames"] = len(trace)
+    return results
+
+
+def rescoreKey(task):
+    directory, key, exer, hand_type, tuning = task
+    trace = TraceCache(directory).load(key)
+    return key, rescore(trace, exer, hand_type, Exercise(**tuning))
+
+
+def rescoreAll(directory, keys, exer=0, hand_type=None, tuning=None, workers=None):
+    """
+    Re-score many traces on a process pool.
+    :param tuning: Keyword arguments of Exercise, e.g the threshold tables
+    :return: Results of every trace by key
+    """
+    tasks = [(directory, key, exer, hand_type, tuning or {}) for key in keys]
+    with ProcessPoolExecutor(workers) as executor:
+        chunksize = max(1, len(tasks) // ((workers or os.cpu_count()) * 4))
+        return dict(executor.map(rescoreKey, tasks, chunksize=chunksize))
+
+
+def tuningArgs(args):
+    """
+    Exercise keyword arguments from the command line.
+    """
+    def numbers(text):
+        return tuple(int(value) for value in text.split(","))
+
+    movement = SIDE_TO_SIDE if args.exercise == 0 else UP_AND_DOWN
+    changes = {}
+    if args.divisor is not None:
+        changes["divisor"] = args.divisor
+    if args.edges is not None:
+        # wristSideToSide only takes its first edge from the table, the
+        # others follow the side value
+        changes["edges"] = numbers(args.edges)
+        if args.exercise == 0:
+            changes["edges"] += movement.edges[1:]
+    if args.drop is not None:
+        changes["drop"] = args.drop
+
+    tuning = {}
+    if changes:
+        tuning["sideToSide" if args.exercise == 0 else "upAndDown"] = movement._replace(**changes)
+    if args.side_values is not None:
+        tuning["sideValues"] = numbers(args.side_values)
+    return tuning
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=("record", "rescore"))
+    parser.add_argument("videos", nargs="*")
+    parser.add_argument("--cache", default="traces", help="Folder of the traces")
+    parser.add_argument("--exercise", type=int, default=0,
+                        help="0 for wristSideToSide, 1 for wristUpAndDown")
+    parser.add_argument("--hand", default=None, help="Paralysed hand, Left or Right")
+    parser.add_argument("--divisor", type=int, help="Distance of a full score")
+    parser.add_argument("--edges", help="Band edges, e.g 100,150,200. Only the first one "
+                                        "for exercise 0, the others follow --side-values")
+    parser.add_argument("--drop", type=int, help="Drop under the peak that ends a movement")
+    parser.add_argument("--side-values", help="wristSideToSide top band edges, e.g 100,120,160")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    if args.exercise == 0 and args.edges is not None and "," in args.edges:
+        parser.error("--edges takes one value for exercise 0, "
+                     "the other edges are set by --side-values")
+
+    cache = TraceCache(args.cache)
+    if args.command == "record":
+        for video in args.videos:
+            key, trace = cache.get(video)
+            print(f"{video}: {key}, {len(trace)} frames")
+        return
+
+    # Re-score the given videos' traces, all of the cache without any
+    keys = [cache.get(video)[0] for video in args.videos] or cache.keys()
+    results = rescoreAll(args.cache, keys, args.exercise, args.hand,
+                         tuningArgs(args), args.workers)
+    scores = [result["score"] for result in results.values() if result["score"]]
+    grades = {}
+    for result in results.values():
+        for grade, count in result["messages"].items():
+            grades[grade] = grades.get(grade, 0) + count
+    print(json.dumps({
+        "traces": len(results),
+        "score": round(sum(scores) / len(scores), 3) if scores else 0,
+        "messages": grades,
+        "results": results
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()